@@ -1,20 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Header
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, status, Header
+from fastapi.responses import StreamingResponse
+from starlette.status import HTTP_400_BAD_REQUEST
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import json
 import logging
+import orjson
 
-from dal.device_manager_dal import DeviceDAL
+from dal.device_manager_dal import DeviceDAL, AsyncDeviceDAL, DEVICE_RESPONSE_COLUMNS
 from dto.device_manager_dto import (
     DeviceCreateDTO,
     DeviceUpdateDTO,
     DeviceResponseDTO,
     DeviceListDTO,
     DeviceFilterDTO,
-    DeviceStatusUpdateDTO
+    DeviceStatusUpdateDTO,
+    DeviceBulkItemResultDTO,
+    DeviceBulkCreateResultDTO,
+    BulkItemStatus,
+    BulkJobStatus,
+    DeviceBulkSelectorDTO,
+    DeviceBulkUpdateDTO,
+    DeviceBulkJobDTO,
+    SearchMode
 )
-from entities.database import get_db
+from entities.database import get_db, get_async_db, get_read_db, get_session_factory
+from helpers.config import (
+    BULK_MAX_SIZE,
+    BULK_SYNC_LIMIT,
+    CHANGE_FEED_MAX_LIMIT,
+    CHANGE_FEED_SETTLE_SECONDS,
+    CHANGE_FEED_TOMBSTONE_RETENTION,
+    EXPORT_BATCH_SIZE,
+    CACHE_REFRESH_LOCK_TTL,
+    CACHE_SWR_ENABLED,
+    KEYSET_SORT_COLUMNS,
+    LIST_CACHE_TTL
+)
+from helpers.device_manager_helper import DeviceHelper
 from helpers.rabbitmq_helper import rabbitmq_helper
 from helpers.redis_helper import redis_helper
+from helpers.replica_helper import ReplicaRouter
+from helpers.heartbeat_helper import heartbeat_buffer
+from helpers.bulk_operation_helper import bulk_operations
+from helpers.single_flight import device_loads
 from helpers.auth_helper import AuthHelper
 
 logger = logging.getLogger(__name__)
@@ -31,7 +63,7 @@ async def verify_token(authorization: Optional[str] = Header(None)):
     try:
         # Format: "Bearer <token>"
         token = authorization.split(" ")[1]
-        payload = AuthHelper.verify_token(token)
+        payload = AuthHelper.verify_token_cached(token)
         if not payload:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -47,12 +79,12 @@ async def verify_token(authorization: Optional[str] = Header(None)):
 @router.post("/", response_model=DeviceResponseDTO, status_code=status.HTTP_201_CREATED)
 async def create_device(
     device_dto: DeviceCreateDTO,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token_payload: dict = Depends(verify_token)
 ):
     """Créer un nouveau device"""
     # Vérifier si le device existe déjà
-    existing_device = DeviceDAL.get_device_by_id(db, device_dto.device_id)
+    existing_device = await AsyncDeviceDAL.get_device_by_id(db, device_dto.device_id)
     if existing_device:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -65,160 +97,538 @@ async def create_device(
         device_data['owner_id'] = token_payload['sub']
     
     # Créer le device
-    device = DeviceDAL.create_device(db, device_data)
+    device = await AsyncDeviceDAL.create_device(db, device_data)
     
-    # Mettre en cache
-    redis_helper.cache_device(device.device_id, device.to_dict())
+    # Mettre en cache (device, compteurs de statut, générations des listes)
+    device_data = device.to_dict()
+    redis_helper.sync_devices({device.device_id: device_data})
     
     # Publier l'événement
     await rabbitmq_helper.publish_device_event(
         event_type="created",
         device_id=device.device_id,
-        data=device.to_dict()
+        data=device_data
     )
     
     logger.info(f"Device created: {device.device_id}")
-    return device
+    return device_data
+
+@router.post("/bulk", response_model=DeviceBulkCreateResultDTO)
+async def create_devices_bulk(
+    devices_dto: List[DeviceCreateDTO],
+    db: AsyncSession = Depends(get_async_db),
+    token_payload: dict = Depends(verify_token)
+):
+    """Créer plusieurs devices en une seule transaction, avec un résultat par device"""
+    if len(devices_dto) > BULK_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many devices in one request (max {BULK_MAX_SIZE})"
+        )
+    
+    results: List[Optional[DeviceBulkItemResultDTO]] = [None] * len(devices_dto)
+    
+    # Détecter les doublons (base + lot) en une seule requête
+    existing_ids = await AsyncDeviceDAL.get_existing_device_ids(db, [d.device_id for d in devices_dto])
+    seen_ids = set()
+    pending = {}
+    for index, device_dto in enumerate(devices_dto):
+        if device_dto.device_id in existing_ids or device_dto.device_id in seen_ids:
+            results[index] = DeviceBulkItemResultDTO(
+                device_id=device_dto.device_id,
+                status=BulkItemStatus.CONFLICT,
+                detail=f"Device with ID {device_dto.device_id} already exists"
+            )
+            continue
+        
+        seen_ids.add(device_dto.device_id)
+        device_data = device_dto.model_dump()
+        if not device_data.get('owner_id') and 'sub' in token_payload:
+            device_data['owner_id'] = token_payload['sub']
+        pending[index] = device_data
+    
+    # Insérer tous les devices restants en une transaction
+    try:
+        devices = await AsyncDeviceDAL.create_devices(db, list(pending.values()))
+    except IntegrityError:
+        # Une requête concurrente a inséré certains device_id entre-temps
+        await db.rollback()
+        raced_ids = await AsyncDeviceDAL.get_existing_device_ids(db, [d['device_id'] for d in pending.values()])
+        for index, device_data in list(pending.items()):
+            if device_data['device_id'] in raced_ids:
+                results[index] = DeviceBulkItemResultDTO(
+                    device_id=device_data['device_id'],
+                    status=BulkItemStatus.CONFLICT,
+                    detail=f"Device with ID {device_data['device_id']} already exists"
+                )
+                del pending[index]
+        try:
+            devices = await AsyncDeviceDAL.create_devices(db, list(pending.values()))
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Bulk device creation failed: {e}")
+            devices = []
+            for index, device_data in pending.items():
+                results[index] = DeviceBulkItemResultDTO(
+                    device_id=device_data['device_id'],
+                    status=BulkItemStatus.ERROR,
+                    detail="Insertion failed"
+                )
+    
+    devices_data = {device.device_id: device.to_dict() for device in devices}
+    for index, device_data in pending.items():
+        if results[index] is None:
+            results[index] = DeviceBulkItemResultDTO(
+                device_id=device_data['device_id'],
+                status=BulkItemStatus.CREATED,
+                device=devices_data[device_data['device_id']]
+            )
+    
+    # Remplir le cache et publier les événements par lot
+    redis_helper.sync_devices(devices_data)
+    await rabbitmq_helper.publish_device_events([
+        {"event_type": "created", "device_id": device_id, "data": data}
+        for device_id, data in devices_data.items()
+    ])
+    
+    created = len(devices_data)
+    conflicts = sum(1 for r in results if r.status == BulkItemStatus.CONFLICT)
+    logger.info(f"Bulk device creation: {created} created, {conflicts} conflicts")
+    return DeviceBulkCreateResultDTO(
+        created=created,
+        conflicts=conflicts,
+        errors=len(results) - created - conflicts,
+        results=results
+    )
+
+async def _run_bulk_operation(
+    operation: str,
+    selector: DeviceBulkSelectorDTO,
+    response: Response,
+    db: AsyncSession,
+    values: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Exécuter une opération bulk par lots: dans la requête si la sélection est petite, sinon en tâche de fond (202)"""
+    device_ids = list(dict.fromkeys(selector.device_ids)) if selector.device_ids is not None else None
+    if device_ids is not None and len(device_ids) > BULK_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many device ids in one request (max {BULK_MAX_SIZE}), use a filter"
+        )
+    
+    matched = await AsyncDeviceDAL.count_bulk_selection(db, device_ids, selector.filter)
+    job = bulk_operations.create_job(operation, matched)
+    selection = {"values": values, "device_ids": device_ids, "filter_dto": selector.filter}
+    
+    if matched > BULK_SYNC_LIMIT:
+        bulk_operations.start(job, **selection)
+        response.status_code = status.HTTP_202_ACCEPTED
+        response.headers["Location"] = f"{router.prefix}/bulk/jobs/{job['job_id']}"
+        return job
+    
+    await bulk_operations.run(job, db, **selection)
+    if job["status"] == BulkJobStatus.FAILED:
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    return job
+
+@router.patch("/bulk", response_model=DeviceBulkJobDTO)
+async def update_devices_bulk(
+    bulk_dto: DeviceBulkUpdateDTO,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    token_payload: dict = Depends(verify_token)
+):
+    """Appliquer les mêmes changements à une sélection de devices (ids ou filtre), en UPDATE ... RETURNING par lot"""
+    values = bulk_dto.changes.model_dump(mode="json", exclude_unset=True)
+    return await _run_bulk_operation("update", bulk_dto, response, db, values=values)
+
+@router.delete("/bulk", response_model=DeviceBulkJobDTO)
+async def delete_devices_bulk(
+    response: Response,
+    selector: DeviceBulkSelectorDTO = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+    token_payload: dict = Depends(verify_token)
+):
+    """Supprimer une sélection de devices (ids ou filtre), en DELETE ... RETURNING par lot"""
+    return await _run_bulk_operation("delete", selector, response, db)
+
+@router.get("/bulk/jobs/{job_id}", response_model=DeviceBulkJobDTO)
+async def get_bulk_job(
+    job_id: str,
+    token_payload: dict = Depends(verify_token)
+):
+    """Progression d'une opération bulk (suivie par le réplica qui l'exécute)"""
+    job = bulk_operations.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bulk job not found"
+        )
+    return job
+
+def _parse_config_filter(config: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Filtre de contenance sur la config (objet JSON passé en paramètre de requête)"""
+    if not config:
+        return None
+    try:
+        config_contains = json.loads(config)
+    except ValueError:
+        config_contains = None
+    if not isinstance(config_contains, dict):
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="config must be a JSON object")
+    return config_contains
 
 @router.get("/", response_model=DeviceListDTO)
 def get_devices(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     search: Optional[str] = None,
+    search_mode: SearchMode = Query(SearchMode.SUBSTRING, description="prefix, substring or fulltext"),
     device_type: Optional[str] = None,
     status: Optional[str] = None,
     is_active: Optional[bool] = None,
     owner_id: Optional[str] = None,
     min_battery: Optional[float] = Query(None, ge=0, le=100),
     max_battery: Optional[float] = Query(None, ge=0, le=100),
-    sort_by: str = Query("created_at"),
+    config: Optional[str] = Query(None, description="JSON object the device config must contain"),
+    config_key: Optional[str] = Query(None, description="Top-level key the device config must have"),
+    sort_by: str = Query("created_at", description="Column name, or relevance to rank search results"),
     sort_order: str = Query("desc", regex="^(asc|desc)$"),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="Opaque cursor returned as next_cursor"),
+    count: str = Query("exact", regex="^(exact|estimated|none)$"),
+    db: Session = Depends(get_read_db),
     token_payload: dict = Depends(verify_token)
 ):
-    """Récupérer la liste des devices avec pagination et filtres"""
+    """Récupérer la liste des devices avec pagination (offset ou curseur) et filtres"""
     # Construire le DTO de filtre
     filter_dto = DeviceFilterDTO(
         search=search,
+        search_mode=search_mode,
         device_type=device_type,
         status=status,
         is_active=is_active,
         owner_id=owner_id,
         min_battery_level=min_battery,
-        max_battery_level=max_battery
+        max_battery_level=max_battery,
+        config_contains=_parse_config_filter(config),
+        config_key=config_key
     )
     
-    # Calculer le skip
+    # Pagination keyset: uniquement sur les colonnes indexées (tri, id)
+    keyset = sort_by in KEYSET_SORT_COLUMNS
+    after = None
+    if cursor:
+        if not keyset:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"cursor pagination requires sort_by in {', '.join(KEYSET_SORT_COLUMNS)}"
+            )
+        try:
+            after = DeviceHelper.decode_cursor(cursor, sort_by, sort_order)
+        except ValueError as e:
+            raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=f"Invalid cursor: {e}")
+    
+    # Cache des résultats: clé = filtres normalisés + pagination + tri + génération du propriétaire
+    cache_key = None
+    generation = redis_helper.get_list_generation(owner_id)
+    if generation is not None:
+        cache_key = DeviceHelper.build_list_cache_key(owner_id, generation, {
+            **filter_dto.model_dump(mode="json"),
+            "page": None if cursor else page,
+            "page_size": page_size,
+            "sort_by": sort_by,
+            "sort_order": sort_order,
+            "cursor": cursor,
+            "count": count
+        })
+        cached_list = redis_helper.get_cached_device_list(cache_key)
+        if cached_list is not None:
+            return Response(content=cached_list, media_type="application/json")
+    
+    # Calculer le skip (ignoré en mode curseur)
     skip = (page - 1) * page_size
     
-    # Récupérer les devices
-    devices, total = DeviceDAL.get_devices(
+    # Récupérer une ligne de plus pour savoir s'il existe une page suivante
+    rows, total = DeviceDAL.get_devices(
         db=db,
         filter_dto=filter_dto,
         skip=skip,
-        limit=page_size,
+        limit=page_size + 1,
         sort_by=sort_by,
-        sort_order=sort_order
+        sort_order=sort_order,
+        after=after,
+        count_mode=count,
+        columns=DEVICE_RESPONSE_COLUMNS
     )
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    
+    next_cursor = None
+    if has_more and keyset:
+        last = rows[-1]
+        next_cursor = DeviceHelper.encode_cursor(sort_by, sort_order, getattr(last, sort_by), last.id)
     
     # Calculer le nombre total de pages
-    total_pages = (total + page_size - 1) // page_size if page_size > 0 else 0
-    
-    return DeviceListDTO(
-        devices=devices,
-        total=total,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages
+    total_pages = (total + page_size - 1) // page_size if total is not None else None
+    
+    # Sérialisation directe des tuples en JSON (même forme que DeviceListDTO, sans validation Pydantic)
+    body = orjson.dumps({
+        "devices": [DeviceHelper.row_to_dict(row) for row in rows],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "total_pages": total_pages,
+        "next_cursor": next_cursor
+    })
+    if cache_key and not ReplicaRouter.is_replica_session(db):
+        redis_helper.cache_device_list(cache_key, body, ttl=LIST_CACHE_TTL)
+    return Response(content=body, media_type="application/json")
+
+@router.get("/export")
+def export_devices(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    search: Optional[str] = None,
+    search_mode: SearchMode = Query(SearchMode.SUBSTRING, description="prefix, substring or fulltext"),
+    device_type: Optional[str] = None,
+    status: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    owner_id: Optional[str] = None,
+    min_battery: Optional[float] = Query(None, ge=0, le=100),
+    max_battery: Optional[float] = Query(None, ge=0, le=100),
+    config: Optional[str] = Query(None, description="JSON object the device config must contain"),
+    config_key: Optional[str] = Query(None, description="Top-level key the device config must have"),
+    session_factory=Depends(get_session_factory),
+    token_payload: dict = Depends(verify_token)
+):
+    """Exporter tout l'inventaire filtré en un flux NDJSON ou CSV (curseur serveur, mémoire constante)"""
+    filter_dto = DeviceFilterDTO(
+        search=search,
+        search_mode=search_mode,
+        device_type=device_type,
+        status=status,
+        is_active=is_active,
+        owner_id=owner_id,
+        min_battery_level=min_battery,
+        max_battery_level=max_battery,
+        config_contains=_parse_config_filter(config),
+        config_key=config_key
+    )
+    
+    def generate():
+        # Session propre au flux: elle reste ouverte jusqu'au dernier lot envoyé
+        with session_factory() as db:
+            if format == "csv":
+                yield DeviceHelper.rows_to_csv([], header=[column.name for column in DEVICE_RESPONSE_COLUMNS])
+            for rows in DeviceDAL.stream_devices(db, filter_dto, batch_size=EXPORT_BATCH_SIZE):
+                yield DeviceHelper.rows_to_csv(rows) if format == "csv" else DeviceHelper.rows_to_ndjson(rows)
+    
+    filename = f"devices-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.{format}"
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/changes")
+def get_device_changes(
+    since: Optional[str] = Query(None, description="next_token of the previous call; omit for a full initial sync"),
+    limit: int = Query(500, ge=1, le=CHANGE_FEED_MAX_LIMIT),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(verify_token)
+):
+    """Flux de changements: devices créés ou modifiés et tombstones des suppressions depuis le jeton"""
+    now = datetime.utcnow()
+    # Les écritures des dernières secondes peuvent encore être en cours de validation: servies au prochain appel
+    until = now - timedelta(seconds=CHANGE_FEED_SETTLE_SECONDS)
+    
+    if since:
+        try:
+            after, deleted_after = DeviceHelper.decode_change_token(since)
+        except ValueError as e:
+            raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=f"Invalid change token: {e}")
+        if deleted_after[0] < now - timedelta(seconds=CHANGE_FEED_TOMBSTONE_RETENTION):
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Change token older than tombstone retention, full resync required"
+            )
+    else:
+        # Synchronisation initiale: tous les devices, les suppressions seulement à partir de maintenant
+        after, deleted_after = None, (until, 0)
+    
+    rows, tombstones = DeviceDAL.get_changes(db, until, after, deleted_after, limit)
+    has_more = len(rows) > limit or len(tombstones) > limit
+    rows, tombstones = rows[:limit], tombstones[:limit]
+    
+    if rows:
+        after = (rows[-1].updated_at, rows[-1].id)
+    if tombstones:
+        deleted_after = (tombstones[-1].deleted_at, tombstones[-1].id)
+    
+    return Response(content=orjson.dumps({
+        "changes": [DeviceHelper.row_to_dict(row) for row in rows],
+        "deleted": [
+            {"device_id": tombstone.device_id, "owner_id": tombstone.owner_id, "deleted_at": tombstone.deleted_at}
+            for tombstone in tombstones
+        ],
+        "next_token": DeviceHelper.encode_change_token(after, deleted_after),
+        "has_more": has_more
+    }), media_type="application/json")
+
+def _expected_version(if_match: Optional[str]) -> Optional[int]:
+    """Version attendue d'après If-Match (None: pas de précondition)"""
+    if not if_match:
+        return None
+    try:
+        return DeviceHelper.parse_if_match(if_match)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=f"Invalid If-Match header: {e}")
+
+async def _raise_update_failed(db: AsyncSession, device_id: str, expected_version: Optional[int]):
+    """UPDATE sans ligne modifiée: device absent (404) ou modifié depuis la version If-Match (412)"""
+    if expected_version is not None:
+        current_version = await AsyncDeviceDAL.get_device_version(db, device_id)
+        if current_version is not None:
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail=f"Device was modified (current version {current_version})",
+                headers={"ETag": DeviceHelper.etag(current_version)}
+            )
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Device not found"
     )
 
+def _read_device(db: Session, device_id: str) -> Optional[Dict[str, Any]]:
+    """Lire un device en base (colonnes seules, sans entité ORM) et le remettre en cache"""
+    row = DeviceDAL.get_device_row(db, device_id)
+    if not row:
+        return None
+    
+    # Mettre en cache (simple remplissage: pas d'invalidation des autres réplicas); une ligne lue sur un
+    # réplica peut précéder la dernière écriture: elle serait servie à tous les clients jusqu'à CACHE_TTL
+    device_data = DeviceHelper.row_to_dict(row)
+    if not ReplicaRouter.is_replica_session(db):
+        redis_helper.cache_device(device_id, device_data, notify=False)
+    return device_data
+
+def _load_device(db: Session, device_id: str) -> Optional[Dict[str, Any]]:
+    """Recharger un device après un miss; avec stale-while-revalidate, un seul réplica interroge la base"""
+    if not CACHE_SWR_ENABLED:
+        return _read_device(db, device_id)
+    
+    lock = redis_helper.acquire_refresh_lock(device_id)
+    if lock is None:
+        # Un autre réplica recharge: servir la valeur précédente, sinon attendre la sienne
+        device_data = redis_helper.get_stale_device(device_id)
+        if device_data is None:
+            device_data = redis_helper.wait_for_cached_device(device_id, CACHE_REFRESH_LOCK_TTL)
+        return device_data if device_data is not None else _read_device(db, device_id)
+    try:
+        return _read_device(db, device_id)
+    finally:
+        redis_helper.release_refresh_lock(device_id, lock)
+
 @router.get("/{device_id}", response_model=DeviceResponseDTO)
 def get_device(
     device_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     token_payload: dict = Depends(verify_token)
 ):
     """Récupérer un device spécifique"""
     # Vérifier le cache d'abord
-    cached_device = redis_helper.get_cached_device(device_id)
-    if cached_device:
-        return cached_device
-    
-    # Récupérer depuis la base de données
-    device = DeviceDAL.get_device_by_id(db, device_id)
-    if not device:
+    device_data = redis_helper.get_cached_device(device_id)
+    if not device_data:
+        # Miss: un seul chargement par device et par base (primaire ou réplica), partagé par les requêtes concurrentes
+        device_data = device_loads.do((device_id, db.get_bind()), lambda: _load_device(db, device_id))
+    if not device_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Device not found"
         )
     
-    # Mettre en cache
-    redis_helper.cache_device(device_id, device.to_dict())
-    
-    return device
+    # Entrées mises en cache avant l'ajout de la version: pas d'ETag
+    headers = {"ETag": DeviceHelper.etag(device_data["version"])} if "version" in device_data else None
+    return Response(content=orjson.dumps(device_data), media_type="application/json", headers=headers)
 
 @router.put("/{device_id}", response_model=DeviceResponseDTO)
 async def update_device(
     device_id: str,
     device_dto: DeviceUpdateDTO,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     token_payload: dict = Depends(verify_token)
 ):
-    """Mettre à jour un device"""
-    # Vérifier si le device existe
-    device = DeviceDAL.get_device_by_id(db, device_id)
-    if not device:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Device not found"
-        )
+    """Mettre à jour un device (un seul UPDATE ... RETURNING, conditionné par If-Match si fourni)"""
+    expected_version = _expected_version(if_match)
+    update_data = device_dto.model_dump(exclude_unset=True)
+    updated_device = await AsyncDeviceDAL.update_device(db, device_id, dict(update_data), expected_version)
+    if not updated_device:
+        await _raise_update_failed(db, device_id, expected_version)
+    response.headers["ETag"] = DeviceHelper.etag(updated_device.version)
+    
+    # Mettre à jour le cache (un changement de propriétaire invalide toutes les listes par propriétaire)
+    device_data = updated_device.to_dict()
+    redis_helper.sync_devices({device_id: device_data}, all_owners='owner_id' in update_data)
+    
+    # Publier l'événement
+    await rabbitmq_helper.publish_device_event(
+        event_type="updated",
+        device_id=device_id,
+        data=device_data
+    )
     
-    # Mettre à jour le device
-    updated_device = DeviceDAL.update_device(db, device_id, device_dto.model_dump(exclude_unset=True))
+    logger.info(f"Device updated: {device_id}")
+    return device_data
+
+@router.patch("/{device_id}/config", response_model=DeviceResponseDTO)
+async def patch_device_config(
+    device_id: str,
+    response: Response,
+    patch: Dict[str, Any] = Body(..., description="JSON merge-patch (RFC 7386): null removes a key"),
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    token_payload: dict = Depends(verify_token)
+):
+    """Modifier partiellement la config d'un device, appliqué en base sans relire la config"""
+    expected_version = _expected_version(if_match)
+    updated_device = await AsyncDeviceDAL.patch_device_config(db, device_id, patch, expected_version)
     if not updated_device:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Device not found"
-        )
+        await _raise_update_failed(db, device_id, expected_version)
+    response.headers["ETag"] = DeviceHelper.etag(updated_device.version)
     
     # Mettre à jour le cache
-    redis_helper.cache_device(device_id, updated_device.to_dict())
+    device_data = updated_device.to_dict()
+    redis_helper.sync_devices({device_id: device_data})
     
     # Publier l'événement
     await rabbitmq_helper.publish_device_event(
         event_type="updated",
         device_id=device_id,
-        data=updated_device.to_dict()
+        data=device_data
     )
     
-    logger.info(f"Device updated: {device_id}")
-    return updated_device
+    logger.info(f"Device config patched: {device_id}")
+    return device_data
 
 @router.delete("/{device_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_device(
     device_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token_payload: dict = Depends(verify_token)
 ):
     """Supprimer un device"""
-    # Vérifier si le device existe
-    device = DeviceDAL.get_device_by_id(db, device_id)
-    if not device:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Device not found"
-        )
-    
-    # Supprimer le device
-    success = DeviceDAL.delete_device(db, device_id)
-    if not success:
+    # Supprimer le device (DELETE ... RETURNING: un seul aller-retour)
+    deleted = await AsyncDeviceDAL.delete_device(db, device_id)
+    if deleted is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Device not found"
         )
     
     # Supprimer du cache
-    redis_helper.invalidate_device_cache(device_id)
+    _, owner_id = deleted
+    redis_helper.remove_devices({device_id: owner_id})
     
     # Publier l'événement
     await rabbitmq_helper.publish_device_event(
@@ -233,50 +643,75 @@ async def delete_device(
 async def update_device_status(
     device_id: str,
     status_dto: DeviceStatusUpdateDTO,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     token_payload: dict = Depends(verify_token)
 ):
     """Mettre à jour le statut d'un device"""
     # Mettre à jour le statut
-    updated_device = DeviceDAL.update_device_status(
+    expected_version = _expected_version(if_match)
+    updated_device = await AsyncDeviceDAL.update_device_status(
         db=db,
         device_id=device_id,
         status=status_dto.status.value,
         battery_level=status_dto.battery_level,
-        signal_strength=status_dto.signal_strength
+        signal_strength=status_dto.signal_strength,
+        expected_version=expected_version
     )
     
     if not updated_device:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Device not found"
-        )
+        await _raise_update_failed(db, device_id, expected_version)
+    response.headers["ETag"] = DeviceHelper.etag(updated_device.version)
     
     # Mettre à jour le cache
-    redis_helper.cache_device(device_id, updated_device.to_dict())
+    device_data = updated_device.to_dict()
+    redis_helper.sync_devices({device_id: device_data})
     
     # Publier l'événement
     await rabbitmq_helper.publish_device_event(
         event_type="status_updated",
         device_id=device_id,
-        data=updated_device.to_dict()
+        data=device_data
     )
     
     logger.info(f"Device status updated: {device_id} -> {status_dto.status}")
-    return updated_device
+    return device_data
+
+@router.post("/{device_id}/heartbeat", status_code=status.HTTP_202_ACCEPTED)
+async def record_device_heartbeat(
+    device_id: str,
+    status_dto: DeviceStatusUpdateDTO,
+    token_payload: dict = Depends(verify_token)
+):
+    """Enregistrer un heartbeat (write-behind: écrit en base par lot, événement seulement si le statut change)"""
+    heartbeat_buffer.record(
+        device_id=device_id,
+        status=status_dto.status.value,
+        battery_level=status_dto.battery_level,
+        signal_strength=status_dto.signal_strength
+    )
+    return {"device_id": device_id, "accepted": True}
 
 @router.get("/health/status")
-def get_devices_health_summary(db: Session = Depends(get_db)):
+def get_devices_health_summary(db: Session = Depends(get_read_db)):
     """Obtenir un résumé de santé des devices"""
-    total = DeviceDAL.count_devices(db)
-    online_devices = DeviceDAL.get_devices_by_status(db, "online")
-    offline_devices = DeviceDAL.get_devices_by_status(db, "offline")
-    error_devices = DeviceDAL.get_devices_by_status(db, "error")
+    # Compteurs Redis en O(1) si activés, sinon un seul GROUP BY status
+    counts = redis_helper.get_status_counts()
+    source = "redis"
+    if counts is None:
+        counts = DeviceDAL.count_devices_by_status(db)
+        source = "database"
+    
+    total = sum(counts.values())
+    online = counts.get("online", 0)
     
     return {
         "total_devices": total,
-        "online": len(online_devices),
-        "offline": len(offline_devices),
-        "error": len(error_devices),
-        "health_percentage": (len(online_devices) / total * 100) if total > 0 else 0
-    }
\ No newline at end of file
+        "online": online,
+        "offline": counts.get("offline", 0),
+        "error": counts.get("error", 0),
+        "maintenance": counts.get("maintenance", 0),
+        "health_percentage": (online / total * 100) if total > 0 else 0,
+        "source": source
+    }
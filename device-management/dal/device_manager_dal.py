@@ -1,23 +1,77 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, desc, asc
-from typing import List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy import Connection, DateTime, Text, or_, and_, desc, asc, insert, update, delete, literal, literal_column, tuple_, func, select, bindparam, text, cast, case
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, REGCONFIG
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Set
 from datetime import datetime
 import json
 
-from entities.device_manager_entity import Device
-from dto.device_manager_dto import DeviceFilterDTO
+from entities.device_manager_entity import Device, DeviceTombstone, SEARCH_TEXT_CONFIG
+from dto.device_manager_dto import DeviceFilterDTO, SearchMode
+
+SEARCH_COLUMNS = (Device.name, Device.device_id, Device.location)
+
+# Colonnes des réponses API (ordre de Device.to_dict), lues en tuples sans entité ORM
+DEVICE_RESPONSE_COLUMNS = (
+    Device.id,
+    Device.device_id,
+    Device.name,
+    Device.device_type,
+    Device.status,
+    Device.location,
+    Device.firmware_version,
+    Device.last_seen,
+    Device.created_at,
+    Device.updated_at,
+    cast(Device.config, Text).label("config"),  # texte JSON brut: pas de décodage à la lecture
+    Device.battery_level,
+    Device.signal_strength,
+    Device.is_active,
+    Device.owner_id,
+    Device.version
+)
 
 class DeviceDAL:
     """Data Access Layer pour les devices"""
     
+    @staticmethod
+    def _prepare_device_data(device_data: dict) -> dict:
+        """Normaliser la config (colonne JSON) avant insertion"""
+        data = dict(device_data)
+        if 'config' in data:
+            data['config'] = data['config'] or {}
+        return data
+    
     @staticmethod
     def create_device(db: Session, device_data: dict) -> Device:
-        device = Device(**device_data)
+        device = Device(**DeviceDAL._prepare_device_data(device_data))
         db.add(device)
         db.commit()
         db.refresh(device)
         return device
     
+    @staticmethod
+    def create_devices(db: Session, devices_data: List[dict]) -> List[Device]:
+        """Insérer plusieurs devices en une seule transaction (INSERT ... RETURNING)"""
+        if not devices_data:
+            return []
+        
+        rows = [DeviceDAL._prepare_device_data(data) for data in devices_data]
+        devices = db.scalars(
+            insert(Device).returning(Device, sort_by_parameter_order=True),
+            rows
+        ).all()
+        db.commit()
+        return list(devices)
+    
+    @staticmethod
+    def get_existing_device_ids(db: Session, device_ids: List[str]) -> Set[str]:
+        """Retourner, en une seule requête, les device_id déjà présents en base"""
+        if not device_ids:
+            return set()
+        rows = db.query(Device.device_id).filter(Device.device_id.in_(device_ids)).all()
+        return {row[0] for row in rows}
+    
     @staticmethod
     def get_device_by_id(db: Session, device_id: str) -> Optional[Device]:
         return db.query(Device).filter(Device.device_id == device_id).first()
@@ -27,26 +81,85 @@ class DeviceDAL:
         return db.query(Device).filter(Device.id == id).first()
     
     @staticmethod
-    def get_devices(
-        db: Session,
-        filter_dto: DeviceFilterDTO,
-        skip: int = 0,
-        limit: int = 100,
-        sort_by: str = "created_at",
-        sort_order: str = "desc"
-    ) -> Tuple[List[Device], int]:
-        query = db.query(Device)
-        
-        # Appliquer les filtres
-        if filter_dto.search:
-            search = f"%{filter_dto.search}%"
-            query = query.filter(
-                or_(
-                    Device.name.ilike(search),
-                    Device.device_id.ilike(search),
-                    Device.location.ilike(search)
-                )
-            )
+    def get_device_row(db: Session, device_id: str):
+        """Lire les colonnes de réponse d'un device (tuple, sans identity map)"""
+        return db.query(*DEVICE_RESPONSE_COLUMNS).filter(Device.device_id == device_id).first()
+    
+    @staticmethod
+    def _escape_like(term: str) -> str:
+        return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    
+    @staticmethod
+    def _fulltext_query(term: str):
+        return func.websearch_to_tsquery(cast(SEARCH_TEXT_CONFIG, REGCONFIG), term)
+    
+    @staticmethod
+    def _search_condition(term: str, search_mode: SearchMode, dialect_name: str):
+        """Condition de recherche: ILIKE (index trigram sous PostgreSQL) ou tsvector @@ tsquery"""
+        escape = DeviceDAL._escape_like
+        if search_mode == SearchMode.FULLTEXT:
+            if dialect_name == "postgresql":
+                return literal_column("devices.search_vector").op("@@")(DeviceDAL._fulltext_query(term))
+            # Repli sans text search (SQLite): chaque mot doit apparaître dans l'une des colonnes
+            return and_(*(
+                or_(*(column.ilike(f"%{escape(word)}%", escape="\\") for column in SEARCH_COLUMNS))
+                for word in term.split()
+            ))
+        
+        pattern = f"{escape(term)}%" if search_mode == SearchMode.PREFIX else f"%{escape(term)}%"
+        return or_(*(column.ilike(pattern, escape="\\") for column in SEARCH_COLUMNS))
+    
+    @staticmethod
+    def _relevance(term: str, search_mode: SearchMode, dialect_name: str):
+        """Score de pertinence PostgreSQL (ts_rank ou similarité trigram), None ailleurs"""
+        if dialect_name != "postgresql":
+            return None
+        if search_mode == SearchMode.FULLTEXT:
+            return func.ts_rank(literal_column("devices.search_vector"), DeviceDAL._fulltext_query(term))
+        return func.greatest(*(func.similarity(column, term) for column in SEARCH_COLUMNS))
+    
+    @staticmethod
+    def _json_leaves(value: Dict[str, Any], path: str = "$") -> Iterator[Tuple[str, Any]]:
+        """Chemins JSON (syntaxe SQLite) des valeurs feuilles d'un objet"""
+        for key, item in value.items():
+            item_path = f'{path}."{key}"'
+            if isinstance(item, dict) and item:
+                yield from DeviceDAL._json_leaves(item, item_path)
+            else:
+                yield item_path, item
+    
+    @staticmethod
+    def _config_conditions(filter_dto: DeviceFilterDTO, dialect_name: str) -> List[Any]:
+        """Filtres sur la config: contenance jsonb (@>) et présence de clé (?), servis par l'index GIN"""
+        conditions = []
+        if dialect_name == "postgresql":
+            if filter_dto.config_contains:
+                conditions.append(Device.config.op("@>")(literal(filter_dto.config_contains, JSONB)))
+            if filter_dto.config_key:
+                conditions.append(Device.config.op("?")(filter_dto.config_key))
+            return conditions
+        
+        # Repli SQLite (json1): égalité des feuilles; les listes sont comparées en entier
+        for path, value in DeviceDAL._json_leaves(filter_dto.config_contains or {}):
+            if value is None:
+                conditions.append(func.json_type(Device.config, path) == "null")
+            elif isinstance(value, (list, dict)):
+                conditions.append(func.json_extract(Device.config, path) == json.dumps(value, separators=(",", ":")))
+            else:
+                conditions.append(func.json_extract(Device.config, path) == value)
+        if filter_dto.config_key:
+            conditions.append(func.json_type(Device.config, f'$."{filter_dto.config_key}"').isnot(None))
+        return conditions
+    
+    @staticmethod
+    def _apply_filters(query, filter_dto: DeviceFilterDTO, dialect_name: str = "postgresql"):
+        """Appliquer les filtres d'un DeviceFilterDTO à une requête"""
+        search = (filter_dto.search or "").strip()
+        if search:
+            query = query.filter(DeviceDAL._search_condition(search, filter_dto.search_mode, dialect_name))
+        
+        for condition in DeviceDAL._config_conditions(filter_dto, dialect_name):
+            query = query.filter(condition)
         
         if filter_dto.device_type:
             query = query.filter(Device.device_type == filter_dto.device_type)
@@ -66,51 +179,318 @@ class DeviceDAL:
         if filter_dto.max_battery_level is not None:
             query = query.filter(Device.battery_level <= filter_dto.max_battery_level)
         
-        # Compter le total avant pagination
-        total = query.count()
+        return query
+    
+    @staticmethod
+    def _apply_relevance_sort(query, filter_dto: DeviceFilterDTO, dialect_name: str):
+        """Trier par pertinence décroissante (puis id); sans recherche ni score, par id"""
+        search = (filter_dto.search or "").strip()
+        relevance = DeviceDAL._relevance(search, filter_dto.search_mode, dialect_name) if search else None
+        if relevance is None:
+            return query.order_by(desc(Device.id))
+        return query.order_by(desc(relevance), desc(Device.id))
+    
+    @staticmethod
+    def _apply_sort(query, sort_by: str, sort_order: str, after: Optional[Tuple[Any, int]] = None):
+        """Trier par (colonne, id) et, si un curseur est fourni, reprendre après sa position"""
+        column = getattr(Device, sort_by) if sort_by in Device.__table__.columns else Device.id
+        direction = desc if sort_order == "desc" else asc
+        # Colonne unique: ordre total sans départage par id, servi par son index seul (pas d'Incremental Sort)
+        unique = column is Device.id or column is Device.device_id
         
-        # Appliquer le tri
-        if hasattr(Device, sort_by):
-            column = getattr(Device, sort_by)
-            if sort_order == "desc":
-                query = query.order_by(desc(column))
+        if after is not None:
+            value, last_id = after
+            if column is Device.id:
+                key, bound = Device.id, literal(last_id)
+            elif unique:
+                key, bound = column, literal(value, column.type)
             else:
-                query = query.order_by(asc(column))
+                key, bound = tuple_(column, Device.id), tuple_(literal(value, column.type), literal(last_id))
+            query = query.filter(key < bound if sort_order == "desc" else key > bound)
+        
+        if unique:
+            return query.order_by(direction(column))
+        return query.order_by(direction(column), direction(Device.id))
+    
+    @staticmethod
+    def _explain_row_estimate(connection: Connection, statement) -> int:
+        """Lire l'estimation de lignes du planner PostgreSQL pour une requête (EXPLAIN)"""
+        dialect = connection.dialect
+        compiled = statement.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+        params = compiled.params
+        if dialect.positional:
+            params = tuple(params[name] for name in compiled.positiontup)
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    
+    @staticmethod
+    def estimate_count(db: Session, query) -> int:
+        """Estimer le nombre de lignes via le planner PostgreSQL (EXPLAIN), sinon compter"""
+        if db.get_bind().dialect.name != "postgresql":
+            return query.count()
+        return DeviceDAL._explain_row_estimate(db.connection(), query.statement)
+    
+    @staticmethod
+    def get_devices(
+        db: Session,
+        filter_dto: DeviceFilterDTO,
+        skip: int = 0,
+        limit: int = 100,
+        sort_by: str = "created_at",
+        sort_order: str = "desc",
+        after: Optional[Tuple[Any, int]] = None,
+        count_mode: str = "exact",
+        columns: Optional[Tuple] = None
+    ) -> Tuple[List[Any], Optional[int]]:
+        """Lister les devices (entités, ou tuples de columns sans identity map) et le total"""
+        dialect_name = db.get_bind().dialect.name
+        query = db.query(*columns) if columns else db.query(Device)
+        query = DeviceDAL._apply_filters(query, filter_dto, dialect_name)
+        
+        # Compter le total avant pagination (exact, estimé ou pas du tout)
+        if count_mode == "none":
+            total = None
+        elif count_mode == "estimated":
+            total = DeviceDAL.estimate_count(db, query)
+        else:
+            total = query.count()
+        
+        # Appliquer le tri (et la position du curseur le cas échéant)
+        if sort_by == "relevance":
+            query = DeviceDAL._apply_relevance_sort(query, filter_dto, dialect_name)
+        else:
+            query = DeviceDAL._apply_sort(query, sort_by, sort_order, after)
         
         # Appliquer la pagination
-        devices = query.offset(skip).limit(limit).all()
+        if after is None and skip:
+            query = query.offset(skip)
+        devices = query.limit(limit).all()
         
         return devices, total
     
     @staticmethod
-    def update_device(db: Session, device_id: str, update_data: dict) -> Optional[Device]:
-        device = DeviceDAL.get_device_by_id(db, device_id)
-        if not device:
-            return None
-        
+    def stream_devices(
+        db: Session,
+        filter_dto: DeviceFilterDTO,
+        columns: Tuple = DEVICE_RESPONSE_COLUMNS,
+        batch_size: int = 1000
+    ) -> Iterator[List[Any]]:
+        """Parcourir les devices filtrés par lots de batch_size (curseur serveur, mémoire constante)"""
+        statement = DeviceDAL._apply_filters(select(*columns), filter_dto, db.get_bind().dialect.name)
+        result = db.execute(statement.order_by(Device.id), execution_options={"yield_per": batch_size})
+        for partition in result.partitions():
+            yield partition
+    
+    @staticmethod
+    def _update_statement(device_id: str, values: dict, expected_version: Optional[int] = None):
+        """UPDATE ... RETURNING en un aller-retour; avec expected_version, seulement si la version n'a pas changé"""
+        statement = update(Device).where(Device.device_id == device_id)
+        if expected_version is not None:
+            statement = statement.where(Device.version == expected_version)
+        return (
+            statement
+            .values(**values, version=Device.version + 1)
+            .returning(Device)
+            .execution_options(populate_existing=True)
+        )
+    
+    @staticmethod
+    def _update_values(update_data: dict) -> dict:
+        """Valeurs d'un UPDATE de device (device_id non modifiable, config normalisée)"""
         # Ne pas permettre la mise à jour de device_id
-        update_data.pop('device_id', None)
+        values = {key: value for key, value in update_data.items() if key != 'device_id'}
+        if 'config' in values:
+            values['config'] = values['config'] or {}
+        values['updated_at'] = datetime.utcnow()
+        return values
+    
+    @staticmethod
+    def _status_values(status: str, battery_level: Optional[float], signal_strength: Optional[float]) -> dict:
+        """Valeurs d'un changement de statut (métriques absentes conservées)"""
+        now = datetime.utcnow()
+        values = {"status": status, "last_seen": now, "updated_at": now}
+        if battery_level is not None:
+            values["battery_level"] = battery_level
+        if signal_strength is not None:
+            values["signal_strength"] = signal_strength
+        return values
+    
+    @staticmethod
+    def update_device(db: Session, device_id: str, update_data: dict, expected_version: Optional[int] = None) -> Optional[Device]:
+        """Mettre à jour un device; None s'il n'existe pas ou si sa version diffère de expected_version"""
+        statement = DeviceDAL._update_statement(device_id, DeviceDAL._update_values(update_data), expected_version)
+        device = db.scalars(statement).first()
+        db.commit()
+        return device
+    
+    @staticmethod
+    def _merge_patch_expression(target, patch: Dict[str, Any]):
+        """Expression jsonb appliquant un JSON merge-patch (RFC 7386) à target, côté serveur"""
+        target = case((func.jsonb_typeof(target) == "object", target), else_=literal({}, JSONB))
+        result = target
         
-        for key, value in update_data.items():
-            if key == 'config' and isinstance(value, dict):
-                device.set_config_dict(value)
-            else:
-                setattr(device, key, value)
+        removed = [key for key, value in patch.items() if value is None]
+        if removed:
+            result = result.op("-", return_type=JSONB)(literal(removed, ARRAY(Text)))
+        
+        replaced = {key: value for key, value in patch.items() if value is not None and not isinstance(value, dict)}
+        if replaced:
+            result = result.op("||", return_type=JSONB)(literal(replaced, JSONB))
         
-        device.updated_at = datetime.utcnow()
+        for key, value in patch.items():
+            if isinstance(value, dict):
+                result = func.jsonb_set(
+                    result,
+                    literal([key], ARRAY(Text)),
+                    DeviceDAL._merge_patch_expression(target.op("->", return_type=JSONB)(literal(key, Text)), value),
+                    True,
+                    type_=JSONB
+                )
+        return result
+    
+    @staticmethod
+    def _patch_config_statement(device_id: str, patch: Dict[str, Any], dialect_name: str, expected_version: Optional[int] = None):
+        """UPDATE ... RETURNING appliquant le merge-patch en base (jsonb sous PostgreSQL, json_patch sous SQLite)"""
+        if dialect_name == "postgresql":
+            config = DeviceDAL._merge_patch_expression(Device.config, patch)
+        else:
+            config = func.json_patch(func.coalesce(Device.config, literal_column("'{}'")), json.dumps(patch))
+        return DeviceDAL._update_statement(device_id, {"config": config, "updated_at": datetime.utcnow()}, expected_version)
+    
+    @staticmethod
+    def patch_device_config(db: Session, device_id: str, patch: Dict[str, Any], expected_version: Optional[int] = None) -> Optional[Device]:
+        """Appliquer un JSON merge-patch à la config sans lecture-modification-écriture"""
+        statement = DeviceDAL._patch_config_statement(device_id, patch, db.get_bind().dialect.name, expected_version)
+        device = db.scalars(statement).first()
         db.commit()
-        db.refresh(device)
         return device
     
     @staticmethod
-    def delete_device(db: Session, device_id: str) -> bool:
-        device = DeviceDAL.get_device_by_id(db, device_id)
-        if not device:
-            return False
+    def _delete_statement(device_id: str):
+        """DELETE ... RETURNING (device_id, owner_id): suppression sans lecture préalable"""
+        return delete(Device).where(Device.device_id == device_id).returning(Device.device_id, Device.owner_id)
+    
+    @staticmethod
+    def delete_device(db: Session, device_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Supprimer un device avec son tombstone; (device_id, owner_id) supprimé, ou None s'il n'existe pas"""
+        row = db.execute(DeviceDAL._delete_statement(device_id), execution_options={"synchronize_session": False}).first()
+        if row is None:
+            db.rollback()
+            return None
+        DeviceDAL.add_tombstones(db, [tuple(row)])
+        db.commit()
+        return tuple(row)
+    
+    @staticmethod
+    def _bulk_condition(
+        dialect_name: str,
+        device_ids: Optional[List[str]] = None,
+        filter_dto: Optional[DeviceFilterDTO] = None,
+        after_id: int = 0,
+        limit: Optional[int] = None
+    ):
+        """Devices d'un lot: ids explicites, ou prochain lot du filtre parcouru par id croissant (keyset)"""
+        if device_ids is not None:
+            return Device.device_id.in_(device_ids)
+        selection = DeviceDAL._apply_filters(select(Device.id), filter_dto, dialect_name)
+        selection = selection.where(Device.id > after_id).order_by(Device.id).limit(limit)
+        if filter_dto.owner_id:
+            # Table partitionnée par owner_id: l'UPDATE/DELETE externe ne touche que la partition du propriétaire
+            return and_(Device.owner_id == filter_dto.owner_id, Device.id.in_(selection))
+        return Device.id.in_(selection)
+    
+    @staticmethod
+    def count_bulk_selection(
+        db: Session,
+        device_ids: Optional[List[str]] = None,
+        filter_dto: Optional[DeviceFilterDTO] = None
+    ) -> int:
+        statement = select(func.count(Device.id))
+        if device_ids is not None:
+            statement = statement.where(Device.device_id.in_(device_ids))
+        else:
+            statement = DeviceDAL._apply_filters(statement, filter_dto, db.get_bind().dialect.name)
+        return db.scalar(statement)
+    
+    @staticmethod
+    def bulk_update_devices(
+        db: Session,
+        values: Dict[str, Any],
+        device_ids: Optional[List[str]] = None,
+        filter_dto: Optional[DeviceFilterDTO] = None,
+        after_id: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Tuple[int, str, Optional[str]]]:
+        """Mettre à jour un lot en un UPDATE ... RETURNING (id, device_id, owner_id), validé immédiatement"""
+        values = {key: value for key, value in values.items() if key != 'device_id'}
+        condition = DeviceDAL._bulk_condition(db.get_bind().dialect.name, device_ids, filter_dto, after_id, limit)
+        statement = (
+            update(Device)
+            .where(condition)
+            .values(**values, updated_at=datetime.utcnow(), version=Device.version + 1)
+            .returning(Device.id, Device.device_id, Device.owner_id)
+        )
+        rows = [tuple(row) for row in db.execute(statement, execution_options={"synchronize_session": False})]
+        db.commit()
+        return rows
+    
+    @staticmethod
+    def bulk_delete_devices(
+        db: Session,
+        device_ids: Optional[List[str]] = None,
+        filter_dto: Optional[DeviceFilterDTO] = None,
+        after_id: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Tuple[int, str, Optional[str]]]:
+        """Supprimer un lot en un DELETE ... RETURNING (id, device_id, owner_id) avec ses tombstones, validé immédiatement"""
+        condition = DeviceDAL._bulk_condition(db.get_bind().dialect.name, device_ids, filter_dto, after_id, limit)
+        statement = delete(Device).where(condition).returning(Device.id, Device.device_id, Device.owner_id)
+        rows = [tuple(row) for row in db.execute(statement, execution_options={"synchronize_session": False})]
+        DeviceDAL.add_tombstones(db, [(device_id, owner_id) for _, device_id, owner_id in rows])
+        db.commit()
+        return rows
+    
+    @staticmethod
+    def add_tombstones(db: Session, devices: List[Tuple[str, Optional[str]]]):
+        """Tracer des suppressions (device_id, owner_id) pour le flux de changements, dans la transaction courante"""
+        if not devices:
+            return
+        deleted_at = datetime.utcnow()
+        db.execute(
+            insert(DeviceTombstone),
+            [{"device_id": device_id, "owner_id": owner_id, "deleted_at": deleted_at} for device_id, owner_id in devices]
+        )
+    
+    @staticmethod
+    def get_changes(
+        db: Session,
+        until: datetime,
+        after: Optional[Tuple[datetime, int]] = None,
+        deleted_after: Optional[Tuple[datetime, int]] = None,
+        limit: int = 500,
+        columns: Tuple = DEVICE_RESPONSE_COLUMNS
+    ) -> Tuple[List[Any], List[Any]]:
+        """Devices modifiés et tombstones après leurs filigranes (keyset), jusqu'à until, limit + 1 lignes chacun"""
+        statement = DeviceDAL._apply_sort(select(*columns).where(Device.updated_at <= until), "updated_at", "asc", after)
+        devices = db.execute(statement.limit(limit + 1)).all()
         
-        db.delete(device)
+        tombstones = select(DeviceTombstone.id, DeviceTombstone.device_id, DeviceTombstone.owner_id, DeviceTombstone.deleted_at)
+        tombstones = tombstones.where(DeviceTombstone.deleted_at <= until)
+        if deleted_after is not None:
+            tombstones = tombstones.where(
+                tuple_(DeviceTombstone.deleted_at, DeviceTombstone.id) > tuple_(literal(deleted_after[0], DateTime), literal(deleted_after[1]))
+            )
+        tombstones = tombstones.order_by(DeviceTombstone.deleted_at, DeviceTombstone.id).limit(limit + 1)
+        return devices, db.execute(tombstones).all()
+    
+    @staticmethod
+    def purge_tombstones(db: Session, before: datetime) -> int:
+        """Supprimer les tombstones plus anciennes que before (au-delà, les clients doivent tout resynchroniser)"""
+        result = db.execute(delete(DeviceTombstone).where(DeviceTombstone.deleted_at < before))
         db.commit()
-        return True
+        return result.rowcount
     
     @staticmethod
     def update_device_status(
@@ -118,33 +498,350 @@ class DeviceDAL:
         device_id: str,
         status: str,
         battery_level: Optional[float] = None,
-        signal_strength: Optional[float] = None
+        signal_strength: Optional[float] = None,
+        expected_version: Optional[int] = None
     ) -> Optional[Device]:
-        device = DeviceDAL.get_device_by_id(db, device_id)
-        if not device:
-            return None
-        
-        device.status = status
-        device.last_seen = datetime.utcnow()
+        """Changer le statut en un UPDATE ... RETURNING (voir update_device)"""
+        values = DeviceDAL._status_values(status, battery_level, signal_strength)
+        device = db.scalars(DeviceDAL._update_statement(device_id, values, expected_version)).first()
+        db.commit()
+        return device
+    
+    @staticmethod
+    def _heartbeat_update_statement(heartbeats: List[dict], flushed_at: datetime):
+        """UPDATE ... FROM (VALUES ...) PostgreSQL: un seul aller-retour, ancien statut lu via l'auto-jointure"""
+        values = []
+        params = {"updated_at": flushed_at}
+        for i, heartbeat in enumerate(heartbeats):
+            values.append(
+                f"(:d{i}, :s{i}, CAST(:b{i} AS DOUBLE PRECISION), "
+                f"CAST(:g{i} AS DOUBLE PRECISION), CAST(:t{i} AS TIMESTAMP))"
+            )
+            params[f"d{i}"] = heartbeat["device_id"]
+            params[f"s{i}"] = heartbeat["status"]
+            params[f"b{i}"] = heartbeat.get("battery_level")
+            params[f"g{i}"] = heartbeat.get("signal_strength")
+            params[f"t{i}"] = heartbeat["last_seen"]
         
-        if battery_level is not None:
-            device.battery_level = battery_level
+        statement = text(
+            "UPDATE devices AS d SET "
+            "status = v.status, "
+            "battery_level = COALESCE(v.battery_level, d.battery_level), "
+            "signal_strength = COALESCE(v.signal_strength, d.signal_strength), "
+            "last_seen = v.last_seen, "
+            "updated_at = :updated_at, "
+            "version = d.version + 1 "
+            f"FROM (VALUES {', '.join(values)}) "
+            "AS v(device_id, status, battery_level, signal_strength, last_seen), devices AS old "
+            "WHERE d.device_id = v.device_id AND old.id = d.id "
+            "RETURNING d.device_id, d.owner_id, old.status, d.status"
+        )
+        return statement, params
+    
+    @staticmethod
+    def apply_heartbeats(db: Session, heartbeats: List[dict]) -> List[Tuple[str, Optional[str], Optional[str], str]]:
+        """Appliquer un lot de heartbeats coalescés (un par device); retourne (device_id, owner_id, ancien statut, nouveau statut)"""
+        if not heartbeats:
+            return []
         
-        if signal_strength is not None:
-            device.signal_strength = signal_strength
+        # last_seen: réception du heartbeat; updated_at: écriture effective (un lot réessayé reste après
+        # le filigrane du flux de changements)
+        flushed_at = datetime.utcnow()
+        if db.get_bind().dialect.name == "postgresql":
+            statement, params = DeviceDAL._heartbeat_update_statement(heartbeats, flushed_at)
+            rows = [tuple(row) for row in db.execute(statement, params).all()]
+            db.commit()
+            return rows
         
+        # Autres dialectes: lecture des anciens statuts puis UPDATE en executemany
+        device_ids = [heartbeat["device_id"] for heartbeat in heartbeats]
+        previous = {
+            device_id: (owner_id, status)
+            for device_id, owner_id, status in db.execute(
+                select(Device.device_id, Device.owner_id, Device.status).where(Device.device_id.in_(device_ids))
+            )
+        }
+        found = [heartbeat for heartbeat in heartbeats if heartbeat["device_id"] in previous]
+        if found:
+            db.connection().execute(
+                update(Device)
+                .where(Device.device_id == bindparam("hb_device_id"))
+                .values(
+                    status=bindparam("hb_status"),
+                    battery_level=func.coalesce(bindparam("hb_battery_level", type_=Device.battery_level.type), Device.battery_level),
+                    signal_strength=func.coalesce(bindparam("hb_signal_strength", type_=Device.signal_strength.type), Device.signal_strength),
+                    last_seen=bindparam("hb_last_seen"),
+                    updated_at=flushed_at,
+                    version=Device.version + 1
+                ),
+                [
+                    {
+                        "hb_device_id": heartbeat["device_id"],
+                        "hb_status": heartbeat["status"],
+                        "hb_battery_level": heartbeat.get("battery_level"),
+                        "hb_signal_strength": heartbeat.get("signal_strength"),
+                        "hb_last_seen": heartbeat["last_seen"]
+                    }
+                    for heartbeat in found
+                ]
+            )
         db.commit()
-        db.refresh(device)
-        return device
+        return [
+            (heartbeat["device_id"], previous[heartbeat["device_id"]][0], previous[heartbeat["device_id"]][1], heartbeat["status"])
+            for heartbeat in found
+        ]
+    
+    @staticmethod
+    def mark_stale_devices_offline(db: Session, cutoff: datetime) -> List[Tuple[str, Optional[str]]]:
+        """Passer offline les devices en ligne muets depuis cutoff (un UPDATE ... RETURNING)"""
+        statement = (
+            update(Device)
+            .where(Device.status == "online", Device.last_seen < cutoff)
+            .values(status="offline", updated_at=datetime.utcnow(), version=Device.version + 1)
+            .returning(Device.device_id, Device.owner_id)
+        )
+        rows = [tuple(row) for row in db.execute(statement, execution_options={"synchronize_session": False})]
+        db.commit()
+        return rows
     
     @staticmethod
     def count_devices(db: Session) -> int:
         return db.query(Device).count()
     
+    @staticmethod
+    def count_devices_by_status(db: Session) -> Dict[str, int]:
+        """Nombre de devices par statut en une seule requête (GROUP BY status)"""
+        rows = db.query(Device.status, func.count(Device.id)).group_by(Device.status).all()
+        return {status or "unknown": count for status, count in rows}
+    
+    @staticmethod
+    def iter_device_statuses(db: Session, batch_size: int = 5000) -> Iterator[Tuple[str, str]]:
+        """Parcourir les couples (device_id, status) par lots, sans charger les entités"""
+        query = db.query(Device.device_id, Device.status).yield_per(batch_size)
+        for device_id, status in query:
+            yield device_id, status
+    
     @staticmethod
     def get_devices_by_status(db: Session, status: str) -> List[Device]:
         return db.query(Device).filter(Device.status == status).all()
     
     @staticmethod
     def get_devices_by_owner(db: Session, owner_id: str) -> List[Device]:
-        return db.query(Device).filter(Device.owner_id == owner_id).all()
\ No newline at end of file
+        return db.query(Device).filter(Device.owner_id == owner_id).all()
+
+
+class AsyncDeviceDAL:
+    """Data Access Layer asynchrone pour les devices (AsyncSession)"""
+    
+    @staticmethod
+    async def create_device(db: AsyncSession, device_data: dict) -> Device:
+        device = Device(**DeviceDAL._prepare_device_data(device_data))
+        db.add(device)
+        await db.commit()
+        await db.refresh(device)
+        return device
+    
+    @staticmethod
+    async def create_devices(db: AsyncSession, devices_data: List[dict]) -> List[Device]:
+        """Insérer plusieurs devices en une seule transaction (INSERT ... RETURNING)"""
+        if not devices_data:
+            return []
+        
+        rows = [DeviceDAL._prepare_device_data(data) for data in devices_data]
+        result = await db.scalars(
+            insert(Device).returning(Device, sort_by_parameter_order=True),
+            rows
+        )
+        devices = result.all()
+        await db.commit()
+        return list(devices)
+    
+    @staticmethod
+    async def get_existing_device_ids(db: AsyncSession, device_ids: List[str]) -> Set[str]:
+        """Retourner, en une seule requête, les device_id déjà présents en base"""
+        if not device_ids:
+            return set()
+        result = await db.scalars(select(Device.device_id).where(Device.device_id.in_(device_ids)))
+        return set(result.all())
+    
+    @staticmethod
+    async def get_device_by_id(db: AsyncSession, device_id: str) -> Optional[Device]:
+        result = await db.scalars(select(Device).where(Device.device_id == device_id).limit(1))
+        return result.first()
+    
+    @staticmethod
+    async def get_device_by_db_id(db: AsyncSession, id: int) -> Optional[Device]:
+        return await db.get(Device, id)
+    
+    @staticmethod
+    async def estimate_count(db: AsyncSession, statement) -> int:
+        """Estimer le nombre de lignes via le planner PostgreSQL (EXPLAIN), sinon compter"""
+        if db.get_bind().dialect.name != "postgresql":
+            return await db.scalar(select(func.count()).select_from(statement.subquery()))
+        connection = await db.connection()
+        return await connection.run_sync(DeviceDAL._explain_row_estimate, statement)
+    
+    @staticmethod
+    async def get_devices(
+        db: AsyncSession,
+        filter_dto: DeviceFilterDTO,
+        skip: int = 0,
+        limit: int = 100,
+        sort_by: str = "created_at",
+        sort_order: str = "desc",
+        after: Optional[Tuple[Any, int]] = None,
+        count_mode: str = "exact",
+        columns: Optional[Tuple] = None
+    ) -> Tuple[List[Any], Optional[int]]:
+        """Lister les devices (entités, ou tuples de columns sans identity map) et le total"""
+        dialect_name = db.get_bind().dialect.name
+        statement = select(*columns) if columns else select(Device)
+        statement = DeviceDAL._apply_filters(statement, filter_dto, dialect_name)
+        
+        if count_mode == "none":
+            total = None
+        elif count_mode == "estimated":
+            total = await AsyncDeviceDAL.estimate_count(db, statement)
+        else:
+            total = await db.scalar(select(func.count()).select_from(statement.subquery()))
+        
+        if sort_by == "relevance":
+            statement = DeviceDAL._apply_relevance_sort(statement, filter_dto, dialect_name)
+        else:
+            statement = DeviceDAL._apply_sort(statement, sort_by, sort_order, after)
+        if after is None and skip:
+            statement = statement.offset(skip)
+        statement = statement.limit(limit)
+        result = await db.execute(statement) if columns else await db.scalars(statement)
+        
+        return list(result.all()), total
+    
+    @staticmethod
+    async def update_device(db: AsyncSession, device_id: str, update_data: dict, expected_version: Optional[int] = None) -> Optional[Device]:
+        """Mettre à jour un device; None s'il n'existe pas ou si sa version diffère de expected_version"""
+        statement = DeviceDAL._update_statement(device_id, DeviceDAL._update_values(update_data), expected_version)
+        device = (await db.scalars(statement)).first()
+        await db.commit()
+        return device
+    
+    @staticmethod
+    async def get_device_version(db: AsyncSession, device_id: str) -> Optional[int]:
+        """Version courante d'un device (distinguer 404 et 412 après un UPDATE conditionnel sans effet)"""
+        return await db.scalar(select(Device.version).where(Device.device_id == device_id))
+    
+    @staticmethod
+    async def patch_device_config(db: AsyncSession, device_id: str, patch: Dict[str, Any], expected_version: Optional[int] = None) -> Optional[Device]:
+        """Appliquer un JSON merge-patch à la config sans lecture-modification-écriture"""
+        statement = DeviceDAL._patch_config_statement(device_id, patch, db.get_bind().dialect.name, expected_version)
+        result = await db.scalars(statement)
+        device = result.first()
+        await db.commit()
+        return device
+    
+    @staticmethod
+    async def delete_device(db: AsyncSession, device_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Supprimer un device avec son tombstone (voir DeviceDAL.delete_device)"""
+        return await db.run_sync(DeviceDAL.delete_device, device_id)
+    
+    @staticmethod
+    async def count_bulk_selection(
+        db: AsyncSession,
+        device_ids: Optional[List[str]] = None,
+        filter_dto: Optional[DeviceFilterDTO] = None
+    ) -> int:
+        return await db.run_sync(DeviceDAL.count_bulk_selection, device_ids, filter_dto)
+    
+    @staticmethod
+    async def bulk_update_devices(
+        db: AsyncSession,
+        values: Dict[str, Any],
+        device_ids: Optional[List[str]] = None,
+        filter_dto: Optional[DeviceFilterDTO] = None,
+        after_id: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Tuple[int, str, Optional[str]]]:
+        """Mettre à jour un lot (voir DeviceDAL.bulk_update_devices)"""
+        return await db.run_sync(DeviceDAL.bulk_update_devices, values, device_ids, filter_dto, after_id, limit)
+    
+    @staticmethod
+    async def bulk_delete_devices(
+        db: AsyncSession,
+        device_ids: Optional[List[str]] = None,
+        filter_dto: Optional[DeviceFilterDTO] = None,
+        after_id: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Tuple[int, str, Optional[str]]]:
+        """Supprimer un lot (voir DeviceDAL.bulk_delete_devices)"""
+        return await db.run_sync(DeviceDAL.bulk_delete_devices, device_ids, filter_dto, after_id, limit)
+    
+    @staticmethod
+    async def purge_tombstones(db: AsyncSession, before: datetime) -> int:
+        """Supprimer les tombstones expirées (voir DeviceDAL.purge_tombstones)"""
+        return await db.run_sync(DeviceDAL.purge_tombstones, before)
+    
+    @staticmethod
+    async def update_device_status(
+        db: AsyncSession,
+        device_id: str,
+        status: str,
+        battery_level: Optional[float] = None,
+        signal_strength: Optional[float] = None,
+        expected_version: Optional[int] = None
+    ) -> Optional[Device]:
+        """Changer le statut en un UPDATE ... RETURNING (voir update_device)"""
+        values = DeviceDAL._status_values(status, battery_level, signal_strength)
+        device = (await db.scalars(DeviceDAL._update_statement(device_id, values, expected_version))).first()
+        await db.commit()
+        return device
+    
+    @staticmethod
+    async def apply_heartbeats(db: AsyncSession, heartbeats: List[dict]) -> List[Tuple[str, Optional[str], Optional[str], str]]:
+        """Appliquer un lot de heartbeats coalescés (voir DeviceDAL.apply_heartbeats)"""
+        return await db.run_sync(DeviceDAL.apply_heartbeats, heartbeats)
+    
+    @staticmethod
+    async def mark_stale_devices_offline(db: AsyncSession, cutoff: datetime) -> List[Tuple[str, Optional[str]]]:
+        """Passer offline les devices muets (voir DeviceDAL.mark_stale_devices_offline)"""
+        return await db.run_sync(DeviceDAL.mark_stale_devices_offline, cutoff)
+    
+    @staticmethod
+    async def try_advisory_lock(connection: AsyncConnection, lock_id: int) -> bool:
+        """Verrou consultatif PostgreSQL de session, tenu jusqu'au déverrouillage ou à la fermeture de la connexion (toujours accordé ailleurs)"""
+        if connection.dialect.name != "postgresql":
+            return True
+        return bool(await connection.scalar(select(func.pg_try_advisory_lock(lock_id))))
+    
+    @staticmethod
+    async def advisory_unlock(connection: AsyncConnection, lock_id: int):
+        """Relâcher un verrou consultatif de session pris par try_advisory_lock"""
+        if connection.dialect.name == "postgresql":
+            await connection.execute(select(func.pg_advisory_unlock(lock_id)))
+    
+    @staticmethod
+    async def count_devices(db: AsyncSession) -> int:
+        return await db.scalar(select(func.count(Device.id)))
+    
+    @staticmethod
+    async def count_devices_by_status(db: AsyncSession) -> Dict[str, int]:
+        """Nombre de devices par statut en une seule requête (GROUP BY status)"""
+        result = await db.execute(select(Device.status, func.count(Device.id)).group_by(Device.status))
+        return {status or "unknown": count for status, count in result.all()}
+    
+    @staticmethod
+    async def iter_device_statuses(db: AsyncSession, batch_size: int = 5000) -> AsyncIterator[Tuple[str, str]]:
+        """Parcourir les couples (device_id, status) par lots avec un curseur serveur"""
+        result = await db.stream(
+            select(Device.device_id, Device.status).execution_options(yield_per=batch_size)
+        )
+        async for device_id, status in result:
+            yield device_id, status
+    
+    @staticmethod
+    async def get_devices_by_status(db: AsyncSession, status: str) -> List[Device]:
+        result = await db.scalars(select(Device).where(Device.status == status))
+        return list(result.all())
+    
+    @staticmethod
+    async def get_devices_by_owner(db: AsyncSession, owner_id: str) -> List[Device]:
+        result = await db.scalars(select(Device).where(Device.owner_id == owner_id))
+        return list(result.all())
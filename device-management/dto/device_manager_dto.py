@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 from enum import Enum
+import json
 
 class DeviceType(str, Enum):
     SENSOR = "sensor"
@@ -14,6 +15,11 @@ class DeviceStatus(str, Enum):
     ERROR = "error"
     MAINTENANCE = "maintenance"
 
+class SearchMode(str, Enum):
+    PREFIX = "prefix"
+    SUBSTRING = "substring"
+    FULLTEXT = "fulltext"
+
 # DTOs pour les requêtes
 class DeviceCreateDTO(BaseModel):
     device_id: str = Field(..., min_length=3, max_length=100, description="Unique device identifier")
@@ -58,24 +64,97 @@ class DeviceResponseDTO(BaseModel):
     signal_strength: Optional[float]
     is_active: bool
     owner_id: Optional[str]
+    version: int = 1
     
     class Config:
         from_attributes = True
+    
+    @field_validator("config", mode="before")
+    @classmethod
+    def parse_config(cls, value):
+        """La config peut arriver en texte JSON (lecture brute ou ancienne colonne Text)"""
+        if isinstance(value, str):
+            try:
+                return json.loads(value) if value else {}
+            except json.JSONDecodeError:
+                return {}
+        return value if value is not None else {}
 
 class DeviceListDTO(BaseModel):
     devices: list[DeviceResponseDTO]
-    total: int
+    total: Optional[int]  # None si count=none
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int]
+    next_cursor: Optional[str] = None
 
 # Filtres
 class DeviceFilterDTO(BaseModel):
     search: Optional[str] = None
+    search_mode: SearchMode = SearchMode.SUBSTRING
+    config_contains: Optional[Dict[str, Any]] = None
+    config_key: Optional[str] = None
     device_type: Optional[DeviceType] = None
     status: Optional[DeviceStatus] = None
     is_active: Optional[bool] = None
     owner_id: Optional[str] = None
     min_battery_level: Optional[float] = Field(None, ge=0, le=100)
     max_battery_level: Optional[float] = Field(None, ge=0, le=100)
-    
\ No newline at end of file
+    
+
+# Opérations bulk
+class BulkItemStatus(str, Enum):
+    CREATED = "created"
+    CONFLICT = "conflict"
+    ERROR = "error"
+
+class DeviceBulkItemResultDTO(BaseModel):
+    device_id: str
+    status: BulkItemStatus
+    detail: Optional[str] = None
+    device: Optional[DeviceResponseDTO] = None
+
+class DeviceBulkCreateResultDTO(BaseModel):
+    created: int
+    conflicts: int
+    errors: int
+    results: list[DeviceBulkItemResultDTO]
+
+# Opérations bulk ensemblistes (mise à jour / suppression par sélection)
+class DeviceBulkSelectorDTO(BaseModel):
+    device_ids: Optional[List[str]] = Field(None, min_length=1, description="Explicit device ids")
+    filter: Optional[DeviceFilterDTO] = Field(None, description="Devices matching these filters")
+    
+    @model_validator(mode="after")
+    def check_selector(self):
+        """Exactement un sélecteur, et un filtre jamais vide (pas de modification de toute la flotte par erreur)"""
+        if (self.device_ids is None) == (self.filter is None):
+            raise ValueError("Provide either device_ids or filter")
+        if self.filter is not None and not self.filter.model_dump(exclude_defaults=True):
+            raise ValueError("filter must contain at least one criterion")
+        return self
+
+class DeviceBulkUpdateDTO(DeviceBulkSelectorDTO):
+    changes: DeviceUpdateDTO
+    
+    @model_validator(mode="after")
+    def check_changes(self):
+        if not self.changes.model_dump(exclude_unset=True):
+            raise ValueError("changes must set at least one field")
+        return self
+
+class BulkJobStatus(str, Enum):
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class DeviceBulkJobDTO(BaseModel):
+    job_id: str
+    operation: str
+    status: BulkJobStatus
+    matched: int
+    processed: int
+    chunks: int
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
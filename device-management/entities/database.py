@@ -1,5 +1,8 @@
+from fastapi import Depends, Request
 from sqlalchemy.orm import Session
-from helpers.config import engine, SessionLocal, Base
+from helpers.config import DEVICES_PARTITIONS, get_engine, get_sessionlocal, get_async_engine, get_async_sessionlocal
+from sqlalchemy import text
+from entities.device_manager_entity import Base, POSTGRES_DDL
 import logging
 
 logger = logging.getLogger(__name__)
@@ -7,24 +10,97 @@ logger = logging.getLogger(__name__)
 def init_db():
     """Initialiser la base de données"""
     try:
+        engine = get_engine()
         Base.metadata.create_all(bind=engine)
+        # create_all ne crée pas les nouveaux index sur une table existante
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        init_postgres_objects(engine)
+        init_partitioning(engine)
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         raise
 
+def init_postgres_objects(engine):
+    """Migrer config en jsonb, créer les index GIN et la colonne tsvector (PostgreSQL uniquement)"""
+    if engine.dialect.name != "postgresql":
+        return
+    for statement in POSTGRES_DDL:
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(statement))
+        except Exception as e:
+            # Sans pg_trgm (droits insuffisants), la recherche fonctionne mais sans index
+            logger.warning(f"PostgreSQL DDL skipped ({statement.split(chr(10))[0][:60]}): {e}")
+
+def init_partitioning(engine):
+    """Partitionner devices par owner_id si DEVICES_PARTITIONS est défini (table vide: sinon, partition_devices.py)"""
+    if engine.dialect.name != "postgresql" or DEVICES_PARTITIONS < 2:
+        return
+    from entities.partitioning import is_partitioned, partition_devices
+    with engine.connect() as connection:
+        if is_partitioned(connection):
+            return
+        has_rows = connection.execute(text("SELECT EXISTS (SELECT 1 FROM devices)")).scalar()
+    if has_rows:
+        # Copie de toute la table sous verrou exclusif: jamais au démarrage d'un réplica
+        logger.warning("DEVICES_PARTITIONS is set but devices has rows: run partition_devices.py during a maintenance window")
+        return
+    partition_devices(engine, DEVICES_PARTITIONS)
+
 def get_db():
     """Dépendance pour obtenir une session de base de données"""
-    db = SessionLocal()
+    db = get_sessionlocal()()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(request: Request, primary: Session = Depends(get_db)):
+    """Session de lecture: réplica sain (round-robin), primaire sans réplica ou juste après une écriture du client"""
+    from helpers.replica_helper import replica_router
+    replica = replica_router.choose(replica_router.client_key(request.headers.get("Authorization")))
+    if replica is None:
+        yield primary
+        return
+    
+    db = replica["sessionmaker"]()
+    try:
+        # Ouvrir la connexion dès maintenant: réplica injoignable -> lecture sur le primaire
+        db.connection()
+    except Exception as e:
+        db.close()
+        replica_router.mark_unhealthy(replica, e)
+        yield primary
+        return
     try:
         yield db
     finally:
         db.close()
 
+def get_session_factory():
+    """Dépendance pour les réponses streamées: la session est ouverte et fermée par le générateur"""
+    return get_sessionlocal()
+
+async def get_async_db():
+    """Dépendance pour obtenir une session asynchrone (ne bloque pas la boucle d'événements)"""
+    async with get_async_sessionlocal()() as db:
+        yield db
+
 def close_db():
     """Fermer la connexion à la base de données"""
     try:
-        engine.dispose()
+        get_engine().dispose()
         logger.info("Database connection closed")
     except Exception as e:
         logger.error(f"Failed to close database connection: {e}")
+
+async def close_async_db():
+    """Fermer le pool de connexions asynchrones"""
+    try:
+        await get_async_engine().dispose()
+        logger.info("Async database connection closed")
+    except Exception as e:
+        logger.error(f"Failed to close async database connection: {e}")
@@ -1,10 +1,37 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, JSON, Index, text
 from sqlalchemy.sql import func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 import json
 
 Base = declarative_base()
 
+# PostgreSQL: objets créés hors create_all (migration de config en jsonb, extension pg_trgm,
+# colonne tsvector générée, index GIN). Idempotent, une transaction par instruction.
+SEARCH_TEXT_CONFIG = "simple"
+POSTGRES_DDL = [
+    """DO $$ BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'devices' AND column_name = 'config') <> 'jsonb' THEN
+            ALTER TABLE devices ALTER COLUMN config DROP DEFAULT;
+            ALTER TABLE devices ALTER COLUMN config TYPE jsonb USING COALESCE(NULLIF(config, ''), '{}')::jsonb;
+            ALTER TABLE devices ALTER COLUMN config SET DEFAULT '{}'::jsonb;
+        END IF;
+    END $$""",
+    "CREATE INDEX IF NOT EXISTS ix_devices_config_gin ON devices USING gin (config)",
+    "ALTER TABLE devices ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_devices_name_trgm ON devices USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_devices_device_id_trgm ON devices USING gin (device_id gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_devices_location_trgm ON devices USING gin (location gin_trgm_ops)",
+    f"""ALTER TABLE devices ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_TEXT_CONFIG}', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_TEXT_CONFIG}', coalesce(device_id, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_TEXT_CONFIG}', coalesce(location, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_devices_search_vector ON devices USING gin (search_vector)",
+]
+
 class Device(Base):
     __tablename__ = "devices"
     
@@ -19,8 +46,8 @@ class Device(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
-    # Configuration
-    config = Column(Text, default="{}")
+    # Configuration (jsonb sous PostgreSQL: filtrable par index GIN, modifiable partiellement)
+    config = Column(JSON().with_variant(JSONB(), "postgresql"), default=dict)
     
     # Métriques
     battery_level = Column(Float, nullable=True)
@@ -30,16 +57,61 @@ class Device(Base):
     # Propriétaire (pour multi-tenant)
     owner_id = Column(String(100), nullable=True)
     
+    # Concurrence optimiste: incrémentée à chaque modification, exposée en ETag
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    
+    __table_args__ = (
+        # Index (colonne de tri, id) pour la pagination keyset
+        Index("ix_devices_created_at_id", "created_at", "id"),
+        Index("ix_devices_updated_at_id", "updated_at", "id"),
+        # Filtres d'égalité de get_devices suivis du tri par défaut (created_at, id)
+        Index("ix_devices_owner_created_at_id", "owner_id", "created_at", "id"),
+        Index("ix_devices_owner_status_created_at_id", "owner_id", "status", "created_at", "id"),
+        # Listes d'un propriétaire (filtre sélectif) sur les autres tris keyset: pas de tri ni de parcours global
+        Index("ix_devices_owner_updated_at_id", "owner_id", "updated_at", "id"),
+        Index("ix_devices_owner_device_id", "owner_id", "device_id"),
+        Index("ix_devices_owner_id", "owner_id", "id"),
+        Index("ix_devices_owner_status_updated_at_id", "owner_id", "status", "updated_at", "id"),
+        Index("ix_devices_owner_status_device_id", "owner_id", "status", "device_id"),
+        Index("ix_devices_owner_status_id", "owner_id", "status", "id"),
+        Index("ix_devices_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_devices_type_created_at_id", "device_type", "created_at", "id"),
+        # Index partiels: plages de batterie (devices sans batterie exclus) et devices inactifs (minorité)
+        Index(
+            "ix_devices_battery_level",
+            "battery_level",
+            postgresql_where=text("battery_level IS NOT NULL"),
+            sqlite_where=text("battery_level IS NOT NULL")
+        ),
+        # Balayage des devices silencieux: seuls les devices en ligne sont indexés
+        Index(
+            "ix_devices_online_last_seen",
+            "last_seen",
+            postgresql_where=text("status = 'online'"),
+            sqlite_where=text("status = 'online'")
+        ),
+        Index(
+            "ix_devices_inactive_created_at_id",
+            "created_at",
+            "id",
+            postgresql_where=text("is_active = false"),
+            sqlite_where=text("is_active = 0")
+        ),
+    )
+    
     def get_config_dict(self):
         """Retourne la configuration sous forme de dictionnaire"""
-        try:
-            return json.loads(self.config) if self.config else {}
-        except json.JSONDecodeError:
-            return {}
+        if isinstance(self.config, str):
+            # Valeur texte héritée de l'ancienne colonne Text
+            try:
+                return json.loads(self.config) if self.config else {}
+            except json.JSONDecodeError:
+                return {}
+        return self.config or {}
     
     def set_config_dict(self, config_dict):
         """Définit la configuration à partir d'un dictionnaire"""
-        self.config = json.dumps(config_dict) if config_dict else "{}"
+        self.config = config_dict or {}
     
     def to_dict(self):
         """Convertit l'entité en dictionnaire"""
@@ -58,5 +130,20 @@ class Device(Base):
             "battery_level": self.battery_level,
             "signal_strength": self.signal_strength,
             "is_active": self.is_active,
-            "owner_id": self.owner_id
-        }
\ No newline at end of file
+            "owner_id": self.owner_id,
+            "version": self.version
+        }
+
+class DeviceTombstone(Base):
+    """Trace d'un device supprimé, servie par le flux de changements jusqu'à sa purge"""
+    __tablename__ = "device_tombstones"
+    
+    id = Column(Integer, primary_key=True)
+    device_id = Column(String(100), nullable=False)
+    owner_id = Column(String(100), nullable=True)
+    deleted_at = Column(DateTime, nullable=False, default=func.now())
+    
+    __table_args__ = (
+        # Parcours keyset (deleted_at, id) du flux de changements et purge par ancienneté
+        Index("ix_device_tombstones_deleted_at_id", "deleted_at", "id"),
+    )
@@ -0,0 +1,116 @@
+from typing import List, Optional, Tuple
+import logging
+import re
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL 12+: table devices partitionnée par hachage de owner_id. Une contrainte unique d'une table
+# partitionnée doit inclure la clé de partition: l'unicité globale de device_id est portée par
+# device_registry (clé primaire), tenue à jour par trigger dans la même transaction que l'écriture.
+DEVICE_REGISTRY_DDL = [
+    """CREATE TABLE IF NOT EXISTS device_registry (
+        device_id varchar(100) PRIMARY KEY,
+        owner_id varchar(100)
+    )""",
+    """CREATE OR REPLACE FUNCTION devices_registry_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO device_registry (device_id, owner_id) VALUES (NEW.device_id, NEW.owner_id);
+        ELSIF TG_OP = 'UPDATE' THEN
+            IF NEW.device_id IS DISTINCT FROM OLD.device_id OR NEW.owner_id IS DISTINCT FROM OLD.owner_id THEN
+                UPDATE device_registry SET device_id = NEW.device_id, owner_id = NEW.owner_id
+                WHERE device_id = OLD.device_id;
+            END IF;
+        ELSE
+            DELETE FROM device_registry WHERE device_id = OLD.device_id;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+]
+
+def is_partitioned(connection) -> bool:
+    """La table devices est-elle déjà partitionnée"""
+    return bool(connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('devices'))"
+    )).scalar())
+
+def build_partition_statements(
+    columns: List[str],
+    index_definitions: List[Tuple[str, str]],
+    sequence: Optional[str],
+    partitions: int,
+    keep_old: bool = False
+) -> List[str]:
+    """Instructions de conversion de devices en table partitionnée (une seule transaction, table verrouillée)"""
+    if partitions < 2:
+        raise ValueError("partitions must be at least 2")
+    column_list = ", ".join(columns)
+    statements = [
+        "LOCK TABLE devices IN ACCESS EXCLUSIVE MODE",
+        # Colonnes, valeurs par défaut (nextval de la séquence existante) et colonne tsvector générée
+        "CREATE TABLE devices_partitioned (LIKE devices INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE) "
+        "PARTITION BY HASH (owner_id)",
+    ]
+    statements += [
+        f"CREATE TABLE devices_p{remainder:02d} PARTITION OF devices_partitioned "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        for remainder in range(partitions)
+    ]
+    statements.append(f"INSERT INTO devices_partitioned ({column_list}) SELECT {column_list} FROM devices")
+
+    statements += DEVICE_REGISTRY_DDL
+    statements += [
+        "TRUNCATE device_registry",
+        "INSERT INTO device_registry (device_id, owner_id) SELECT device_id, owner_id FROM devices",
+    ]
+    if sequence:
+        # La séquence appartient à l'ancienne table: la rattacher avant de supprimer celle-ci
+        statements.append(f"ALTER SEQUENCE {sequence} OWNED BY devices_partitioned.id")
+
+    if keep_old:
+        statements.append("ALTER TABLE devices RENAME TO devices_unpartitioned")
+        statements += [f"ALTER INDEX {name} RENAME TO {name}_unpartitioned" for name, _ in index_definitions]
+    else:
+        statements.append("DROP TABLE devices")
+    statements.append("ALTER TABLE devices_partitioned RENAME TO devices")
+
+    # Index recréés sur la table partitionnée (propagés à chaque partition); clé primaire et unicité globale
+    # de device_id impossibles sans owner_id: index non uniques, unicité portée par device_registry
+    for name, definition in index_definitions:
+        if name == "devices_pkey":
+            continue
+        statements.append(re.sub(r"^CREATE UNIQUE INDEX", "CREATE INDEX", definition))
+    statements.append(
+        "CREATE TRIGGER devices_registry_sync AFTER INSERT OR UPDATE OR DELETE ON devices "
+        "FOR EACH ROW EXECUTE FUNCTION devices_registry_sync()"
+    )
+    statements.append("ANALYZE devices")
+    return statements
+
+def plan_partitioning(connection, partitions: int, keep_old: bool = False) -> List[str]:
+    """Lire le schéma courant de devices et construire les instructions de conversion"""
+    columns = list(connection.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'devices' AND is_generated = 'NEVER' "
+        "ORDER BY ordinal_position"
+    )).scalars())
+    index_definitions = [tuple(row) for row in connection.execute(text(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'devices' "
+        "ORDER BY indexname"
+    ))]
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence('devices', 'id')")).scalar()
+    return build_partition_statements(columns, index_definitions, sequence, partitions, keep_old)
+
+def partition_devices(engine, partitions: int, keep_old: bool = False) -> List[str]:
+    """Convertir devices en table partitionnée par hachage de owner_id (sans effet si déjà fait)"""
+    with engine.begin() as connection:
+        if is_partitioned(connection):
+            logger.info("devices is already partitioned")
+            return []
+        statements = plan_partitioning(connection, partitions, keep_old)
+        for statement in statements:
+            connection.execute(text(statement))
+    logger.info(f"devices partitioned by hash of owner_id into {partitions} partitions")
+    return statements
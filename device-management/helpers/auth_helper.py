@@ -1,11 +1,24 @@
 import jwt
+import hashlib
 import logging
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
-from helpers.config import JWT_SECRET
+from helpers.config import (
+    JWT_SECRET,
+    AUTH_CACHE_ENABLED,
+    AUTH_CACHE_MAX_SIZE,
+    AUTH_CACHE_MAX_TTL,
+    AUTH_NEGATIVE_CACHE_TTL
+)
+from helpers.local_cache import LocalLRUCache
 
 logger = logging.getLogger(__name__)
 
+# Payloads vérifiés par empreinte de token (False: token refusé récemment)
+token_cache = LocalLRUCache(AUTH_CACHE_MAX_SIZE, AUTH_CACHE_MAX_TTL) if AUTH_CACHE_ENABLED else None
+negative_hits = 0
+
 class AuthHelper:
     """Helper pour l'authentification JWT"""
     
@@ -57,6 +70,48 @@ class AuthHelper:
             logger.error(f"Error verifying token: {e}")
             return None
     
+    @staticmethod
+    def verify_token_cached(token: str) -> Optional[Dict[str, Any]]:
+        """Vérifier un token JWT en réutilisant le résultat d'une vérification précédente"""
+        global negative_hits
+        if token_cache is None:
+            return AuthHelper.verify_token(token)
+        
+        key = hashlib.sha256(token.encode()).hexdigest()
+        cached = token_cache.get(key)
+        if cached is False:
+            negative_hits += 1
+            return None
+        if cached is not None:
+            # Une entrée n'expire jamais après le token (TTL calé sur exp)
+            return dict(cached)
+        
+        payload = AuthHelper.verify_token(token)
+        if payload is None:
+            token_cache.set(key, False, ttl=AUTH_NEGATIVE_CACHE_TTL)
+            return None
+        
+        ttl = AUTH_CACHE_MAX_TTL
+        if "exp" in payload:
+            ttl = min(ttl, float(payload["exp"]) - time.time())
+        if ttl > 0:
+            token_cache.set(key, dict(payload), ttl=ttl)
+        return payload
+    
+    @staticmethod
+    def get_token_cache_stats() -> Dict[str, Any]:
+        """Taux de succès du cache de tokens (positifs et négatifs)"""
+        if token_cache is None:
+            return {"enabled": False}
+        stats = token_cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "enabled": True,
+            **stats,
+            "negative_hits": negative_hits,
+            "hit_rate": stats["hits"] / lookups if lookups else 0.0
+        }
+    
     @staticmethod
     def decode_token(token: str) -> Optional[Dict[str, Any]]:
         """Décoder un token JWT sans vérifier la signature"""
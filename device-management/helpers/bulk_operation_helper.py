@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from dto.device_manager_dto import BulkJobStatus, DeviceFilterDTO
+from helpers.config import BULK_CHUNK_SIZE, BULK_JOB_HISTORY, get_async_sessionlocal
+from helpers.redis_helper import redis_helper
+from helpers.rabbitmq_helper import rabbitmq_helper
+
+logger = logging.getLogger(__name__)
+
+class BulkOperationHelper:
+    """Mises à jour / suppressions ensemblistes par lots, avec suivi de progression (par réplica)"""
+    
+    def __init__(self, chunk_size: int = BULK_CHUNK_SIZE, history: int = BULK_JOB_HISTORY):
+        self.chunk_size = chunk_size
+        self.history = history
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tasks = set()
+    
+    def create_job(self, operation: str, matched: int) -> Dict[str, Any]:
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "operation": operation,
+            "status": BulkJobStatus.RUNNING,
+            "matched": matched,
+            "processed": 0,
+            "chunks": 0,
+            "started_at": datetime.utcnow(),
+            "finished_at": None,
+            "error": None
+        }
+        self.jobs[job["job_id"]] = job
+        # Ne garder que les dernières opérations
+        while len(self.jobs) > self.history:
+            self.jobs.popitem(last=False)
+        return job
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+    
+    async def _propagate(self, job: Dict[str, Any], rows: List[Tuple[int, str, Optional[str]]], values: Optional[Dict[str, Any]]):
+        """Un pipeline Redis et un événement compact par lot"""
+        owners_by_device = {device_id: owner_id for _, device_id, owner_id in rows}
+        if values is None:
+            redis_helper.remove_devices(owners_by_device)
+            event = {"event_type": "bulk_deleted", "device_id": None, "data": {"job_id": job["job_id"], "device_ids": list(owners_by_device)}}
+        else:
+            statuses = {device_id: values["status"] for device_id in owners_by_device} if "status" in values else None
+            redis_helper.invalidate_devices(owners_by_device, statuses=statuses, all_owners="owner_id" in values)
+            event = {
+                "event_type": "bulk_updated",
+                "device_id": None,
+                "data": {"job_id": job["job_id"], "device_ids": list(owners_by_device), "changes": values}
+            }
+        await rabbitmq_helper.publish_device_events([event])
+    
+    async def run(
+        self,
+        job: Dict[str, Any],
+        db,
+        values: Optional[Dict[str, Any]] = None,
+        device_ids: Optional[List[str]] = None,
+        filter_dto: Optional[DeviceFilterDTO] = None
+    ) -> Dict[str, Any]:
+        """Exécuter l'opération lot par lot (values=None: suppression); chaque lot est validé et répercuté"""
+        from dal.device_manager_dal import AsyncDeviceDAL
+        
+        id_chunks = [device_ids[i:i + self.chunk_size] for i in range(0, len(device_ids), self.chunk_size)] if device_ids is not None else None
+        after_id = 0
+        try:
+            while True:
+                if id_chunks is not None:
+                    if not id_chunks:
+                        break
+                    selection = {"device_ids": id_chunks.pop(0)}
+                else:
+                    selection = {"filter_dto": filter_dto, "after_id": after_id, "limit": self.chunk_size}
+                
+                if values is None:
+                    rows = await AsyncDeviceDAL.bulk_delete_devices(db, **selection)
+                else:
+                    rows = await AsyncDeviceDAL.bulk_update_devices(db, values, **selection)
+                if id_chunks is None:
+                    if not rows:
+                        break
+                    after_id = max(row[0] for row in rows)
+                
+                job["processed"] += len(rows)
+                job["chunks"] += 1
+                if rows:
+                    await self._propagate(job, rows, values)
+            job["status"] = BulkJobStatus.COMPLETED
+        except Exception as e:
+            await db.rollback()
+            job["status"] = BulkJobStatus.FAILED
+            job["error"] = str(e)
+            logger.error(f"Bulk {job['operation']} {job['job_id']} failed after {job['processed']} devices: {e}")
+        job["finished_at"] = datetime.utcnow()
+        logger.info(f"Bulk {job['operation']} {job['job_id']}: {job['processed']} devices in {job['chunks']} chunks")
+        return job
+    
+    def start(self, job: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        """Exécuter l'opération en tâche de fond, avec sa propre session"""
+        async def run_in_background():
+            async with get_async_sessionlocal()() as db:
+                await self.run(job, db, **kwargs)
+        
+        task = asyncio.create_task(run_in_background())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+# Instance globale
+bulk_operations = BulkOperationHelper()
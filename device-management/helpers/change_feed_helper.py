@@ -0,0 +1,27 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from helpers.config import CHANGE_FEED_PURGE_INTERVAL, CHANGE_FEED_TOMBSTONE_RETENTION, get_async_sessionlocal
+
+logger = logging.getLogger(__name__)
+
+async def purge_expired_tombstones(session_factory=None, retention: int = CHANGE_FEED_TOMBSTONE_RETENTION) -> int:
+    """Supprimer les tombstones plus anciennes que la rétention (les jetons plus anciens reçoivent 410)"""
+    from dal.device_manager_dal import AsyncDeviceDAL
+    
+    session_factory = session_factory or get_async_sessionlocal()
+    async with session_factory() as db:
+        purged = await AsyncDeviceDAL.purge_tombstones(db, datetime.utcnow() - timedelta(seconds=retention))
+    if purged:
+        logger.info(f"Purged {purged} device tombstones")
+    return purged
+
+async def run_tombstone_purger(interval: float = CHANGE_FEED_PURGE_INTERVAL):
+    """Tâche de fond: purge périodique des tombstones expirées"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await purge_expired_tombstones()
+        except Exception as e:
+            logger.error(f"Tombstone purge failed: {e}")
@@ -1,12 +1,119 @@
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+import base64
+import csv
+import hashlib
+import io
+import json
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
 class DeviceHelper:
     """Helper pour la logique métier des devices"""
     
+    DATETIME_SORT_COLUMNS = ("created_at", "updated_at", "last_seen")
+    
+    @staticmethod
+    def encode_cursor(sort_by: str, sort_order: str, value: Any, device_db_id: int) -> str:
+        """Encoder un curseur opaque (colonne de tri + id) pour la pagination keyset"""
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        payload = json.dumps({"s": sort_by, "o": sort_order, "v": value, "i": device_db_id}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+    
+    @staticmethod
+    def decode_cursor(cursor: str, sort_by: str, sort_order: str) -> Tuple[Any, int]:
+        """Décoder un curseur et vérifier qu'il correspond au tri demandé"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            value, device_db_id = payload["v"], int(payload["i"])
+            if payload["s"] != sort_by or payload["o"] != sort_order:
+                raise ValueError("cursor does not match sort_by/sort_order")
+            if sort_by in DeviceHelper.DATETIME_SORT_COLUMNS and value is not None:
+                value = datetime.fromisoformat(value)
+            return value, device_db_id
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"malformed cursor: {e}")
+    
+    @staticmethod
+    def encode_change_token(after: Optional[Tuple[datetime, int]], deleted_after: Tuple[datetime, int]) -> str:
+        """Encoder les filigranes du flux de changements: dernier (updated_at, id) servi et dernière tombstone"""
+        payload = {
+            "u": after[0].isoformat() if after else None,
+            "i": after[1] if after else None,
+            "d": deleted_after[0].isoformat(),
+            "j": deleted_after[1]
+        }
+        return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+    
+    @staticmethod
+    def decode_change_token(token: str) -> Tuple[Optional[Tuple[datetime, int]], Tuple[datetime, int]]:
+        """Décoder un jeton du flux de changements"""
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            after = (datetime.fromisoformat(payload["u"]), int(payload["i"])) if payload["u"] is not None else None
+            return after, (datetime.fromisoformat(payload["d"]), int(payload["j"]))
+        except Exception as e:
+            raise ValueError(f"malformed change token: {e}")
+    
+    @staticmethod
+    def etag(version: int) -> str:
+        """ETag fort d'un device: sa version"""
+        return f'"{version}"'
+    
+    @staticmethod
+    def parse_if_match(header: str) -> Optional[int]:
+        """Version attendue d'un en-tête If-Match (None pour *, toute version acceptée)"""
+        value = header.strip()
+        if value == "*":
+            return None
+        if value.startswith("W/"):
+            value = value[2:]
+        try:
+            return int(value.strip('"'))
+        except ValueError:
+            raise ValueError(f"expected an ETag returned by this API, got {header!r}")
+    
+    @staticmethod
+    def build_list_cache_key(owner_id: Optional[str], generation: str, params: Dict[str, Any]) -> str:
+        """Construire la clé de cache d'une liste à partir des paramètres normalisés"""
+        normalized = {key: value for key, value in params.items() if value is not None}
+        if isinstance(normalized.get("search"), str):
+            normalized["search"] = normalized["search"].strip().lower()  # ILIKE: insensible à la casse
+        digest = hashlib.sha1(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()
+        return f"devices:list:{owner_id or '*'}:{generation}:{digest}"
+    
+    @staticmethod
+    def row_to_dict(row: Any) -> Dict[str, Any]:
+        """Réponse d'un device depuis une ligne DEVICE_RESPONSE_COLUMNS, sans entité ni validation Pydantic"""
+        data = row._asdict()
+        config = data["config"]
+        # Texte JSON écrit par json.dumps: inséré tel quel par orjson, sans re-parsing
+        data["config"] = orjson.Fragment(config) if isinstance(config, str) and config else (config or {})
+        return data
+    
+    @staticmethod
+    def rows_to_ndjson(rows: List[Any]) -> bytes:
+        """Un objet JSON par ligne (même forme que DeviceResponseDTO)"""
+        return b"".join(orjson.dumps(DeviceHelper.row_to_dict(row)) + b"\n" for row in rows)
+    
+    @staticmethod
+    def rows_to_csv(rows: List[Any], header: Optional[List[str]] = None) -> str:
+        """Lignes CSV (config en texte JSON, dates ISO 8601), précédées de l'en-tête si fourni"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(header)
+        for row in rows:
+            writer.writerow(value.isoformat() if isinstance(value, datetime) else value for value in row)
+        return buffer.getvalue()
+    
     @staticmethod
     def validate_device_data(device_data: Dict[str, Any]) -> tuple[bool, str]:
         """Valider les données d'un device"""
@@ -0,0 +1,32 @@
+import asyncio
+import logging
+
+from helpers.config import HEALTH_COUNTERS_RECONCILE_INTERVAL, get_sessionlocal
+from helpers.redis_helper import redis_helper
+
+logger = logging.getLogger(__name__)
+
+def reconcile_status_counters() -> bool:
+    """Comparer les compteurs de statut Redis à la base et les reconstruire en cas d'écart"""
+    from dal.device_manager_dal import DeviceDAL
+    
+    db = get_sessionlocal()()
+    try:
+        expected = {status: count for status, count in DeviceDAL.count_devices_by_status(db).items() if count > 0}
+        current = redis_helper.get_status_counts()
+        if current == expected:
+            return True
+        
+        logger.warning(f"Status counters out of sync (redis={current}, database={expected}), rebuilding")
+        return redis_helper.rebuild_status_counters(DeviceDAL.iter_device_statuses(db))
+    finally:
+        db.close()
+
+async def run_status_counters_reconciler(interval: int = HEALTH_COUNTERS_RECONCILE_INTERVAL):
+    """Tâche de fond: vérifier périodiquement les compteurs contre la base"""
+    while True:
+        try:
+            await asyncio.to_thread(reconcile_status_counters)
+        except Exception as e:
+            logger.error(f"Status counters reconciliation failed: {e}")
+        await asyncio.sleep(interval)
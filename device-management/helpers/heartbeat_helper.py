@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from helpers.config import HEARTBEAT_FLUSH_INTERVAL, HEARTBEAT_FLUSH_BATCH_SIZE, get_async_sessionlocal
+from helpers.redis_helper import redis_helper
+from helpers.rabbitmq_helper import rabbitmq_helper
+
+logger = logging.getLogger(__name__)
+
+class HeartbeatBuffer:
+    """Write-behind des heartbeats: dernier état par device en mémoire, écrit en base par lots"""
+    
+    def __init__(
+        self,
+        flush_interval: float = HEARTBEAT_FLUSH_INTERVAL,
+        batch_size: int = HEARTBEAT_FLUSH_BATCH_SIZE
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flush_lock = asyncio.Lock()
+        
+        self.stats = {
+            "received": 0,
+            "coalesced": 0,
+            "flushed": 0,
+            "unknown_devices": 0,
+            "status_changes": 0,
+            "failed_flushes": 0,
+            "last_flush_latency_ms": 0.0
+        }
+    
+    def record(
+        self,
+        device_id: str,
+        status: str,
+        battery_level: Optional[float] = None,
+        signal_strength: Optional[float] = None
+    ):
+        """Enregistrer un heartbeat; seul le plus récent par device est conservé"""
+        self.stats["received"] += 1
+        previous = self._pending.get(device_id)
+        if previous is not None:
+            self.stats["coalesced"] += 1
+            # Une mesure absente ne doit pas effacer une mesure reçue dans le même intervalle
+            if battery_level is None:
+                battery_level = previous["battery_level"]
+            if signal_strength is None:
+                signal_strength = previous["signal_strength"]
+        
+        self._pending[device_id] = {
+            "device_id": device_id,
+            "status": status,
+            "battery_level": battery_level,
+            "signal_strength": signal_strength,
+            "last_seen": datetime.utcnow()
+        }
+    
+    async def flush(self, session_factory=None) -> int:
+        """Écrire les heartbeats en attente (un UPDATE par lot) et répercuter les changements de statut"""
+        from dal.device_manager_dal import AsyncDeviceDAL
+        
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            # Échanger le tampon: les heartbeats reçus pendant l'écriture iront au prochain flush
+            pending, self._pending = self._pending, {}
+            heartbeats = list(pending.values())
+            session_factory = session_factory or get_async_sessionlocal()
+            
+            start = time.perf_counter()
+            rows = []
+            failed = False
+            try:
+                async with session_factory() as db:
+                    for i in range(0, len(heartbeats), self.batch_size):
+                        rows.extend(await AsyncDeviceDAL.apply_heartbeats(db, heartbeats[i:i + self.batch_size]))
+            except Exception as e:
+                failed = True
+                self.stats["failed_flushes"] += 1
+                logger.error(f"Failed to flush {len(heartbeats)} heartbeats: {e}")
+                # Remettre les heartbeats non écrits sans écraser ceux reçus entre-temps
+                written = {row[0] for row in rows}
+                for heartbeat in heartbeats:
+                    if heartbeat["device_id"] not in written:
+                        self._pending.setdefault(heartbeat["device_id"], heartbeat)
+                if not rows:
+                    return 0
+            
+            self.stats["flushed"] += len(rows)
+            if not failed:
+                self.stats["unknown_devices"] += len(heartbeats) - len(rows)
+            self.stats["last_flush_latency_ms"] = (time.perf_counter() - start) * 1000
+            
+            changed = [row for row in rows if row[2] != row[3]]
+            self.stats["status_changes"] += len(changed)
+            
+            redis_helper.invalidate_devices(
+                {device_id: owner_id for device_id, owner_id, _, _ in rows},
+                statuses={device_id: new_status for device_id, _, _, new_status in changed}
+            )
+            
+            # Un événement uniquement quand le statut change réellement
+            await rabbitmq_helper.publish_device_events([
+                {
+                    "event_type": "status_updated",
+                    "device_id": device_id,
+                    "data": {
+                        **pending[device_id],
+                        "last_seen": pending[device_id]["last_seen"].isoformat(),
+                        "owner_id": owner_id,
+                        "previous_status": old_status
+                    }
+                }
+                for device_id, owner_id, old_status, _ in changed
+            ])
+            return len(rows)
+    
+    async def run(self):
+        """Tâche de fond: flush à intervalle fixe"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Heartbeat flush failed: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": len(self._pending)}
+
+# Instance globale
+heartbeat_buffer = HeartbeatBuffer()
@@ -0,0 +1,133 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from helpers.config import (
+    LOG_LEVEL, LOG_FILE, LOG_FORMAT, LOG_QUEUE_SIZE,
+    ACCESS_LOG_SAMPLE_RATE, ACCESS_LOG_SLOW_MS
+)
+
+# Identifiant de la requête en cours, propagé à tous les logs émis pendant son traitement
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributs standard d'un LogRecord: le reste vient de extra={...} et devient un champ JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement (champs extra inclus)"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-")
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui abandonne (et compte) les enregistrements quand la file est pleine"""
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Exécuté dans le thread appelant: capturer le contexte et rendre l'enregistrement sérialisable
+        record = logging.makeLogRecord(record.__dict__)
+        record.request_id = request_id_var.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+def _build_handlers(log_file: str, log_format: str) -> List[logging.Handler]:
+    if log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s")
+    handlers: List[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    try:
+        handlers.append(logging.FileHandler(log_file))
+    except OSError as e:
+        print(f"Warning: log file {log_file} unavailable: {e}")
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+def setup_logging(
+    level: str = LOG_LEVEL,
+    log_file: str = LOG_FILE,
+    log_format: str = LOG_FORMAT,
+    queue_size: int = LOG_QUEUE_SIZE
+) -> NonBlockingQueueHandler:
+    """Router le logger racine vers une file; les écritures disque/stdout se font dans un thread dédié"""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        return _queue_handler
+    
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(
+        log_queue, *_build_handlers(log_file, log_format), respect_handler_level=True
+    )
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    
+    _listener.start()
+    atexit.register(stop_logging)
+    return _queue_handler
+
+def stop_logging():
+    """Vider la file et arrêter le thread d'écriture (idempotent)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def should_log_access(status_code: int, duration_ms: float, sample_rate: float = ACCESS_LOG_SAMPLE_RATE) -> bool:
+    """Échantillonnage du log d'accès: erreurs et requêtes lentes toujours conservées"""
+    if status_code >= 400 or duration_ms >= ACCESS_LOG_SLOW_MS:
+        return True
+    return sample_rate >= 1 or random.random() < sample_rate
+
+def get_logging_stats() -> Dict[str, Any]:
+    if _queue_handler is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+        "access_log_sample_rate": ACCESS_LOG_SAMPLE_RATE
+    }
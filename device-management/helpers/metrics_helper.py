@@ -0,0 +1,101 @@
+import time
+from typing import Dict
+
+from prometheus_client import Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+# Latence HTTP par modèle de route (pas par URL: cardinalité bornée)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection",
+    ["pool"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+
+RABBITMQ_PUBLISH_LATENCY = Histogram(
+    "rabbitmq_publish_batch_duration_seconds",
+    "Time to publish one batch of device events (confirms included)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+_pools: Dict[str, Pool] = {}
+
+def _timed_get(pool_cls):
+    """Sous-classe de pool mesurant l'attente de chaque checkout"""
+    class TimedPool(pool_cls):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                DB_POOL_WAIT.labels(pool=getattr(self, "_metrics_name", "default")).observe(time.perf_counter() - start)
+    
+    TimedPool.__name__ = f"Timed{pool_cls.__name__}"
+    return TimedPool
+
+TimedQueuePool = _timed_get(QueuePool)
+TimedAsyncAdaptedQueuePool = _timed_get(AsyncAdaptedQueuePool)
+
+def register_pool(name: str, pool: Pool):
+    """Exposer l'occupation d'un pool SQLAlchemy (appelé à la création du moteur)"""
+    pool._metrics_name = name
+    _pools[name] = pool
+
+class ServiceStatsCollector:
+    """Expose à chaque scrape les compteurs déjà tenus par les helpers (pools, caches, broker)"""
+    
+    def describe(self):
+        # Sans describe, REGISTRY.register appelle collect et importe des helpers en cours d'import
+        return []
+    
+    def collect(self):
+        size = GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["pool"])
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections currently checked out", labels=["pool"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Connections opened beyond pool_size", labels=["pool"])
+        for name, pool in _pools.items():
+            if isinstance(pool, QueuePool):
+                size.add_metric([name], pool.size())
+                checked_out.add_metric([name], pool.checkedout())
+                overflow.add_metric([name], max(pool.overflow(), 0))
+        yield size
+        yield checked_out
+        yield overflow
+        
+        from helpers.redis_helper import redis_helper
+        cache_stats = redis_helper.get_cache_stats()
+        cache = CounterMetricFamily("device_cache_operations", "Device cache lookups by tier and outcome", labels=["tier", "outcome"])
+        for tier in ("local", "redis", "list"):
+            for outcome in ("hits", "misses", "errors", "stale_served", "evictions", "expirations"):
+                if outcome in cache_stats[tier]:
+                    cache.add_metric([tier, outcome], cache_stats[tier][outcome])
+        yield cache
+        
+        from helpers.rabbitmq_helper import rabbitmq_helper
+        broker_stats = rabbitmq_helper.get_stats()
+        events = CounterMetricFamily("rabbitmq_events", "Device events by publishing outcome", labels=["outcome"])
+        for outcome in ("published", "failed", "dropped"):
+            events.add_metric([outcome], broker_stats[outcome])
+        yield events
+        yield CounterMetricFamily("rabbitmq_event_retries", "Device events requeued after a failed publish", value=broker_stats["retried"])
+        yield GaugeMetricFamily("rabbitmq_events_buffered", "Device events waiting to be published", value=broker_stats["buffered"])
+        yield GaugeMetricFamily("rabbitmq_connected", "1 if the RabbitMQ connection is open", value=int(broker_stats["connected"]))
+        
+        from helpers.auth_helper import AuthHelper
+        token_stats = AuthHelper.get_token_cache_stats()
+        if token_stats["enabled"]:
+            tokens = CounterMetricFamily("auth_token_cache_operations", "Verified-token cache lookups", labels=["outcome"])
+            tokens.add_metric(["hits"], token_stats["hits"])
+            tokens.add_metric(["misses"], token_stats["misses"])
+            tokens.add_metric(["negative_hits"], token_stats["negative_hits"])
+            yield tokens
+
+REGISTRY.register(ServiceStatsCollector())
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from helpers.config import (
+    DEVICE_HEARTBEAT_TIMEOUT,
+    OFFLINE_SWEEP_INTERVAL,
+    OFFLINE_SWEEP_LOCK_ID,
+    get_async_engine,
+    get_async_sessionlocal
+)
+from helpers.redis_helper import redis_helper
+from helpers.rabbitmq_helper import rabbitmq_helper
+
+logger = logging.getLogger(__name__)
+
+async def sweep_offline_devices(session_factory=None, timeout: int = DEVICE_HEARTBEAT_TIMEOUT) -> int:
+    """Passer offline les devices sans heartbeat depuis timeout secondes et répercuter en lot"""
+    from dal.device_manager_dal import AsyncDeviceDAL
+    
+    session_factory = session_factory or get_async_sessionlocal()
+    # last_seen est écrit en UTC par l'application: le seuil est calculé de la même façon
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout)
+    async with session_factory() as db:
+        rows = await AsyncDeviceDAL.mark_stale_devices_offline(db, cutoff)
+    
+    if not rows:
+        return 0
+    
+    redis_helper.invalidate_devices(
+        {device_id: owner_id for device_id, owner_id in rows},
+        statuses={device_id: "offline" for device_id, _ in rows}
+    )
+    await rabbitmq_helper.publish_device_events([
+        {
+            "event_type": "status_updated",
+            "device_id": device_id,
+            "data": {
+                "device_id": device_id,
+                "owner_id": owner_id,
+                "status": "offline",
+                "previous_status": "online",
+                "reason": "heartbeat_timeout"
+            }
+        }
+        for device_id, owner_id in rows
+    ])
+    logger.info(f"Marked {len(rows)} silent devices offline")
+    return len(rows)
+
+class OfflineSweeper:
+    """Balayage sur un seul réplica: le leader tient un verrou consultatif de session sur une connexion dédiée"""
+    
+    def __init__(self, lock_id: int = OFFLINE_SWEEP_LOCK_ID, engine=None, session_factory=None):
+        self.lock_id = lock_id
+        self._engine = engine
+        self.session_factory = session_factory
+        self._connection: Optional[AsyncConnection] = None
+    
+    @property
+    def is_leader(self) -> bool:
+        return self._connection is not None
+    
+    async def acquire_leadership(self) -> bool:
+        """Devenir leader si le verrou est libre; le leader vérifie que sa connexion (donc le verrou) tient toujours"""
+        from dal.device_manager_dal import AsyncDeviceDAL
+        
+        if self._connection is not None:
+            try:
+                await self._connection.execute(text("SELECT 1"))
+                await self._connection.commit()
+                return True
+            except Exception as e:
+                # Connexion perdue: le serveur a relâché le verrou, un autre réplica peut l'avoir pris
+                logger.warning(f"Offline sweeper lost its lock connection: {e}")
+                await self._discard_connection()
+        
+        connection = await (self._engine or get_async_engine()).connect()
+        try:
+            acquired = await AsyncDeviceDAL.try_advisory_lock(connection, self.lock_id)
+            # Verrou de session: il survit au commit, la connexion ne reste pas « idle in transaction »
+            await connection.commit()
+        except Exception:
+            await connection.close()
+            raise
+        if not acquired:
+            await connection.close()
+            return False
+        
+        self._connection = connection
+        logger.info("Offline sweeper leadership acquired")
+        return True
+    
+    async def release(self):
+        """Relâcher le verrou (arrêt de l'application) pour qu'un autre réplica prenne le relais"""
+        from dal.device_manager_dal import AsyncDeviceDAL
+        
+        if self._connection is None:
+            return
+        try:
+            await AsyncDeviceDAL.advisory_unlock(self._connection, self.lock_id)
+            await self._connection.commit()
+            await self._connection.close()
+            self._connection = None
+            logger.info("Offline sweeper leadership released")
+        except Exception as e:
+            logger.error(f"Failed to release offline sweeper lock: {e}")
+            await self._discard_connection()
+    
+    async def _discard_connection(self):
+        # Connexion invalidée plutôt que rendue au pool: elle ne doit pas y retourner en tenant le verrou
+        connection, self._connection = self._connection, None
+        try:
+            await connection.invalidate()
+            await connection.close()
+        except Exception:
+            pass
+    
+    async def tick(self) -> Optional[int]:
+        """Un balayage si ce réplica est leader; None sinon"""
+        if not await self.acquire_leadership():
+            return None
+        return await sweep_offline_devices(self.session_factory)
+    
+    async def run(self, interval: float = OFFLINE_SWEEP_INTERVAL):
+        """Tâche de fond: le leader balaie à chaque intervalle, les autres réplicas retentent d'acquérir le verrou"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Offline sweep failed: {e}")
+
+# Instance globale
+offline_sweeper = OfflineSweeper()
@@ -1,110 +1,230 @@
-import pika
+import aio_pika
+import asyncio
 import json
 import logging
-from helpers.config import RABBITMQ_URL
-from typing import Optional, Dict, Any
+import time
+from aio_pika.pool import Pool
+from helpers.config import (
+    RABBITMQ_URL,
+    RABBITMQ_CHANNEL_POOL_SIZE,
+    RABBITMQ_PUBLISHER_CONFIRMS,
+    RABBITMQ_BUFFER_SIZE,
+    RABBITMQ_BATCH_SIZE,
+    RABBITMQ_FLUSH_INTERVAL,
+    RABBITMQ_RECONNECT_INTERVAL,
+    RABBITMQ_MAX_RETRIES
+)
+from helpers.metrics_helper import RABBITMQ_PUBLISH_LATENCY
+from typing import Optional, Dict, Any, List
 
 logger = logging.getLogger(__name__)
 
 class RabbitMQHelper:
-    """Helper pour la gestion de RabbitMQ"""
+    """Helper pour la gestion de RabbitMQ (publication asynchrone par lots)"""
     
-    def __init__(self):
-        self.connection: Optional[pika.BlockingConnection] = None
-        self.channel: Optional[pika.adapters.blocking_connection.BlockingChannel] = None
+    def __init__(
+        self,
+        buffer_size: int = RABBITMQ_BUFFER_SIZE,
+        batch_size: int = RABBITMQ_BATCH_SIZE,
+        flush_interval: float = RABBITMQ_FLUSH_INTERVAL,
+        max_retries: int = RABBITMQ_MAX_RETRIES
+    ):
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.channel_pool: Optional[Pool] = None
         self.exchange_name = "device_events"
         self.queue_name = "device_events_queue"
+        
+        # File bornée: les requêtes ne font qu'enfiler, une tâche de fond publie
+        self.buffer: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._batch_ready = asyncio.Event()
+        self._retry_batch: List[Dict[str, Any]] = []
+        self._retry_attempts = 0
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_connect_attempt = 0.0
+        self._failing = False
+        
+        self.stats = {
+            "published": 0,
+            "failed": 0,  # événements abandonnés après max_retries nouveaux essais
+            "retried": 0,  # événements remis en file après un échec de publication
+            "dropped": 0,
+            "batches": 0,
+            "last_batch_latency_ms": 0.0
+        }
     
-    async def connect(self):
-        """Établir une connexion à RabbitMQ"""
-        try:
-            credentials = pika.PlainCredentials('guest', 'guest')
-            parameters = pika.ConnectionParameters(
-                'rabbitmq',
-                5672,
-                '/',
-                credentials=credentials,
-                heartbeat=600,
-                blocked_connection_timeout=300
-            )
-            self.connection = pika.BlockingConnection(parameters)
-            self.channel = self.connection.channel()
-            
-            # Déclarer l'exchange et la queue
-            self.channel.exchange_declare(
-                exchange=self.exchange_name,
-                exchange_type='topic',
-                durable=True
-            )
-            
-            self.channel.queue_declare(
-                queue=self.queue_name,
+    async def _get_channel(self) -> aio_pika.abc.AbstractChannel:
+        return await self.connection.channel(publisher_confirms=RABBITMQ_PUBLISHER_CONFIRMS)
+    
+    async def _open_connection(self):
+        """Ouvrir la connexion, le pool de canaux et déclarer l'exchange et la queue"""
+        self._last_connect_attempt = time.monotonic()
+        self.connection = await aio_pika.connect_robust(RABBITMQ_URL)
+        self.channel_pool = Pool(self._get_channel, max_size=RABBITMQ_CHANNEL_POOL_SIZE)
+        
+        async with self.channel_pool.acquire() as channel:
+            await channel.declare_exchange(
+                self.exchange_name,
+                aio_pika.ExchangeType.TOPIC,
                 durable=True
             )
-            
+            await channel.declare_queue(self.queue_name, durable=True)
+    
+    def is_connected(self) -> bool:
+        return self.connection is not None and not self.connection.is_closed
+    
+    async def connect(self):
+        """Démarrer le publisher et établir une connexion à RabbitMQ"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        
+        try:
+            await self._open_connection()
             logger.info("Connected to RabbitMQ successfully")
         except Exception as e:
             logger.error(f"Failed to connect to RabbitMQ: {e}")
             raise
     
     async def close(self):
-        """Fermer la connexion à RabbitMQ"""
+        """Publier les événements en attente puis fermer la connexion à RabbitMQ"""
         try:
+            if self._flusher:
+                self._flusher.cancel()
+                self._flusher = None
+            if self.is_connected():
+                await asyncio.wait_for(self.flush(), timeout=5)
+            if self.channel_pool:
+                await self.channel_pool.close()
             if self.connection and not self.connection.is_closed:
-                self.connection.close()
+                await self.connection.close()
                 logger.info("RabbitMQ connection closed")
         except Exception as e:
             logger.error(f"Error closing RabbitMQ connection: {e}")
     
+    def _enqueue(self, message: Dict[str, Any]):
+        try:
+            self.buffer.put_nowait(message)
+        except asyncio.QueueFull:
+            # Broker indisponible ou trop lent: on compte plutôt que de logger chaque requête
+            self.stats["dropped"] += 1
+            return
+        if self.buffer.qsize() >= self.batch_size:
+            self._batch_ready.set()
+    
     async def publish_device_event(
         self,
         event_type: str,
         device_id: str,
         data: Dict[str, Any]
     ):
-        """Publier un événement de device"""
-        try:
-            if not self.channel:
-                logger.warning("RabbitMQ channel not initialized")
-                return
-            
-            message = {
-                "event_type": event_type,
-                "device_id": device_id,
-                "data": data
-            }
-            
-            routing_key = f"device.{event_type}"
-            
-            self.channel.basic_publish(
-                exchange=self.exchange_name,
-                routing_key=routing_key,
-                body=json.dumps(message),
-                properties=pika.BasicProperties(
-                    delivery_mode=2,  # persistent
-                    content_type='application/json'
+        """Publier un événement de device (mis en file, publié par lot en arrière-plan)"""
+        self._enqueue({
+            "event_type": event_type,
+            "device_id": device_id,
+            "data": data
+        })
+    
+    async def publish_device_events(self, events: List[Dict[str, Any]]):
+        """Publier un lot d'événements de device (un message par device)"""
+        for event in events:
+            self._enqueue(event)
+    
+    async def _publish_batch(self, batch: List[Dict[str, Any]]):
+        """Publier un lot sur un canal du pool (confirmations attendues en parallèle)"""
+        async with self.channel_pool.acquire() as channel:
+            exchange = await channel.get_exchange(self.exchange_name, ensure=False)
+            await asyncio.gather(*(
+                exchange.publish(
+                    aio_pika.Message(
+                        body=json.dumps(message).encode(),
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                        content_type='application/json'
+                    ),
+                    routing_key=f"device.{message['event_type']}"
                 )
-            )
+                for message in batch
+            ))
+    
+    async def flush(self):
+        """Vider la file par lots de batch_size"""
+        while self._retry_batch or not self.buffer.empty():
+            batch = self._retry_batch
+            self._retry_batch = []
+            # Un lot en échec est réessayé tel quel: ses événements partagent le même nombre d'essais
+            while not self._retry_attempts and len(batch) < self.batch_size and not self.buffer.empty():
+                batch.append(self.buffer.get_nowait())
             
-            logger.info(f"Device event published: {event_type} - {device_id}")
-        except Exception as e:
-            logger.error(f"Failed to publish device event: {e}")
+            start = time.perf_counter()
+            try:
+                if not self.is_connected():
+                    if time.monotonic() - self._last_connect_attempt < RABBITMQ_RECONNECT_INTERVAL:
+                        raise ConnectionError("RabbitMQ not connected")
+                    await self._open_connection()
+                await self._publish_batch(batch)
+            except Exception as e:
+                if not self._failing:
+                    logger.error(f"Failed to publish device events, buffering: {e}")
+                    self._failing = True
+                if self._retry_attempts >= self.max_retries:
+                    # Échec définitif: chaque événement n'est compté qu'une fois
+                    logger.error(f"Dropping {len(batch)} device events after {self._retry_attempts} retries")
+                    self.stats["failed"] += len(batch)
+                    self._retry_attempts = 0
+                    return
+                # Conserver le lot pour le prochain essai; la file reste bornée
+                self._retry_batch = batch
+                self._retry_attempts += 1
+                self.stats["retried"] += len(batch)
+                return
+            
+            self._retry_attempts = 0
+            if self._failing:
+                logger.info("RabbitMQ publishing recovered")
+                self._failing = False
+            elapsed = time.perf_counter() - start
+            RABBITMQ_PUBLISH_LATENCY.observe(elapsed)
+            self.stats["published"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["last_batch_latency_ms"] = elapsed * 1000
+    
+    async def _flush_loop(self):
+        """Tâche de fond: publier dès qu'un lot est plein ou que l'intervalle est écoulé"""
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Device events flush failed: {e}")
+            if self._failing:
+                await asyncio.sleep(RABBITMQ_RECONNECT_INTERVAL)
     
-    def consume_device_events(self, callback):
+    def get_stats(self) -> Dict[str, Any]:
+        """Métriques du publisher (file bornée, publiés, échecs, pertes)"""
+        return {
+            **self.stats,
+            "connected": self.is_connected(),
+            "buffered": self.buffer.qsize() + len(self._retry_batch),
+            "buffer_capacity": self.buffer.maxsize
+        }
+    
+    async def consume_device_events(self, callback):
         """Consommer les événements de device"""
         try:
-            if not self.channel:
-                logger.warning("RabbitMQ channel not initialized")
+            if not self.is_connected():
+                logger.warning("RabbitMQ connection not initialized")
                 return
             
-            self.channel.basic_consume(
-                queue=self.queue_name,
-                on_message_callback=callback,
-                auto_ack=False
-            )
+            channel = await self.connection.channel()
+            queue = await channel.declare_queue(self.queue_name, durable=True)
+            await queue.consume(callback)
             
             logger.info("Started consuming device events")
-            self.channel.start_consuming()
         except Exception as e:
             logger.error(f"Error consuming device events: {e}")
 
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from sqlalchemy import text
+
+from helpers.config import (
+    STARTUP_DB_TIMEOUT,
+    STARTUP_REDIS_TIMEOUT,
+    STARTUP_RABBITMQ_TIMEOUT,
+    DB_POOL_PREWARM,
+    READINESS_CHECK_TIMEOUT,
+    READINESS_REQUIRED,
+    get_engine,
+    get_async_engine
+)
+from helpers.redis_helper import redis_helper
+from helpers.rabbitmq_helper import rabbitmq_helper
+
+logger = logging.getLogger(__name__)
+
+def prewarm_sync_pool(count: int = DB_POOL_PREWARM):
+    """Ouvrir count connexions synchrones et les rendre au pool"""
+    engine = get_engine()
+    connections = []
+    try:
+        for _ in range(count):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+
+async def prewarm_async_pool(count: int = DB_POOL_PREWARM):
+    """Ouvrir count connexions asynchrones en parallèle et les rendre au pool"""
+    engine = get_async_engine()
+    
+    async def open_one():
+        connection = await engine.connect()
+        try:
+            await connection.execute(text("SELECT 1"))
+        except Exception:
+            await connection.close()
+            raise
+        return connection
+    
+    results = await asyncio.gather(*(open_one() for _ in range(count)), return_exceptions=True)
+    # Toutes ouvertes en même temps, puis rendues: le pool les conserve
+    for result in results:
+        if not isinstance(result, BaseException):
+            await result.close()
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+class ReadinessHelper:
+    """Initialisation concurrente et bornée des dépendances, et état de préparation pour /ready"""
+    
+    def __init__(self):
+        self.started = False
+        self.startup: Dict[str, Dict[str, Any]] = {}
+        self.startup_duration_ms = 0.0
+    
+    async def _init_database(self):
+        from entities.database import init_db
+        await asyncio.to_thread(init_db)
+        await asyncio.gather(
+            asyncio.to_thread(prewarm_sync_pool, DB_POOL_PREWARM),
+            prewarm_async_pool(DB_POOL_PREWARM)
+        )
+    
+    async def _init_redis(self):
+        if not await asyncio.to_thread(redis_helper.connect, STARTUP_REDIS_TIMEOUT):
+            raise ConnectionError("Redis not available, caching disabled")
+    
+    async def _init_rabbitmq(self):
+        await rabbitmq_helper.connect()
+    
+    async def _run(self, name: str, init: Callable[[], Awaitable[Any]], timeout: float) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(init(), timeout=timeout)
+            result = {"state": "ready"}
+        except asyncio.TimeoutError:
+            result = {"state": "timeout", "error": f"not ready after {timeout}s"}
+        except Exception as e:
+            result = {"state": "failed", "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        
+        if result["state"] == "ready":
+            logger.info(f"{name} initialized in {result['latency_ms']}ms")
+        else:
+            logger.warning(f"{name} initialization {result['state']}: {result['error']}")
+        self.startup[name] = result
+        return result
+    
+    async def initialize(self) -> Dict[str, Dict[str, Any]]:
+        """Initialiser base, Redis et RabbitMQ en parallèle, chacun avec son délai"""
+        start = time.perf_counter()
+        await asyncio.gather(
+            self._run("database", self._init_database, STARTUP_DB_TIMEOUT),
+            self._run("redis", self._init_redis, STARTUP_REDIS_TIMEOUT),
+            self._run("rabbitmq", self._init_rabbitmq, STARTUP_RABBITMQ_TIMEOUT)
+        )
+        self.startup_duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        self.started = True
+        return self.startup
+    
+    async def _check_database(self):
+        async with get_async_engine().connect() as connection:
+            await connection.execute(text("SELECT 1"))
+    
+    async def _check_redis(self):
+        if redis_helper.client is None:
+            raise ConnectionError("not connected")
+        await asyncio.to_thread(redis_helper.client.ping)
+    
+    async def _check_rabbitmq(self):
+        if not rabbitmq_helper.is_connected():
+            raise ConnectionError("not connected")
+    
+    async def _probe(self, check: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), timeout=READINESS_CHECK_TIMEOUT)
+            result = {"state": "ready"}
+        except asyncio.TimeoutError:
+            result = {"state": "timeout"}
+        except Exception as e:
+            result = {"state": "failed", "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return result
+    
+    async def check(self) -> Dict[str, Any]:
+        """Sonder chaque dépendance en parallèle; prêt si le démarrage est terminé et les dépendances requises répondent"""
+        names = ("database", "redis", "rabbitmq")
+        results = await asyncio.gather(
+            self._probe(self._check_database),
+            self._probe(self._check_redis),
+            self._probe(self._check_rabbitmq)
+        )
+        dependencies = dict(zip(names, results))
+        for name, result in dependencies.items():
+            result["required"] = name in READINESS_REQUIRED
+        
+        ready = self.started and all(
+            result["state"] == "ready" for result in dependencies.values() if result["required"]
+        )
+        return {
+            "ready": ready,
+            "started": self.started,
+            "startup_duration_ms": self.startup_duration_ms,
+            "dependencies": dependencies
+        }
+
+# Instance globale
+readiness_helper = ReadinessHelper()
@@ -1,29 +1,136 @@
 import redis
 import json
+import orjson
 import logging
-from helpers.config import REDIS_URL, CACHE_TTL
-from typing import Optional, Dict, Any
+import time
+import uuid
+from helpers.config import (
+    REDIS_URL,
+    CACHE_TTL,
+    CACHE_SWR_ENABLED,
+    CACHE_STALE_TTL,
+    CACHE_REFRESH_LOCK_TTL,
+    HEALTH_SUMMARY_MODE,
+    LOCAL_CACHE_ENABLED,
+    LOCAL_CACHE_MAX_SIZE,
+    LOCAL_CACHE_TTL,
+    CACHE_INVALIDATION_CHANNEL
+)
+from helpers.local_cache import LocalLRUCache
+from typing import Optional, Dict, Any, Iterable, List, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Compteurs de statut: hash device_id -> status et hash status -> nombre.
+# Le hashtag {devices} garde les deux clés sur le même slot (Redis Cluster).
+DEVICE_STATUS_KEY = "{devices}:status"
+STATUS_COUNTS_KEY = "{devices}:status_counts"
+
+# Changer le statut d'un device et ajuster les compteurs de manière atomique
+SET_STATUS_SCRIPT = """
+local old = redis.call('HGET', KEYS[1], ARGV[1])
+if old == ARGV[2] then return 0 end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+if old then redis.call('HINCRBY', KEYS[2], old, -1) end
+redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+return 1
+"""
+
+REMOVE_STATUS_SCRIPT = """
+local old = redis.call('HGET', KEYS[1], ARGV[1])
+if not old then return 0 end
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('HINCRBY', KEYS[2], old, -1)
+return 1
+"""
+
+# Générations des listes en cache: toute écriture incrémente la génération globale
+# et celle du propriétaire; un changement de propriétaire incrémente l'époque.
+LIST_GENERATION_PREFIX = "devices:list:gen:owner:"
+LIST_GENERATION_ALL_KEY = "devices:list:gen:*"
+LIST_GENERATION_EPOCH_KEY = "devices:list:gen:epoch"
+
+# Libérer le verrou de rechargement seulement s'il appartient encore à l'appelant
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
 class RedisHelper:
     """Helper pour la gestion de Redis"""
     
     def __init__(self):
         self.client: Optional[redis.Redis] = None
         self.ttl = CACHE_TTL
+        # Copie périmée (device:stale:*) survivant aux expirations et invalidations, supprimée avec le device
+        self.stale_ttl = CACHE_TTL + CACHE_STALE_TTL if CACHE_SWR_ENABLED else None
+        self.status_counters_enabled = HEALTH_SUMMARY_MODE == "redis"
+        
+        # Cache local (niveau 1) devant Redis (niveau 2), invalidé par pub/sub
+        self.local_cache = LocalLRUCache(LOCAL_CACHE_MAX_SIZE, LOCAL_CACHE_TTL) if LOCAL_CACHE_ENABLED else None
+        self.instance_id = uuid.uuid4().hex
+        self._pubsub_thread = None
+        self._last_pubsub_error = 0.0
+        self.redis_stats = {"hits": 0, "misses": 0, "errors": 0, "stale_served": 0}
+        self.list_stats = {"hits": 0, "misses": 0}
     
-    def connect(self):
+    def connect(self, timeout: Optional[float] = None):
         """Établir une connexion à Redis"""
         try:
-            self.client = redis.from_url(REDIS_URL, decode_responses=True)
+            self.client = redis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=timeout)
             self.client.ping()
+            self._start_invalidation_listener()
             logger.info("Connected to Redis successfully")
             return self.client
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {e}")
             return None
     
+    def _start_invalidation_listener(self):
+        """S'abonner au canal d'invalidation pour purger le cache local des autres réplicas"""
+        if self.local_cache is None or self._pubsub_thread is not None:
+            return
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{CACHE_INVALIDATION_CHANNEL: self._on_invalidation})
+        self._pubsub_thread = pubsub.run_in_thread(
+            sleep_time=1.0,
+            daemon=True,
+            exception_handler=self._on_pubsub_error
+        )
+    
+    def _on_invalidation(self, message):
+        try:
+            payload = json.loads(message["data"])
+            if payload.get("origin") == self.instance_id:
+                return
+            for device_id in payload.get("ids", []):
+                self.local_cache.delete(f"device:{device_id}")
+        except Exception as e:
+            logger.error(f"Invalid cache invalidation message: {e}")
+            self.local_cache.clear()
+    
+    def _on_pubsub_error(self, error, pubsub, thread):
+        # Sans canal d'invalidation, le cache local ne peut plus être considéré à jour
+        if time.monotonic() - self._last_pubsub_error > LOCAL_CACHE_TTL:
+            logger.error(f"Cache invalidation channel lost, local cache bypassed: {error}")
+        self._last_pubsub_error = time.monotonic()
+        self.local_cache.clear()
+        time.sleep(1.0)
+    
+    def _local_cache_usable(self) -> bool:
+        return (
+            self.local_cache is not None
+            and self._pubsub_thread is not None
+            and time.monotonic() - self._last_pubsub_error > LOCAL_CACHE_TTL
+        )
+    
+    def _publish_invalidation(self, pipe, device_ids: List[str]):
+        if self.local_cache is not None and device_ids:
+            pipe.publish(
+                CACHE_INVALIDATION_CHANNEL,
+                json.dumps({"origin": self.instance_id, "ids": device_ids})
+            )
+    
     def get_client(self) -> Optional[redis.Redis]:
         """Obtenir le client Redis"""
         if not self.client:
@@ -33,63 +140,295 @@ class RedisHelper:
     def close(self):
         """Fermer la connexion à Redis"""
         try:
+            if self._pubsub_thread is not None:
+                self._pubsub_thread.stop()
+                self._pubsub_thread = None
             if self.client:
                 self.client.close()
                 logger.info("Redis connection closed")
         except Exception as e:
             logger.error(f"Error closing Redis connection: {e}")
     
-    def cache_device(self, device_id: str, device_data: Dict[str, Any]) -> bool:
-        """Mettre en cache les données d'un device"""
+    def cache_device(self, device_id: str, device_data: Dict[str, Any], notify: bool = True) -> bool:
+        """Mettre en cache les données d'un device (notify: invalider le cache local des autres réplicas)"""
+        key = f"device:{device_id}"
+        if self.local_cache is not None:
+            self.local_cache.delete(key)
         try:
             client = self.get_client()
             if not client:
                 return False
             
-            key = f"device:{device_id}"
-            client.setex(
+            pipe = client.pipeline(transaction=False)
+            pipe.setex(
                 key,
                 self.ttl,
-                json.dumps(device_data)
+                orjson.dumps(device_data)
             )
+            self._queue_stale_copies(pipe, {device_id: device_data})
+            if notify:
+                self._publish_invalidation(pipe, [device_id])
+            pipe.execute()
+            
+            if self._local_cache_usable():
+                self.local_cache.set(key, device_data)
             return True
         except Exception as e:
             logger.error(f"Error caching device {device_id}: {e}")
             return False
     
     def get_cached_device(self, device_id: str) -> Optional[Dict[str, Any]]:
-        """Récupérer un device du cache"""
+        """Récupérer un device du cache (local puis Redis)"""
+        key = f"device:{device_id}"
+        local_usable = self._local_cache_usable()
+        if local_usable:
+            cached = self.local_cache.get(key)
+            if cached is not None:
+                return cached
+        
         try:
             client = self.get_client()
             if not client:
                 return None
             
-            key = f"device:{device_id}"
             data = client.get(key)
             
             if data:
-                return json.loads(data)
+                self.redis_stats["hits"] += 1
+                device_data = orjson.loads(data)
+                if local_usable:
+                    self.local_cache.set(key, device_data)
+                return device_data
+            self.redis_stats["misses"] += 1
             return None
         except Exception as e:
+            self.redis_stats["errors"] += 1
             logger.error(f"Error retrieving cached device {device_id}: {e}")
             return None
     
     def invalidate_device_cache(self, device_id: str) -> bool:
         """Invalider le cache d'un device"""
+        return self.invalidate_devices_cache([device_id])
+    
+    def invalidate_devices_cache(self, device_ids: Iterable[str]) -> bool:
+        """Invalider le cache de plusieurs devices en un seul aller-retour (pipeline)"""
+        device_ids = list(device_ids)
+        if not device_ids:
+            return True
+        if self.local_cache is not None:
+            for device_id in device_ids:
+                self.local_cache.delete(f"device:{device_id}")
+        try:
+            client = self.get_client()
+            if not client:
+                return False
+            
+            pipe = client.pipeline(transaction=False)
+            pipe.delete(*[f"device:{device_id}" for device_id in device_ids])
+            self._publish_invalidation(pipe, device_ids)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error invalidating cache for {len(device_ids)} devices: {e}")
+            return False
+    
+    def _queue_stale_copies(self, pipe, devices_data: Dict[str, Dict[str, Any]]):
+        if self.stale_ttl is None:
+            return
+        for device_id, device_data in devices_data.items():
+            pipe.setex(f"device:stale:{device_id}", self.stale_ttl, orjson.dumps(device_data))
+    
+    def get_stale_device(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """Dernière valeur connue d'un device (expirée ou invalidée), pour stale-while-revalidate"""
+        if self.stale_ttl is None:
+            return None
+        try:
+            client = self.get_client()
+            if not client:
+                return None
+            data = client.get(f"device:stale:{device_id}")
+            if data:
+                self.redis_stats["stale_served"] += 1
+                return orjson.loads(data)
+            return None
+        except Exception as e:
+            logger.error(f"Error retrieving stale device {device_id}: {e}")
+            return None
+    
+    def acquire_refresh_lock(self, device_id: str) -> Optional[str]:
+        """Verrou de rechargement d'un device (un seul réplica interroge la base); None s'il est déjà pris"""
+        token = uuid.uuid4().hex
+        try:
+            client = self.get_client()
+            if not client:
+                return token  # sans Redis, chaque réplica recharge lui-même
+            acquired = client.set(f"device:refresh:{device_id}", token, nx=True, px=int(CACHE_REFRESH_LOCK_TTL * 1000))
+            return token if acquired else None
+        except Exception as e:
+            logger.error(f"Error acquiring refresh lock for {device_id}: {e}")
+            return token
+    
+    def release_refresh_lock(self, device_id: str, token: str):
+        try:
+            client = self.get_client()
+            if client:
+                client.eval(RELEASE_LOCK_SCRIPT, 1, f"device:refresh:{device_id}", token)
+        except Exception as e:
+            logger.error(f"Error releasing refresh lock for {device_id}: {e}")
+    
+    def wait_for_cached_device(self, device_id: str, timeout: float, interval: float = 0.025) -> Optional[Dict[str, Any]]:
+        """Attendre que le réplica détenteur du verrou remette le device en cache (None au-delà de timeout)"""
+        deadline = time.monotonic() + timeout
+        try:
+            client = self.get_client()
+            if not client:
+                return None
+            while time.monotonic() < deadline:
+                data = client.get(f"device:{device_id}")
+                if data:
+                    return orjson.loads(data)
+                if not client.exists(f"device:refresh:{device_id}"):
+                    return None  # verrou relâché sans résultat (device absent ou échec)
+                time.sleep(interval)
+            return None
+        except Exception as e:
+            logger.error(f"Error waiting for device {device_id}: {e}")
+            return None
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Compteurs de hits, misses et évictions par niveau de cache"""
+        return {
+            "local": {
+                **(self.local_cache.stats() if self.local_cache is not None else {}),
+                "enabled": self.local_cache is not None,
+                "active": self._local_cache_usable()
+            },
+            "redis": dict(self.redis_stats),
+            "list": dict(self.list_stats)
+        }
+    
+    def get_list_generation(self, owner_id: Optional[str] = None) -> Optional[str]:
+        """Génération courante des listes (globale, ou propriétaire + époque); None si Redis indisponible"""
+        try:
+            client = self.get_client()
+            if not client:
+                return None
+            
+            keys = [f"{LIST_GENERATION_PREFIX}{owner_id}", LIST_GENERATION_EPOCH_KEY] if owner_id else [LIST_GENERATION_ALL_KEY]
+            return ".".join(value or "0" for value in client.mget(keys))
+        except Exception as e:
+            logger.error(f"Error reading device list generation: {e}")
+            return None
+    
+    def _queue_generation_bump(self, pipe, owner_ids: Iterable[Optional[str]], all_owners: bool = False):
+        # Les listes non filtrées dépendent de toutes les écritures, les autres de leur propriétaire
+        pipe.incr(LIST_GENERATION_ALL_KEY)
+        for owner_id in {owner_id for owner_id in owner_ids if owner_id}:
+            pipe.incr(f"{LIST_GENERATION_PREFIX}{owner_id}")
+        if all_owners:
+            pipe.incr(LIST_GENERATION_EPOCH_KEY)
+    
+    def bump_list_generations(self, owner_ids: Iterable[Optional[str]], all_owners: bool = False) -> bool:
+        """Invalider les listes en cache des propriétaires concernés (sans parcourir les clés)"""
+        try:
+            client = self.get_client()
+            if not client:
+                return False
+            
+            pipe = client.pipeline(transaction=False)
+            self._queue_generation_bump(pipe, owner_ids, all_owners)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error bumping device list generation: {e}")
+            return False
+    
+    def sync_devices(self, devices_data: Dict[str, Dict[str, Any]], all_owners: bool = False) -> bool:
+        """Répercuter des écritures en un aller-retour: cache, invalidation, compteurs de statut, listes"""
+        if not devices_data:
+            return True
+        if self.local_cache is not None:
+            for device_id in devices_data:
+                self.local_cache.delete(f"device:{device_id}")
+        try:
+            client = self.get_client()
+            if not client:
+                return False
+            
+            pipe = client.pipeline(transaction=False)
+            for device_id, device_data in devices_data.items():
+                pipe.setex(f"device:{device_id}", self.ttl, orjson.dumps(device_data))
+            self._queue_stale_copies(pipe, devices_data)
+            self._publish_invalidation(pipe, list(devices_data))
+            self._queue_status_updates(
+                client, pipe,
+                {device_id: data.get("status") or "unknown" for device_id, data in devices_data.items()}
+            )
+            self._queue_generation_bump(pipe, (data.get("owner_id") for data in devices_data.values()), all_owners)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error syncing {len(devices_data)} devices to Redis: {e}")
+            return False
+    
+    def remove_devices(self, owners_by_device: Dict[str, Optional[str]]) -> bool:
+        """Répercuter des suppressions (device_id -> owner_id) en un seul aller-retour"""
+        device_ids = list(owners_by_device)
+        if not device_ids:
+            return True
+        if self.local_cache is not None:
+            for device_id in device_ids:
+                self.local_cache.delete(f"device:{device_id}")
+        try:
+            client = self.get_client()
+            if not client:
+                return False
+            
+            pipe = client.pipeline(transaction=False)
+            pipe.delete(*[f"device:{device_id}" for device_id in device_ids])
+            # Un device supprimé ne doit plus être servi, même périmé
+            pipe.delete(*[f"device:stale:{device_id}" for device_id in device_ids])
+            self._publish_invalidation(pipe, device_ids)
+            self._queue_status_removals(client, pipe, device_ids)
+            self._queue_generation_bump(pipe, owners_by_device.values())
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error removing {len(device_ids)} devices from Redis: {e}")
+            return False
+    
+    def invalidate_devices(
+        self,
+        owners_by_device: Dict[str, Optional[str]],
+        statuses: Optional[Dict[str, str]] = None,
+        all_owners: bool = False
+    ) -> bool:
+        """Répercuter des mises à jour partielles (device_id -> owner_id): purge du cache, statuts modifiés, listes"""
+        device_ids = list(owners_by_device)
+        if not device_ids:
+            return True
+        if self.local_cache is not None:
+            for device_id in device_ids:
+                self.local_cache.delete(f"device:{device_id}")
         try:
             client = self.get_client()
             if not client:
                 return False
             
-            key = f"device:{device_id}"
-            client.delete(key)
+            pipe = client.pipeline(transaction=False)
+            pipe.delete(*[f"device:{device_id}" for device_id in device_ids])
+            self._publish_invalidation(pipe, device_ids)
+            if statuses:
+                self._queue_status_updates(client, pipe, statuses)
+            self._queue_generation_bump(pipe, owners_by_device.values(), all_owners)
+            pipe.execute()
             return True
         except Exception as e:
-            logger.error(f"Error invalidating cache for device {device_id}: {e}")
+            logger.error(f"Error invalidating {len(device_ids)} devices in Redis: {e}")
             return False
     
-    def cache_device_list(self, cache_key: str, devices_data: list, ttl: int = None) -> bool:
-        """Mettre en cache une liste de devices"""
+    def cache_device_list(self, cache_key: str, body: bytes, ttl: int = None) -> bool:
+        """Mettre en cache une liste de devices (réponse JSON déjà sérialisée)"""
         try:
             client = self.get_client()
             if not client:
@@ -99,15 +438,15 @@ class RedisHelper:
             client.setex(
                 cache_key,
                 ttl,
-                json.dumps(devices_data)
+                body
             )
             return True
         except Exception as e:
             logger.error(f"Error caching device list: {e}")
             return False
     
-    def get_cached_device_list(self, cache_key: str) -> Optional[list]:
-        """Récupérer une liste de devices du cache"""
+    def get_cached_device_list(self, cache_key: str) -> Optional[str]:
+        """Récupérer une liste de devices du cache (JSON prêt à renvoyer)"""
         try:
             client = self.get_client()
             if not client:
@@ -115,11 +454,123 @@ class RedisHelper:
             
             data = client.get(cache_key)
             if data:
-                return json.loads(data)
+                self.list_stats["hits"] += 1
+                return data
+            self.list_stats["misses"] += 1
             return None
         except Exception as e:
             logger.error(f"Error retrieving cached device list: {e}")
             return None
+    
+    def mark_recent_write(self, client_key: str, ttl: float) -> bool:
+        """Signaler aux autres instances qu'un client vient d'écrire (lectures sur le primaire pendant ttl)"""
+        try:
+            client = self.get_client()
+            if not client:
+                return False
+            client.set(f"devices:recent-write:{client_key}", 1, px=max(int(ttl * 1000), 1))
+            return True
+        except Exception as e:
+            logger.error(f"Error marking recent write: {e}")
+            return False
+    
+    def has_recent_write(self, client_key: str) -> bool:
+        """Le client a-t-il écrit récemment sur une autre instance"""
+        try:
+            client = self.get_client()
+            if not client:
+                return False
+            return bool(client.exists(f"devices:recent-write:{client_key}"))
+        except Exception as e:
+            logger.error(f"Error reading recent write marker: {e}")
+            return False
+    
+    def record_device_statuses(self, statuses: Dict[str, str]) -> bool:
+        """Enregistrer le statut courant de devices et mettre à jour les compteurs"""
+        if not self.status_counters_enabled or not statuses:
+            return True
+        try:
+            client = self.get_client()
+            if not client:
+                return False
+            
+            pipe = client.pipeline(transaction=False)
+            self._queue_status_updates(client, pipe, statuses)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error updating status counters: {e}")
+            return False
+    
+    def _queue_status_updates(self, client, pipe, statuses: Dict[str, str]):
+        if not self.status_counters_enabled:
+            return
+        set_status = client.register_script(SET_STATUS_SCRIPT)
+        for device_id, status in statuses.items():
+            set_status(keys=[DEVICE_STATUS_KEY, STATUS_COUNTS_KEY], args=[device_id, status], client=pipe)
+    
+    def _queue_status_removals(self, client, pipe, device_ids: List[str]):
+        if not self.status_counters_enabled:
+            return
+        remove_status = client.register_script(REMOVE_STATUS_SCRIPT)
+        for device_id in device_ids:
+            remove_status(keys=[DEVICE_STATUS_KEY, STATUS_COUNTS_KEY], args=[device_id], client=pipe)
+    
+    def get_status_counts(self) -> Optional[Dict[str, int]]:
+        """Lire les compteurs de statut (None si absents ou Redis indisponible)"""
+        if not self.status_counters_enabled:
+            return None
+        try:
+            client = self.get_client()
+            if not client:
+                return None
+            
+            counts = client.hgetall(STATUS_COUNTS_KEY)
+            if not counts:
+                return None
+            return {status: int(count) for status, count in counts.items() if int(count) > 0}
+        except Exception as e:
+            logger.error(f"Error reading status counters: {e}")
+            return None
+    
+    def rebuild_status_counters(self, statuses: Iterable[Tuple[str, str]], batch_size: int = 5000) -> bool:
+        """Reconstruire les compteurs à partir de la base puis remplacer les clés de manière atomique"""
+        try:
+            client = self.get_client()
+            if not client:
+                return False
+            
+            tmp_status_key = f"{DEVICE_STATUS_KEY}:rebuild"
+            tmp_counts_key = f"{STATUS_COUNTS_KEY}:rebuild"
+            client.delete(tmp_status_key, tmp_counts_key)
+            
+            counts: Dict[str, int] = {}
+            batch: Dict[str, str] = {}
+            for device_id, status in statuses:
+                status = status or "unknown"
+                batch[device_id] = status
+                counts[status] = counts.get(status, 0) + 1
+                if len(batch) >= batch_size:
+                    client.hset(tmp_status_key, mapping=batch)
+                    batch = {}
+            if batch:
+                client.hset(tmp_status_key, mapping=batch)
+            
+            # Un marqueur garantit que le hash existe même si la flotte est vide
+            counts.setdefault("online", 0)
+            client.hset(tmp_counts_key, mapping=counts)
+            
+            pipe = client.pipeline(transaction=True)
+            if sum(counts.values()) > 0:
+                pipe.rename(tmp_status_key, DEVICE_STATUS_KEY)
+            else:
+                pipe.delete(DEVICE_STATUS_KEY)
+            pipe.rename(tmp_counts_key, STATUS_COUNTS_KEY)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error rebuilding status counters: {e}")
+            return False
 
 # Instance globale
 redis_helper = RedisHelper()
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+from typing import Any, Dict, List, Optional
+
+from helpers.config import (
+    DATABASE_REPLICA_URLS,
+    READ_YOUR_WRITES_WINDOW,
+    REPLICA_HEALTH_CHECK_INTERVAL,
+    REPLICA_MAX_LAG_SECONDS
+)
+from helpers.local_cache import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Retard de rejeu du réplica (0 s'il a rejoué tout le WAL reçu: primaire inactif)
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+class ReplicaRouter:
+    """Routage des lectures vers les réplicas sains (round-robin), repli sur le primaire"""
+    
+    def __init__(self, urls: List[str], max_lag: float = REPLICA_MAX_LAG_SECONDS, write_window: float = READ_YOUR_WRITES_WINDOW):
+        self.urls = urls
+        self.max_lag = max_lag
+        self.write_window = write_window
+        self._replicas: List[Dict[str, Any]] = []
+        self._round_robin = itertools.count()
+        # Clients ayant écrit récemment sur cette instance (les autres instances passent par Redis)
+        self._recent_writes = LocalLRUCache(max_size=100000, ttl=write_window)
+        self.stats = {"replica": 0, "primary_fallback": 0, "primary_after_write": 0}
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.urls)
+    
+    def _get_replicas(self) -> List[Dict[str, Any]]:
+        """Créer les moteurs des réplicas de manière tardive (même pool que le primaire)"""
+        if not self._replicas and self.urls:
+            from sqlalchemy import create_engine
+            from sqlalchemy.orm import sessionmaker
+            from helpers.config import DEBUG
+            from helpers.metrics_helper import TimedQueuePool, register_pool
+            
+            for index, url in enumerate(self.urls):
+                engine = create_engine(
+                    url,
+                    pool_size=20,
+                    max_overflow=40,
+                    echo=DEBUG,
+                    future=True,
+                    poolclass=None if url.startswith("sqlite") else TimedQueuePool
+                )
+                register_pool(f"replica-{index}", engine.pool)
+                self._replicas.append({
+                    "name": f"replica-{index}",
+                    "engine": engine,
+                    "sessionmaker": sessionmaker(
+                        autocommit=False,
+                        autoflush=False,
+                        bind=engine,
+                        expire_on_commit=False,
+                        info={"replica": f"replica-{index}"}
+                    ),
+                    "healthy": True,
+                    "lag": None,
+                    "error": None
+                })
+        return self._replicas
+    
+    @staticmethod
+    def is_replica_session(db) -> bool:
+        """Session ouverte sur un réplica: lectures en retard jusqu'à max_lag, à ne pas mettre en cache partagé"""
+        return "replica" in db.info
+    
+    @staticmethod
+    def client_key(authorization: Optional[str]) -> Optional[str]:
+        """Identifiant d'un client: empreinte de son en-tête Authorization"""
+        if not authorization:
+            return None
+        return hashlib.sha256(authorization.encode()).hexdigest()[:32]
+    
+    def record_write(self, client_key: Optional[str]):
+        """Après une écriture, les lectures du client vont au primaire pendant write_window"""
+        if not self.enabled or not client_key:
+            return
+        self._recent_writes.set(client_key, True)
+        from helpers.redis_helper import redis_helper
+        redis_helper.mark_recent_write(client_key, self.write_window)
+    
+    def _wrote_recently(self, client_key: Optional[str]) -> bool:
+        if not client_key:
+            return False
+        if self._recent_writes.get(client_key):
+            return True
+        from helpers.redis_helper import redis_helper
+        return redis_helper.has_recent_write(client_key)
+    
+    def choose(self, client_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Réplica sain suivant, ou None pour lire sur le primaire"""
+        if not self.enabled:
+            return None
+        if self._wrote_recently(client_key):
+            self.stats["primary_after_write"] += 1
+            return None
+        
+        replicas = self._get_replicas()
+        start = next(self._round_robin)
+        for offset in range(len(replicas)):
+            replica = replicas[(start + offset) % len(replicas)]
+            if replica["healthy"]:
+                self.stats["replica"] += 1
+                return replica
+        self.stats["primary_fallback"] += 1
+        return None
+    
+    def mark_unhealthy(self, replica: Dict[str, Any], error: Exception):
+        """Écarter un réplica jusqu'au prochain contrôle réussi"""
+        if replica["healthy"]:
+            logger.warning(f"Read replica {replica['name']} marked unhealthy: {error}")
+        replica["healthy"] = False
+        replica["error"] = str(error)
+    
+    def check_health(self):
+        """Sonder chaque réplica (connexion et retard de réplication PostgreSQL)"""
+        from sqlalchemy import text
+        
+        for replica in self._get_replicas():
+            try:
+                with replica["engine"].connect() as connection:
+                    if connection.dialect.name == "postgresql":
+                        lag = float(connection.execute(text(REPLICA_LAG_QUERY)).scalar() or 0)
+                    else:
+                        connection.execute(text("SELECT 1"))
+                        lag = 0.0
+                replica["lag"] = lag
+                if lag > self.max_lag:
+                    self.mark_unhealthy(replica, Exception(f"replication lag {lag:.1f}s > {self.max_lag}s"))
+                    continue
+                if not replica["healthy"]:
+                    logger.info(f"Read replica {replica['name']} healthy again")
+                replica["healthy"] = True
+                replica["error"] = None
+            except Exception as e:
+                self.mark_unhealthy(replica, e)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "reads": dict(self.stats),
+            "replicas": [
+                {"name": replica["name"], "healthy": replica["healthy"], "lag": replica["lag"], "error": replica["error"]}
+                for replica in self._replicas
+            ]
+        }
+    
+    def close(self):
+        for replica in self._replicas:
+            replica["engine"].dispose()
+
+async def run_replica_health_checks(interval: float = REPLICA_HEALTH_CHECK_INTERVAL):
+    """Tâche de fond: contrôle périodique des réplicas (hors boucle d'événements)"""
+    while True:
+        try:
+            await asyncio.to_thread(replica_router.check_health)
+        except Exception as e:
+            logger.error(f"Replica health check failed: {e}")
+        await asyncio.sleep(interval)
+
+# Instance globale
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
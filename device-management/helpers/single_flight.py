@@ -0,0 +1,67 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from helpers.config import CACHE_SINGLE_FLIGHT_TIMEOUT
+
+class _Call:
+    """Chargement en cours pour une clé"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Regrouper les appels concurrents d'une même clé: un seul s'exécute, les autres reçoivent son résultat"""
+    
+    def __init__(self, timeout: float = 5):
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+        self.timeouts = 0
+    
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Exécuter fn pour key, ou attendre le résultat de l'appel déjà en cours (erreur comprise)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+        
+        if not leader:
+            if call.done.wait(self.timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # Appel en cours trop lent: ne pas bloquer indéfiniment, exécuter soi-même
+            with self._lock:
+                self.timeouts += 1
+            return fn()
+        
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executed": self.executed,
+                "shared": self.shared,
+                "timeouts": self.timeouts
+            }
+
+# Chargements de devices depuis la base après un miss de cache (un seul par device et par base interrogée)
+device_loads = SingleFlight(CACHE_SINGLE_FLIGHT_TIMEOUT)
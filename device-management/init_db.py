@@ -16,15 +16,18 @@ def init_db():
     try:
         print("📝 Initialisation de la base de données...")
         
-        from helpers.config import get_engine, get_base
-        from entities.device_manager_entity import Device
+        from helpers.config import get_engine
+        from entities.device_manager_entity import Base, Device
         
         engine = get_engine()
-        Base = get_base()
         
         print("✅ Création des tables...")
         Base.metadata.create_all(bind=engine)
         
+        print("✅ Migration de config (jsonb) et création des index PostgreSQL...")
+        from entities.database import init_postgres_objects
+        init_postgres_objects(engine)
+        
         print("✅ Vérification de la connexion...")
         with engine.connect() as conn:
             conn.execute("SELECT 1")
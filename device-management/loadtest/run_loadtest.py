@@ -0,0 +1,310 @@
+"""Test de charge HTTP des endpoints devices: latences p50/p95/p99 par route, débit, comparaison à une référence
+
+Sans --base-url, l'application tourne dans le processus (transport ASGI) sur des remplaçants locaux:
+SQLite temporaire, fakeredis (requirements-dev.txt; absent: cache désactivé et signalé dans le rapport),
+RabbitMQ absent (événements en file). Une référence mesurée avec un autre backend de cache n'est pas comparée.
+    
+    python -m loadtest.run_loadtest --requests 2000 --concurrency 32 --baseline loadtest/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Répartition par défaut des appels (poids relatifs)
+DEFAULT_MIX = {"create": 10, "list": 25, "get": 40, "status": 15, "update": 10}
+DEVICE_TYPES = ("sensor", "actuator", "gateway")
+STATUSES = ("online", "offline", "error", "maintenance")
+PERCENTILES = (50, 95, 99)
+# p99 rapporté mais non comparé: sur quelques centaines d'appels par route, il dépend de 2 ou 3 mesures
+GATED_PERCENTILES = (50, 95)
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """Répartition "create=10,list=25,..." (opérations absentes: poids nul)"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}, expected one of {sorted(DEFAULT_MIX)}")
+        mix[name.strip()] = int(weight)
+    return mix
+
+def percentile(sorted_values: List[float], rank: float) -> float:
+    """Percentile au rang le plus proche (valeurs triées)"""
+    if not sorted_values:
+        return 0.0
+    index = math.ceil(rank / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(len(sorted_values) - 1, index))]
+
+def build_operations(count: int, mix: Dict[str, int], device_count: int, seed: int) -> List[Tuple[str, str, str, Optional[dict]]]:
+    """Séquence déterministe (route, méthode, URL, corps): même graine, même charge"""
+    rng = random.Random(seed)
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    # Accès concentrés sur 20% des devices (devices « chauds »)
+    hot = max(1, device_count // 5)
+    operations = []
+    for i in range(count):
+        name = rng.choices(names, weights)[0]
+        device_id = f"lt-{rng.randrange(hot) if rng.random() < 0.8 else rng.randrange(device_count):06d}"
+        if name == "create":
+            body = {"device_id": f"lt-new-{seed}-{i:06d}", "name": f"Load {i}", "device_type": rng.choice(DEVICE_TYPES)}
+            operations.append(("POST /api/v1/devices/", "POST", "/api/v1/devices/", body))
+        elif name == "list":
+            params = rng.choice(["", f"&status={rng.choice(STATUSES)}", f"&device_type={rng.choice(DEVICE_TYPES)}"])
+            operations.append(("GET /api/v1/devices/", "GET", f"/api/v1/devices/?page_size=20&count=none{params}", None))
+        elif name == "get":
+            operations.append(("GET /api/v1/devices/{device_id}", "GET", f"/api/v1/devices/{device_id}", None))
+        elif name == "status":
+            body = {"status": rng.choice(STATUSES), "battery_level": round(rng.uniform(0, 100), 1)}
+            operations.append(("POST /api/v1/devices/{device_id}/status", "POST", f"/api/v1/devices/{device_id}/status", body))
+        else:
+            body = {"location": f"Site {rng.randrange(50)}"}
+            operations.append(("PUT /api/v1/devices/{device_id}", "PUT", f"/api/v1/devices/{device_id}", body))
+    return operations
+
+def setup_local_app(workdir: str):
+    """Application dans le processus sur SQLite et fakeredis (aucun service réseau)"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+    
+    from main import app
+    from entities.database import get_async_db, get_db, get_session_factory
+    from entities.device_manager_entity import Base
+    from helpers.redis_helper import redis_helper
+    
+    db_file = os.path.join(workdir, "devices.db")
+    engine = create_engine(f"sqlite:///{db_file}", connect_args={"check_same_thread": False, "timeout": 30})
+    # SQLite n'admet qu'un écrivain: une seule connexion asynchrone (les écritures attendent le pool, en FIFO,
+    # au lieu des reprises temporisées de SQLite qui rendent les latences aléatoires)
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_file}",
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=60,
+        connect_args={"timeout": 30}
+    )
+    with engine.begin() as connection:
+        connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    async_session_factory = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    
+    def local_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+    
+    async def local_async_db():
+        async with async_session_factory() as db:
+            yield db
+    
+    app.dependency_overrides[get_db] = local_db
+    app.dependency_overrides[get_async_db] = local_async_db
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    
+    try:
+        import fakeredis
+        redis_helper.client = fakeredis.FakeRedis(decode_responses=True)
+        redis_backend = "fakeredis"
+        cache = "enabled"
+    except ImportError:
+        # Sans Redis, chaque accès au cache tenterait une connexion: cache désactivé
+        redis_helper.get_client = lambda: None
+        redis_backend = "none"
+        cache = "disabled (fakeredis not installed)"
+        print("warning: fakeredis not installed, running without the Redis cache", file=sys.stderr)
+    
+    def teardown():
+        app.dependency_overrides.clear()
+        engine.dispose()
+    
+    backend = {"mode": "in-process", "database": "sqlite", "redis": redis_backend, "cache": cache, "rabbitmq": "none"}
+    return app, backend, teardown
+
+async def seed_devices(client, headers: Dict[str, str], device_count: int, batch_size: int = 1000):
+    """Créer les devices de départ par lots (POST /bulk)"""
+    rng = random.Random(0)
+    for start in range(0, device_count, batch_size):
+        payload = [
+            {
+                "device_id": f"lt-{i:06d}",
+                "name": f"Device {i}",
+                "device_type": rng.choice(DEVICE_TYPES),
+                "owner_id": f"owner-{i % 20}",
+                "location": f"Site {i % 50}"
+            }
+            for i in range(start, min(start + batch_size, device_count))
+        ]
+        response = await client.post("/api/v1/devices/bulk", json=payload, headers=headers)
+        response.raise_for_status()
+
+async def drive(client, headers: Dict[str, str], operations, concurrency: int) -> Tuple[Dict[str, List[float]], Dict[str, int], float]:
+    """Exécuter les opérations avec concurrency clients simultanés; latences (ms) et erreurs par route"""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    queue: asyncio.Queue = asyncio.Queue()
+    for operation in operations:
+        queue.put_nowait(operation)
+    
+    async def worker():
+        while True:
+            try:
+                route, method, url, body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body, headers=headers)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            latencies[route].append((time.perf_counter() - start) * 1000)
+            if failed:
+                errors[route] += 1
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    """Rapport: débit global et, par route, nombre d'appels, erreurs et percentiles"""
+    routes = {}
+    for route, values in sorted(latencies.items()):
+        values = sorted(values)
+        routes[route] = {
+            "count": len(values),
+            "errors": errors.get(route, 0),
+            **{f"p{rank}_ms": round(percentile(values, rank), 3) for rank in PERCENTILES}
+        }
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "requests": total,
+        "errors": sum(errors.values()),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "routes": routes
+    }
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, slack_ms: float = 0) -> List[str]:
+    """Régressions par rapport à la référence (vide si aucune); slack_ms: écart absolu ignoré (bruit des routes rapides)"""
+    regressions = []
+    if report["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {report['throughput_rps']} rps < baseline {baseline['throughput_rps']} rps")
+    for route, reference in baseline["routes"].items():
+        current = report["routes"].get(route)
+        if current is None:
+            regressions.append(f"{route}: missing from run")
+            continue
+        if current["errors"] / max(current["count"], 1) > reference["errors"] / max(reference["count"], 1):
+            regressions.append(f"{route}: {current['errors']} errors (baseline {reference['errors']})")
+        for rank in GATED_PERCENTILES:
+            key = f"p{rank}_ms"
+            if current[key] > max(reference[key] * (1 + tolerance), reference[key] + slack_ms):
+                regressions.append(f"{route}: {key} {current[key]} > baseline {reference[key]}")
+    return regressions
+
+async def run(args) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as workdir:
+        # Lu à l'import de helpers.config: avant tout import de l'application
+        os.environ.setdefault("LOG_FILE", os.path.join(workdir, "loadtest.log"))
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        os.environ.setdefault("ACCESS_LOG_SAMPLE_RATE", "0")
+        
+        import httpx
+        from helpers.auth_helper import AuthHelper
+        
+        headers = {"Authorization": f"Bearer {AuthHelper.create_token({'sub': 'loadtest'})}"}
+        operations = build_operations(args.requests, args.mix, args.devices, args.seed)
+        teardown = None
+        if args.base_url:
+            transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=args.concurrency))
+            base_url = args.base_url
+            backend = {"mode": "http", "base_url": args.base_url}
+        else:
+            app, backend, teardown = setup_local_app(workdir)
+            transport = httpx.ASGITransport(app=app)
+            base_url = "http://loadtest"
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=30) as client:
+                await seed_devices(client, headers, args.devices)
+                if args.warmup:
+                    await drive(client, headers, build_operations(args.warmup, args.mix, args.devices, args.seed + 1), args.concurrency)
+                latencies, errors, elapsed = await drive(client, headers, operations, args.concurrency)
+        finally:
+            if teardown:
+                teardown()
+    
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "devices": args.devices,
+            "seed": args.seed,
+            "mix": args.mix
+        },
+        "backend": backend,
+        **summarize(latencies, errors, elapsed)
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test for the device-management API")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--devices", type=int, default=1000, help="devices created before the run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX), help="create=10,list=25,get=40,status=15,update=10")
+    parser.add_argument("--warmup", type=int, default=200, help="requests sent before measuring")
+    parser.add_argument("--base-url", help="running instance to test (JWT_SECRET must match); default: in-process")
+    parser.add_argument("--output", help="write the JSON report to this file (default: stdout)")
+    parser.add_argument("--baseline", help="JSON report to compare against; regressions exit with status 1")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative regression on p50, p95 and throughput")
+    parser.add_argument("--slack-ms", type=float, default=30, help="latency increase always tolerated, in milliseconds")
+    parser.add_argument("--update-baseline", action="store_true", help="write this run to --baseline instead of comparing")
+    args = parser.parse_args(argv)
+    
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(output + "\n")
+        return 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("backend", {}).get("redis") != report["backend"].get("redis"):
+            # Cache actif d'un côté seulement: les latences ne sont pas comparables
+            print(
+                f"error: baseline cache backend {baseline.get('backend', {}).get('redis')!r} "
+                f"differs from this run ({report['backend'].get('redis')!r}), not comparing",
+                file=sys.stderr
+            )
+            return 2
+        if baseline.get("config") != report["config"] or baseline.get("backend") != report["backend"]:
+            print("warning: baseline recorded with a different configuration or backend", file=sys.stderr)
+        regressions = compare_to_baseline(report, baseline, args.tolerance, args.slack_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
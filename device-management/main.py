@@ -1,13 +1,22 @@
 import uvicorn
+import asyncio
 import logging
-import sys
 import os
+import time
+import uuid
 from datetime import datetime
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from helpers.metrics_helper import REQUEST_LATENCY, REQUESTS_IN_FLIGHT
+from helpers.logging_helper import setup_logging, should_log_access, get_logging_stats, request_id_var
+from helpers.replica_helper import replica_router, run_replica_health_checks
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
 
 # Import tardif de SQLAlchemy pour éviter les problèmes de compatibilité
 def get_config():
@@ -20,15 +29,8 @@ def get_config():
 
 Base, engine, APP_NAME, APP_VERSION, LOG_LEVEL, LOG_FILE = get_config()
 
-# Configuration du logging
-logging.basicConfig(
-    level=LOG_LEVEL,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Configuration du logging: file + thread d'écriture, la boucle d'événements n'écrit jamais sur disque
+setup_logging(level=LOG_LEVEL, log_file=LOG_FILE)
 
 logger = logging.getLogger(__name__)
 
@@ -38,36 +40,72 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info(f"Starting {APP_NAME} v{APP_VERSION}")
     
-    # Initialiser la base de données
+    # Base, RabbitMQ et Redis en parallèle, chacun borné par son délai (dépendances lentes: pod démarré, /ready en 503)
     try:
-        from entities.database import init_db
-        init_db()
-        logger.info("Database initialized successfully")
+        from helpers.readiness_helper import readiness_helper
+        await readiness_helper.initialize()
+        logger.info(f"Dependencies initialized in {readiness_helper.startup_duration_ms}ms")
     except Exception as e:
-        logger.warning(f"Database initialization skipped: {e}")
+        logger.warning(f"Dependency initialization failed: {e}")
     
-    # Connecter à RabbitMQ (optionnel)
+    # Compteurs de statut Redis: vérification périodique contre la base
+    background_tasks = []
     try:
-        from helpers.rabbitmq_helper import rabbitmq_helper
-        await rabbitmq_helper.connect()
-        logger.info("RabbitMQ connected")
+        from helpers.config import HEALTH_SUMMARY_MODE
+        if HEALTH_SUMMARY_MODE == "redis":
+            from helpers.health_counters_helper import run_status_counters_reconciler
+            background_tasks.append(asyncio.create_task(run_status_counters_reconciler()))
+            logger.info("Status counters reconciler started")
     except Exception as e:
-        logger.warning(f"RabbitMQ connection failed (optional): {e}")
+        logger.warning(f"Status counters reconciler not started: {e}")
     
-    # Vérifier Redis (optionnel)
+    # Heartbeats: écriture groupée en base à intervalle fixe
     try:
-        from helpers.redis_helper import redis_helper
-        if redis_helper.connect():
-            logger.info("Redis connected")
-        else:
-            logger.warning("Redis not available, caching disabled")
+        from helpers.heartbeat_helper import heartbeat_buffer
+        background_tasks.append(asyncio.create_task(heartbeat_buffer.run()))
+        logger.info("Heartbeat flusher started")
+    except Exception as e:
+        logger.warning(f"Heartbeat flusher not started: {e}")
+    
+    # Devices silencieux: passage offline groupé (un seul réplica, leader élu par verrou consultatif)
+    try:
+        from helpers.offline_sweeper_helper import offline_sweeper
+        background_tasks.append(asyncio.create_task(offline_sweeper.run()))
+        logger.info("Offline sweeper started")
     except Exception as e:
-        logger.warning(f"Redis connection failed (optional): {e}")
+        logger.warning(f"Offline sweeper not started: {e}")
+    
+    # Réplicas en lecture: contrôle périodique (connexion, retard de réplication)
+    if replica_router.enabled:
+        background_tasks.append(asyncio.create_task(run_replica_health_checks()))
+        logger.info(f"Read replica routing enabled ({len(replica_router.urls)} replicas)")
+    
+    # Flux de changements: purge des tombstones au-delà de la rétention
+    try:
+        from helpers.change_feed_helper import run_tombstone_purger
+        background_tasks.append(asyncio.create_task(run_tombstone_purger()))
+        logger.info("Tombstone purger started")
+    except Exception as e:
+        logger.warning(f"Tombstone purger not started: {e}")
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
+    for task in background_tasks:
+        task.cancel()
+    try:
+        from helpers.heartbeat_helper import heartbeat_buffer
+        await heartbeat_buffer.flush()
+    except Exception as e:
+        logger.error(f"Final heartbeat flush failed: {e}")
+    
+    try:
+        from helpers.offline_sweeper_helper import offline_sweeper
+        await offline_sweeper.release()
+    except Exception as e:
+        logger.error(f"Offline sweeper release failed: {e}")
+    
     try:
         from helpers.rabbitmq_helper import rabbitmq_helper
         await rabbitmq_helper.close()
@@ -80,6 +118,14 @@ async def lifespan(app: FastAPI):
     except:
         pass
     
+    try:
+        from entities.database import close_async_db
+        await close_async_db()
+    except:
+        pass
+    
+    replica_router.close()
+    
     logger.info("Application shutdown complete")
 
 # Créer l'application FastAPI
@@ -101,23 +147,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware de logging
+# Middleware de logging et de métriques
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = datetime.utcnow()
+    start_time = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+    status_code = 500
+    # Réutiliser l'identifiant transmis par la gateway, sinon en générer un
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
     
     # Exécuter la requête
-    response = await call_next(request)
-    
-    # Calculer le temps d'exécution
-    process_time = (datetime.utcnow() - start_time).total_seconds() * 1000
-    
-    # Logger
-    logger.info(
-        f"{request.method} {request.url.path} - "
-        f"Status: {response.status_code} - "
-        f"Time: {process_time:.2f}ms"
-    )
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        # Lire ses propres écritures: les lectures suivantes du client restent sur le primaire un court instant
+        if request.method in WRITE_METHODS and status_code < 400:
+            replica_router.record_write(replica_router.client_key(request.headers.get("Authorization")))
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        # Modèle de route (/api/v1/devices/{device_id}) plutôt que l'URL, pour borner la cardinalité
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            route=route_path,
+            status=str(status_code)
+        ).observe(time.perf_counter() - start_time)
+        
+        # Calculer le temps d'exécution
+        process_time = (time.perf_counter() - start_time) * 1000
+        
+        # Logger (échantillonné, erreurs et requêtes lentes toujours conservées)
+        if should_log_access(status_code, process_time):
+            logger.info(
+                f"{request.method} {request.url.path} - "
+                f"Status: {status_code} - "
+                f"Time: {process_time:.2f}ms",
+                extra={
+                    "method": request.method,
+                    "path": request.url.path,
+                    "route": route_path,
+                    "status": status_code,
+                    "duration_ms": round(process_time, 2)
+                }
+            )
+        request_id_var.reset(token)
     
     return response
 
@@ -143,6 +219,39 @@ async def health_check():
             }
         )
 
+# Route de préparation (readiness probe)
+@app.get("/ready")
+async def readiness_check():
+    """Prêt à recevoir du trafic: démarrage terminé et dépendances requises joignables"""
+    from helpers.readiness_helper import readiness_helper
+    report = await readiness_helper.check()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+# Statistiques des caches et du publisher d'événements
+@app.get("/cache/stats")
+async def cache_stats():
+    """Compteurs par niveau de cache (local, Redis, tokens) et état du publisher RabbitMQ"""
+    from helpers.redis_helper import redis_helper
+    from helpers.rabbitmq_helper import rabbitmq_helper
+    from helpers.heartbeat_helper import heartbeat_buffer
+    from helpers.auth_helper import AuthHelper
+    from helpers.single_flight import device_loads
+    return {
+        "device_cache": redis_helper.get_cache_stats(),
+        "device_loads": device_loads.stats(),
+        "event_publisher": rabbitmq_helper.get_stats(),
+        "heartbeats": heartbeat_buffer.get_stats(),
+        "auth_tokens": AuthHelper.get_token_cache_stats(),
+        "logging": get_logging_stats(),
+        "read_replicas": replica_router.get_stats()
+    }
+
+# Métriques Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Latences par route, requêtes en cours, pools SQLAlchemy, caches et publisher RabbitMQ"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # Route racine
 @app.get("/")
 async def root():
@@ -151,6 +260,8 @@ async def root():
         "version": APP_VERSION,
         "docs": "/docs",
         "health": "/health",
+        "ready": "/ready",
+        "metrics": "/metrics",
         "endpoints": {
             "devices": "/api/v1/devices"
         }
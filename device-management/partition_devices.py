@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Migration: partitionner la table devices par hachage de owner_id (PostgreSQL 12+)
+Copie la table sous verrou exclusif, à lancer pendant une fenêtre de maintenance
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent))
+
+def verify_pruning(engine, owner_id: str):
+    """Vérifier qu'une liste filtrée par propriétaire ne lit qu'une partition"""
+    from sqlalchemy import select
+    from dal.device_manager_dal import DeviceDAL
+    from dto.device_manager_dto import DeviceFilterDTO
+    from entities.device_manager_entity import Device
+    
+    statement = DeviceDAL._apply_filters(select(Device), DeviceFilterDTO(owner_id=owner_id), "postgresql")
+    statement = DeviceDAL._apply_sort(statement, "created_at", "desc").limit(20)
+    compiled = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as connection:
+        plan = "\n".join(row[0] for row in connection.exec_driver_sql(f"EXPLAIN {compiled}"))
+    scanned = sorted({word for word in plan.replace("(", " ").split() if word.startswith("devices_p")})
+    print(plan)
+    print("")
+    print(f"📊 Partitions lues pour owner_id={owner_id!r}: {', '.join(scanned) or 'aucune'}")
+    return len(scanned) == 1
+
+def main():
+    from helpers.config import DEVICES_PARTITIONS, get_engine
+    from entities.partitioning import is_partitioned, partition_devices, plan_partitioning
+    
+    parser = argparse.ArgumentParser(description="Partition the devices table by hash of owner_id")
+    parser.add_argument("--partitions", type=int, default=DEVICES_PARTITIONS or 16)
+    parser.add_argument("--keep-old", action="store_true", help="rename the old table to devices_unpartitioned instead of dropping it")
+    parser.add_argument("--dry-run", action="store_true", help="print the SQL without running it")
+    parser.add_argument("--verify", metavar="OWNER_ID", help="check that a list query for this owner reads one partition")
+    args = parser.parse_args()
+    
+    engine = get_engine()
+    if engine.dialect.name != "postgresql":
+        print("❌ Partitionnement disponible uniquement sous PostgreSQL")
+        sys.exit(1)
+    
+    try:
+        with engine.connect() as connection:
+            already_partitioned = is_partitioned(connection)
+            statements = [] if already_partitioned else plan_partitioning(connection, args.partitions, args.keep_old)
+        
+        if already_partitioned:
+            print("✅ La table devices est déjà partitionnée")
+        elif args.dry_run:
+            print(";\n\n".join(statements) + ";")
+            return
+        else:
+            print(f"📝 Partitionnement de devices en {args.partitions} partitions (hachage de owner_id)...")
+            partition_devices(engine, args.partitions, args.keep_old)
+            print("✅ Migration terminée")
+        
+        if args.verify and not verify_pruning(engine, args.verify):
+            print("❌ La requête par propriétaire lit plusieurs partitions")
+            sys.exit(1)
+    except Exception as e:
+        print(f"❌ Erreur: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
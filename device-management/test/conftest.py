@@ -0,0 +1,76 @@
+import os
+
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from main import app
+from entities.database import get_db, get_async_db, get_session_factory
+from entities.device_manager_entity import Base
+from helpers.auth_helper import AuthHelper
+
+@pytest.fixture
+def database(tmp_path):
+    """Base SQLite temporaire partagée par les sessions synchrones et asynchrones"""
+    db_file = tmp_path / "devices.db"
+    engine = create_engine(f"sqlite:///{db_file}", connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_file}", poolclass=NullPool)
+    Base.metadata.create_all(bind=engine)
+    TestingSession = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    AsyncTestingSession = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    
+    def override_get_db():
+        db = TestingSession()
+        try:
+            yield db
+        finally:
+            db.close()
+    
+    async def override_get_async_db():
+        async with AsyncTestingSession() as db:
+            yield db
+    
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_session_factory] = lambda: TestingSession
+    yield TestingSession, AsyncTestingSession
+    app.dependency_overrides.clear()
+    engine.dispose()
+
+@pytest.fixture
+def db_session(database):
+    return database[0]
+
+@pytest.fixture
+def async_db_session(database):
+    return database[1]
+
+@pytest.fixture
+def client(db_session):
+    return TestClient(app)
+
+@pytest.fixture(scope="session")
+def postgres_url():
+    """Base PostgreSQL de test (TEST_POSTGRES_URL); tests ignorés sans elle"""
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL not set")
+    return url
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Redis en mémoire (fakeredis) à la place du serveur"""
+    from helpers.redis_helper import redis_helper
+    
+    server = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_helper, "client", server)
+    return server
+
+@pytest.fixture
+def auth_headers():
+    token = AuthHelper.create_token({"sub": "user-test"})
+    return {"Authorization": f"Bearer {token}"}
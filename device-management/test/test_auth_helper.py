@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+import pytest
+
+from helpers import auth_helper
+from helpers.auth_helper import AuthHelper
+from helpers.local_cache import LocalLRUCache
+
+@pytest.fixture
+def decode_calls(monkeypatch):
+    """Cache de tokens vide et compteur d'appels à la vérification complète"""
+    monkeypatch.setattr(auth_helper, "token_cache", LocalLRUCache(max_size=100, ttl=3600))
+    monkeypatch.setattr(auth_helper, "negative_hits", 0)
+    calls = []
+    verify_token = AuthHelper.verify_token
+    
+    def counting_verify_token(token):
+        calls.append(token)
+        return verify_token(token)
+    
+    monkeypatch.setattr(AuthHelper, "verify_token", staticmethod(counting_verify_token))
+    return calls
+
+def test_verified_token_is_decoded_once(decode_calls):
+    """Test payload vérifié servi depuis le cache"""
+    token = AuthHelper.create_token({"sub": "user-1"})
+    assert AuthHelper.verify_token_cached(token)["sub"] == "user-1"
+    assert AuthHelper.verify_token_cached(token)["sub"] == "user-1"
+    assert len(decode_calls) == 1
+    assert AuthHelper.get_token_cache_stats()["hits"] == 1
+
+def test_rejected_token_is_cached_negatively(decode_calls):
+    """Test token invalide refusé sans nouvelle vérification"""
+    assert AuthHelper.verify_token_cached("not-a-jwt") is None
+    assert AuthHelper.verify_token_cached("not-a-jwt") is None
+    assert len(decode_calls) == 1
+    assert AuthHelper.get_token_cache_stats()["negative_hits"] == 1
+
+def test_expired_token_is_not_cached(decode_calls):
+    """Test token expiré: refusé puis mis en cache négatif uniquement"""
+    token = AuthHelper.create_token({"sub": "user-1"}, expires_delta=timedelta(seconds=-1))
+    assert AuthHelper.verify_token_cached(token) is None
+    assert AuthHelper.verify_token_cached(token) is None
+    assert len(decode_calls) == 1
+    assert AuthHelper.get_token_cache_stats()["negative_hits"] == 1
@@ -0,0 +1,573 @@
+import pytest
+
+def make_device(device_id, **extra):
+    data = {"device_id": device_id, "name": f"Device {device_id}", "device_type": "sensor"}
+    data.update(extra)
+    return data
+
+def test_bulk_create_devices(client, auth_headers):
+    """Test création bulk: tous les devices sont créés"""
+    payload = [make_device(f"bulk-{i:03d}", location="Site A") for i in range(5)]
+    response = client.post("/api/v1/devices/bulk", json=payload, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 5
+    assert data["conflicts"] == 0
+    assert [r["device_id"] for r in data["results"]] == [d["device_id"] for d in payload]
+    assert all(r["status"] == "created" for r in data["results"])
+    assert data["results"][0]["device"]["owner_id"] == "user-test"
+
+def test_bulk_create_reports_conflicts_per_item(client, auth_headers):
+    """Test création bulk: un conflit n'annule pas le reste du lot"""
+    client.post("/api/v1/devices/bulk", json=[make_device("dup-001")], headers=auth_headers)
+    payload = [make_device("dup-001"), make_device("new-001"), make_device("new-001")]
+    response = client.post("/api/v1/devices/bulk", json=payload, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["status"] for r in data["results"]] == ["conflict", "created", "conflict"]
+    assert data["created"] == 1
+    assert data["conflicts"] == 2
+
+def test_bulk_create_rejects_oversized_batch(client, auth_headers, monkeypatch):
+    """Test création bulk: taille de lot limitée"""
+    monkeypatch.setattr("controller.device_manager_controller.BULK_MAX_SIZE", 2)
+    payload = [make_device(f"big-{i:03d}") for i in range(3)]
+    response = client.post("/api/v1/devices/bulk", json=payload, headers=auth_headers)
+    assert response.status_code == 413
+
+def test_bulk_create_requires_auth(client):
+    """Test création bulk sans token"""
+    response = client.post("/api/v1/devices/bulk", json=[make_device("noauth-001")])
+    assert response.status_code == 401
+
+def test_list_devices_with_cursor_pagination(client, auth_headers):
+    """Test pagination keyset: parcours complet sans doublon ni trou"""
+    payload = [make_device(f"page-{i:03d}") for i in range(7)]
+    client.post("/api/v1/devices/bulk", json=payload, headers=auth_headers)
+    
+    seen = []
+    params = {"page_size": 3, "sort_by": "device_id", "sort_order": "asc", "count": "none"}
+    while True:
+        response = client.get("/api/v1/devices/", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] is None
+        seen.extend(d["device_id"] for d in data["devices"])
+        if not data["next_cursor"]:
+            break
+        params["cursor"] = data["next_cursor"]
+    
+    assert seen == sorted(d["device_id"] for d in payload)
+
+def test_list_devices_count_modes(client, auth_headers):
+    """Test modes de comptage exact / estimé (repli exact hors PostgreSQL)"""
+    client.post("/api/v1/devices/bulk", json=[make_device(f"count-{i}") for i in range(4)], headers=auth_headers)
+    for mode in ("exact", "estimated"):
+        response = client.get("/api/v1/devices/", params={"count": mode, "page_size": 3}, headers=auth_headers)
+        data = response.json()
+        assert data["total"] == 4
+        assert data["total_pages"] == 2
+        assert data["next_cursor"]
+
+def test_list_devices_rejects_invalid_cursor(client, auth_headers):
+    """Test curseur invalide ou tri non indexé"""
+    response = client.get("/api/v1/devices/", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
+    response = client.get(
+        "/api/v1/devices/", params={"cursor": "abc", "sort_by": "battery_level"}, headers=auth_headers
+    )
+    assert response.status_code == 400
+
+def test_health_summary_uses_single_aggregate(client, auth_headers):
+    """Test résumé de santé calculé par GROUP BY status"""
+    client.post("/api/v1/devices/bulk", json=[make_device(f"health-{i}") for i in range(4)], headers=auth_headers)
+    response = client.get("/api/v1/devices/health/status")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["source"] == "database"
+    assert data["total_devices"] == 4
+    assert data["offline"] == 4
+    assert data["online"] == 0
+    assert data["health_percentage"] == 0
+
+def test_device_lifecycle_on_async_session(client, auth_headers):
+    """Test création, mise à jour, statut et suppression via la session asynchrone"""
+    response = client.post("/api/v1/devices/", json=make_device("life-001", config={"rate": 5}), headers=auth_headers)
+    assert response.status_code == 201
+    assert response.json()["config"] == {"rate": 5}
+    
+    response = client.put("/api/v1/devices/life-001", json={"name": "Renamed"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["name"] == "Renamed"
+    
+    response = client.post("/api/v1/devices/life-001/status", json={"status": "online", "battery_level": 80}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "online"
+    
+    assert client.delete("/api/v1/devices/life-001", headers=auth_headers).status_code == 204
+    assert client.delete("/api/v1/devices/life-001", headers=auth_headers).status_code == 404
+    assert client.put("/api/v1/devices/life-001", json={"name": "x"}, headers=auth_headers).status_code == 404
+
+def test_heartbeats_are_coalesced_and_flushed_in_batch(client, auth_headers, async_db_session, monkeypatch):
+    """Test heartbeats coalescés en mémoire puis écrits par lot, événement seulement si le statut change"""
+    import asyncio
+    from controller import device_manager_controller
+    from helpers.heartbeat_helper import HeartbeatBuffer
+    from helpers.rabbitmq_helper import rabbitmq_helper
+    
+    client.post("/api/v1/devices/bulk", json=[make_device("hb-001"), make_device("hb-002")], headers=auth_headers)
+    heartbeat_buffer = HeartbeatBuffer(batch_size=1)
+    monkeypatch.setattr(device_manager_controller, "heartbeat_buffer", heartbeat_buffer)
+    
+    heartbeats = [
+        ("hb-001", {"status": "online", "battery_level": 50}),
+        ("hb-001", {"status": "online", "signal_strength": -40}),
+        ("hb-002", {"status": "offline"}),
+        ("unknown-001", {"status": "online"})
+    ]
+    for device_id, payload in heartbeats:
+        response = client.post(f"/api/v1/devices/{device_id}/heartbeat", json=payload, headers=auth_headers)
+        assert response.status_code == 202
+    assert heartbeat_buffer.get_stats()["pending"] == 3
+    
+    queued = rabbitmq_helper.buffer.qsize()
+    assert asyncio.run(heartbeat_buffer.flush(async_db_session)) == 2
+    assert rabbitmq_helper.buffer.qsize() - queued == 1
+    
+    stats = heartbeat_buffer.get_stats()
+    assert stats["pending"] == 0
+    assert stats["coalesced"] == 1
+    assert stats["status_changes"] == 1
+    assert stats["unknown_devices"] == 1
+    
+    device = client.get("/api/v1/devices/hb-001", headers=auth_headers).json()
+    assert device["status"] == "online"
+    assert device["battery_level"] == 50
+    assert device["signal_strength"] == -40
+    assert device["version"] == 2
+
+def test_retried_heartbeat_flush_stamps_write_time(client, auth_headers, db_session):
+    """Test lot de heartbeats réessayé: last_seen garde l'heure de réception, updated_at celle de l'écriture"""
+    from datetime import datetime, timedelta
+    from dal.device_manager_dal import DeviceDAL
+    
+    client.post("/api/v1/devices/bulk", json=[make_device("hb-retry-001")], headers=auth_headers)
+    received_at = datetime.utcnow() - timedelta(minutes=5)
+    before_flush = datetime.utcnow()
+    with db_session() as db:
+        DeviceDAL.apply_heartbeats(db, [{"device_id": "hb-retry-001", "status": "online", "last_seen": received_at}])
+        device = DeviceDAL.get_device_by_id(db, "hb-retry-001")
+        assert device.last_seen == received_at
+        assert device.updated_at >= before_flush
+    
+    statement, params = DeviceDAL._heartbeat_update_statement([{"device_id": "hb-retry-001", "status": "online", "last_seen": received_at}], before_flush)
+    assert "updated_at = :updated_at" in str(statement) and params["updated_at"] == before_flush
+
+def test_list_devices_search_modes(client, auth_headers):
+    """Test recherche préfixe, sous-chaîne et plein texte (repli SQLite), avec échappement de LIKE"""
+    client.post("/api/v1/devices/bulk", json=[
+        make_device("srch-001", name="Temperature Sensor", location="Bureau 1"),
+        make_device("srch-002", name="Humidity Sensor", location="Entrepôt"),
+        make_device("srch-003", name="Pump 100% duty", location="Bureau 2")
+    ], headers=auth_headers)
+    
+    def search(**params):
+        response = client.get("/api/v1/devices/", params={"page_size": 50, "sort_by": "device_id", "sort_order": "asc", **params}, headers=auth_headers)
+        assert response.status_code == 200
+        return [device["device_id"] for device in response.json()["devices"]]
+    
+    assert search(search="sensor") == ["srch-001", "srch-002"]
+    assert search(search="sensor", search_mode="prefix") == []
+    assert search(search="humid", search_mode="prefix") == ["srch-002"]
+    assert search(search="100%") == ["srch-003"]
+    assert search(search="bureau sensor", search_mode="fulltext") == ["srch-001"]
+    assert search(search="sensor", search_mode="fulltext", sort_by="relevance") == ["srch-002", "srch-001"]
+    assert client.get("/api/v1/devices/", params={"search_mode": "regex"}, headers=auth_headers).status_code == 422
+
+def test_fulltext_search_compiles_to_tsvector_on_postgres():
+    """Test recherche plein texte PostgreSQL: tsvector @@ websearch_to_tsquery, tri par ts_rank"""
+    from sqlalchemy import select
+    from sqlalchemy.dialects import postgresql
+    from dal.device_manager_dal import DeviceDAL
+    from dto.device_manager_dto import DeviceFilterDTO
+    from entities.device_manager_entity import Device
+    
+    filter_dto = DeviceFilterDTO(search="bureau sensor", search_mode="fulltext")
+    statement = DeviceDAL._apply_filters(select(Device), filter_dto, "postgresql")
+    statement = DeviceDAL._apply_relevance_sort(statement, filter_dto, "postgresql")
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "devices.search_vector @@ websearch_to_tsquery(CAST(" in sql
+    assert "ORDER BY ts_rank(devices.search_vector" in sql
+
+def test_list_and_detail_rows_match_response_dto(client, auth_headers):
+    """Test lecture sans ORM: même JSON que DeviceResponseDTO, config renvoyée comme objet"""
+    from dto.device_manager_dto import DeviceResponseDTO
+    
+    created = client.post("/api/v1/devices/", json=make_device("row-001", config={"rate": 5, "unit": "°C"}), headers=auth_headers).json()
+    listed = client.get("/api/v1/devices/", params={"search": "row-001"}, headers=auth_headers).json()["devices"][0]
+    detail = client.get("/api/v1/devices/row-001", headers=auth_headers).json()
+    
+    assert listed == detail == created
+    assert DeviceResponseDTO.model_validate(listed).model_dump(mode="json") == listed
+    assert listed["config"] == {"rate": 5, "unit": "°C"}
+
+def test_patch_device_config_applies_merge_patch(client, auth_headers):
+    """Test PATCH config: merge-patch appliqué en base (ajout, remplacement, suppression, imbrication)"""
+    config = {"rate": 5, "unit": "C", "thresholds": {"low": 1, "high": 9}}
+    client.post("/api/v1/devices/", json=make_device("cfg-001", config=config), headers=auth_headers)
+    
+    patch = {"rate": 10, "unit": None, "thresholds": {"high": 12}, "tags": ["a", "b"]}
+    response = client.patch("/api/v1/devices/cfg-001/config", json=patch, headers=auth_headers)
+    assert response.status_code == 200
+    expected = {"rate": 10, "thresholds": {"low": 1, "high": 12}, "tags": ["a", "b"]}
+    assert response.json()["config"] == expected
+    assert client.get("/api/v1/devices/cfg-001", headers=auth_headers).json()["config"] == expected
+    assert client.patch("/api/v1/devices/missing-001/config", json={"a": 1}, headers=auth_headers).status_code == 404
+
+def test_list_devices_filters_on_config(client, auth_headers):
+    """Test filtres de contenance et de présence de clé sur la config"""
+    client.post("/api/v1/devices/bulk", json=[
+        make_device("cfgf-001", config={"mode": "eco", "net": {"proto": "mqtt"}}),
+        make_device("cfgf-002", config={"mode": "eco", "net": {"proto": "coap"}}),
+        make_device("cfgf-003", config={"rate": 3})
+    ], headers=auth_headers)
+    
+    def device_ids(**params):
+        response = client.get("/api/v1/devices/", params={"sort_by": "device_id", "sort_order": "asc", **params}, headers=auth_headers)
+        assert response.status_code == 200
+        return [device["device_id"] for device in response.json()["devices"]]
+    
+    assert device_ids(config='{"mode": "eco"}') == ["cfgf-001", "cfgf-002"]
+    assert device_ids(config='{"net": {"proto": "mqtt"}}') == ["cfgf-001"]
+    assert device_ids(config_key="rate") == ["cfgf-003"]
+    assert client.get("/api/v1/devices/", params={"config": "[1]"}, headers=auth_headers).status_code == 400
+
+def test_config_merge_patch_compiles_to_jsonb_on_postgres():
+    """Test merge-patch PostgreSQL: une seule expression jsonb dans l'UPDATE"""
+    from sqlalchemy.dialects import postgresql
+    from dal.device_manager_dal import DeviceDAL
+    
+    statement = DeviceDAL._patch_config_statement("cfg-001", {"rate": 10, "unit": None, "thresholds": {"high": 12}}, "postgresql")
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "config=jsonb_set(" in sql
+    assert "END -> " in sql and " || " in sql and " - " in sql
+    assert "RETURNING" in sql
+
+def test_offline_sweeper_marks_silent_devices_in_one_update(client, auth_headers, db_session, async_db_session):
+    """Test balayage: seuls les devices en ligne muets depuis le timeout passent offline"""
+    import asyncio
+    from datetime import datetime, timedelta
+    from entities.device_manager_entity import Device
+    from helpers.offline_sweeper_helper import sweep_offline_devices
+    from helpers.rabbitmq_helper import rabbitmq_helper
+    
+    client.post("/api/v1/devices/bulk", json=[make_device(f"sweep-{i}") for i in range(3)], headers=auth_headers)
+    now = datetime.utcnow()
+    db = db_session()
+    for device_id, status, last_seen in [
+        ("sweep-0", "online", now - timedelta(seconds=600)),
+        ("sweep-1", "online", now),
+        ("sweep-2", "error", now - timedelta(seconds=600))
+    ]:
+        db.query(Device).filter(Device.device_id == device_id).update({"status": status, "last_seen": last_seen})
+    db.commit()
+    db.close()
+    
+    queued = rabbitmq_helper.buffer.qsize()
+    assert asyncio.run(sweep_offline_devices(async_db_session, timeout=300)) == 1
+    assert rabbitmq_helper.buffer.qsize() - queued == 1
+    assert asyncio.run(sweep_offline_devices(async_db_session, timeout=300)) == 0
+    
+    statuses = {device_id: client.get(f"/api/v1/devices/{device_id}", headers=auth_headers).json()["status"] for device_id in ("sweep-0", "sweep-1", "sweep-2")}
+    assert statuses == {"sweep-0": "offline", "sweep-1": "online", "sweep-2": "error"}
+
+def test_second_sweeper_waits_while_leader_holds_lock(client, auth_headers, db_session, async_db_session, monkeypatch):
+    """Test élection: le verrou de session reste au premier sweeper entre deux balayages, le second ne balaie pas"""
+    import asyncio
+    from datetime import datetime, timedelta
+    from dal.device_manager_dal import AsyncDeviceDAL
+    from entities.device_manager_entity import Device
+    from helpers.offline_sweeper_helper import OfflineSweeper
+    
+    # Sémantique de pg_try_advisory_lock (SQLite l'accorde toujours): un détenteur par verrou, jusqu'au déverrouillage
+    holders = {}
+    
+    async def try_advisory_lock(connection, lock_id):
+        return holders.setdefault(lock_id, connection) is connection
+    
+    async def advisory_unlock(connection, lock_id):
+        if holders.get(lock_id) is connection:
+            del holders[lock_id]
+    
+    monkeypatch.setattr(AsyncDeviceDAL, "try_advisory_lock", try_advisory_lock)
+    monkeypatch.setattr(AsyncDeviceDAL, "advisory_unlock", advisory_unlock)
+    
+    client.post("/api/v1/devices/bulk", json=[make_device("leader-0"), make_device("leader-1")], headers=auth_headers)
+    
+    def go_silent(device_id):
+        with db_session() as db:
+            db.query(Device).filter(Device.device_id == device_id).update({
+                "status": "online",
+                "last_seen": datetime.utcnow() - timedelta(hours=1)
+            })
+            db.commit()
+    
+    async def scenario():
+        engine = async_db_session.kw["bind"]
+        first = OfflineSweeper(lock_id=1, engine=engine, session_factory=async_db_session)
+        second = OfflineSweeper(lock_id=1, engine=engine, session_factory=async_db_session)
+        
+        go_silent("leader-0")
+        assert await first.tick() == 1
+        go_silent("leader-1")
+        # Le premier reste leader après son balayage: le second ne balaie pas
+        assert await second.tick() is None
+        assert first.is_leader and not second.is_leader
+        assert await first.tick() == 1
+        
+        await first.release()
+        assert await second.tick() == 0
+        assert second.is_leader
+        await second.release()
+    
+    asyncio.run(scenario())
+
+def test_advisory_lock_elects_one_sweeper_on_postgres(postgres_url):
+    """Test PostgreSQL: pg_try_advisory_lock de session refusé au second sweeper jusqu'à la libération"""
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from helpers.config import to_async_database_url
+    from helpers.offline_sweeper_helper import OfflineSweeper
+    
+    async def scenario():
+        engine = create_async_engine(to_async_database_url(postgres_url))
+        first = OfflineSweeper(lock_id=7210099, engine=engine)
+        second = OfflineSweeper(lock_id=7210099, engine=engine)
+        try:
+            assert await first.acquire_leadership()
+            assert not await second.acquire_leadership()
+            assert await first.acquire_leadership()
+            await first.release()
+            assert await second.acquire_leadership()
+        finally:
+            await first.release()
+            await second.release()
+            await engine.dispose()
+    
+    asyncio.run(scenario())
+
+def test_offline_sweep_invalidates_earlier_etag(client, auth_headers, db_session, async_db_session):
+    """Test passage offline puis If-Match antérieur: 412, le statut offline n'est pas écrasé"""
+    import asyncio
+    from datetime import datetime, timedelta
+    from entities.device_manager_entity import Device
+    from helpers.offline_sweeper_helper import sweep_offline_devices
+    
+    client.post("/api/v1/devices/bulk", json=[make_device("sweep-etag")], headers=auth_headers)
+    db = db_session()
+    db.query(Device).filter(Device.device_id == "sweep-etag").update({
+        "status": "online",
+        "last_seen": datetime.utcnow() - timedelta(seconds=600)
+    })
+    db.commit()
+    db.close()
+    stale_etag = client.get("/api/v1/devices/sweep-etag", headers=auth_headers).headers["ETag"]
+    
+    assert asyncio.run(sweep_offline_devices(async_db_session, timeout=300)) == 1
+    
+    headers = {**auth_headers, "If-Match": stale_etag}
+    response = client.put("/api/v1/devices/sweep-etag", json={"name": "Renamed"}, headers=headers)
+    assert response.status_code == 412
+    assert response.headers["ETag"] != stale_etag
+    assert client.post("/api/v1/devices/sweep-etag/status", json={"status": "online"}, headers=headers).status_code == 412
+    assert client.get("/api/v1/devices/sweep-etag", headers=auth_headers).json()["status"] == "offline"
+
+def test_metrics_endpoint_reports_route_templates(client, auth_headers):
+    """Test /metrics: latence par modèle de route et compteurs des helpers"""
+    client.get("/api/v1/devices/metrics-001", headers=auth_headers)
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/devices/{device_id}",status="404"}' in body
+    assert "metrics-001" not in body
+    assert "http_requests_in_flight" in body
+    assert 'device_cache_operations_total{outcome="misses",tier="redis"}' in body
+    assert 'rabbitmq_events_total{outcome="dropped"}' in body
+
+def test_bulk_update_by_filter_runs_in_chunks(client, auth_headers, monkeypatch):
+    """Test mise à jour bulk par filtre: lots successifs, devices hors filtre intacts"""
+    from helpers.bulk_operation_helper import bulk_operations
+    monkeypatch.setattr(bulk_operations, "chunk_size", 2)
+    client.post("/api/v1/devices/bulk", json=[make_device(f"fleet-{i:03d}", location="Site A") for i in range(5)], headers=auth_headers)
+    client.post("/api/v1/devices/bulk", json=[make_device("other-001", device_type="gateway")], headers=auth_headers)
+    
+    response = client.request("PATCH", "/api/v1/devices/bulk", json={
+        "filter": {"device_type": "sensor"},
+        "changes": {"status": "maintenance", "firmware_version": "2.0.0"}
+    }, headers=auth_headers)
+    assert response.status_code == 200
+    job = response.json()
+    assert job["status"] == "completed"
+    assert (job["matched"], job["processed"], job["chunks"]) == (5, 5, 3)
+    
+    detail = client.get("/api/v1/devices/fleet-004", headers=auth_headers).json()
+    assert (detail["status"], detail["firmware_version"]) == ("maintenance", "2.0.0")
+    assert client.get("/api/v1/devices/other-001", headers=auth_headers).json()["firmware_version"] == "1.0.0"
+    assert client.get(f"/api/v1/devices/bulk/jobs/{job['job_id']}", headers=auth_headers).json()["processed"] == 5
+
+def test_bulk_delete_by_ids_and_selector_validation(client, auth_headers):
+    """Test suppression bulk par ids; sélecteur ambigu ou filtre vide refusé"""
+    client.post("/api/v1/devices/bulk", json=[make_device(f"gone-{i:03d}") for i in range(3)], headers=auth_headers)
+    
+    response = client.request("DELETE", "/api/v1/devices/bulk", json={"device_ids": ["gone-000", "gone-001", "missing"]}, headers=auth_headers)
+    assert response.status_code == 200
+    assert (response.json()["matched"], response.json()["processed"]) == (2, 2)
+    assert client.get("/api/v1/devices/gone-000", headers=auth_headers).status_code == 404
+    assert client.get("/api/v1/devices/gone-002", headers=auth_headers).status_code == 200
+    
+    assert client.request("DELETE", "/api/v1/devices/bulk", json={"filter": {}}, headers=auth_headers).status_code == 422
+    assert client.request("DELETE", "/api/v1/devices/bulk", json={"device_ids": ["a"], "filter": {"status": "online"}}, headers=auth_headers).status_code == 422
+
+def test_export_streams_filtered_inventory(client, auth_headers, monkeypatch):
+    """Test export NDJSON et CSV: lots du curseur serveur, mêmes filtres et même forme que l'API"""
+    import csv
+    import io
+    import json
+    monkeypatch.setattr("controller.device_manager_controller.EXPORT_BATCH_SIZE", 2)
+    client.post("/api/v1/devices/bulk", json=[make_device(f"exp-{i:03d}", config={"rate": i}) for i in range(5)], headers=auth_headers)
+    client.post("/api/v1/devices/bulk", json=[make_device("exp-gw", device_type="gateway")], headers=auth_headers)
+    
+    response = client.get("/api/v1/devices/export", params={"device_type": "sensor"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["device_id"] for line in lines] == [f"exp-{i:03d}" for i in range(5)]
+    assert lines[3]["config"] == {"rate": 3}
+    assert lines[0] == client.get("/api/v1/devices/exp-000", headers=auth_headers).json()
+    
+    response = client.get("/api/v1/devices/export", params={"format": "csv"}, headers=auth_headers)
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 6
+    assert json.loads(rows[1]["config"]) == {"rate": 1}
+
+def test_change_feed_returns_updates_and_tombstones_after_token(client, auth_headers, async_db_session, monkeypatch):
+    """Test flux de changements: synchronisation initiale, puis uniquement le delta (modifications et suppressions)"""
+    import asyncio
+    from helpers.change_feed_helper import purge_expired_tombstones
+    monkeypatch.setattr("controller.device_manager_controller.CHANGE_FEED_SETTLE_SECONDS", 0)
+    client.post("/api/v1/devices/bulk", json=[make_device(f"feed-{i:03d}") for i in range(3)], headers=auth_headers)
+    
+    initial = client.get("/api/v1/devices/changes", headers=auth_headers).json()
+    assert sorted(d["device_id"] for d in initial["changes"]) == ["feed-000", "feed-001", "feed-002"]
+    assert initial["deleted"] == [] and not initial["has_more"]
+    
+    client.put("/api/v1/devices/feed-001", json={"location": "Site B"}, headers=auth_headers)
+    client.put("/api/v1/devices/feed-000", json={"location": "Site C"}, headers=auth_headers)
+    client.delete("/api/v1/devices/feed-002", headers=auth_headers)
+    first = client.get("/api/v1/devices/changes", params={"since": initial["next_token"], "limit": 1}, headers=auth_headers).json()
+    delta = client.get("/api/v1/devices/changes", params={"since": first["next_token"], "limit": 1}, headers=auth_headers).json()
+    assert first["has_more"] and not delta["has_more"]
+    assert [(d["device_id"], d["location"]) for d in first["changes"] + delta["changes"]] == [("feed-001", "Site B"), ("feed-000", "Site C")]
+    assert [d["device_id"] for d in first["deleted"] + delta["deleted"]] == ["feed-002"]
+    
+    empty = client.get("/api/v1/devices/changes", params={"since": delta["next_token"]}, headers=auth_headers).json()
+    assert empty["changes"] == [] and empty["deleted"] == []
+    
+    assert asyncio.run(purge_expired_tombstones(async_db_session, retention=-60)) == 1
+    assert client.get("/api/v1/devices/changes", params={"since": "garbage"}, headers=auth_headers).status_code == 400
+
+def test_conditional_update_rejects_stale_if_match(client, auth_headers):
+    """Test concurrence optimiste: ETag = version, If-Match périmé -> 412 sans écraser la modification"""
+    client.post("/api/v1/devices/", json=make_device("etag-001"), headers=auth_headers)
+    etag = client.get("/api/v1/devices/etag-001", headers=auth_headers).headers["ETag"]
+    assert etag == '"1"'
+    
+    first = client.put("/api/v1/devices/etag-001", json={"location": "Site A"}, headers={**auth_headers, "If-Match": etag})
+    assert first.status_code == 200
+    assert first.headers["ETag"] == '"2"' and first.json()["version"] == 2
+    
+    stale = client.put("/api/v1/devices/etag-001", json={"location": "Site B"}, headers={**auth_headers, "If-Match": etag})
+    assert stale.status_code == 412
+    assert stale.headers["ETag"] == '"2"'
+    assert client.get("/api/v1/devices/etag-001", headers=auth_headers).json()["location"] == "Site A"
+    
+    status_update = client.post(
+        "/api/v1/devices/etag-001/status", json={"status": "online"}, headers={**auth_headers, "If-Match": 'W/"2"'}
+    )
+    assert status_update.status_code == 200 and status_update.headers["ETag"] == '"3"'
+    assert client.put("/api/v1/devices/missing", json={"location": "X"}, headers={**auth_headers, "If-Match": '"1"'}).status_code == 404
+    assert client.put("/api/v1/devices/etag-001", json={}, headers={**auth_headers, "If-Match": "abc"}).status_code == 400
+
+def test_reads_use_replica_except_after_own_write(client, auth_headers, tmp_path, monkeypatch):
+    """Test réplicas: lectures sur le réplica, primaire pour le client qui vient d'écrire ou si le réplica est écarté"""
+    from sqlalchemy import create_engine
+    from entities.device_manager_entity import Base
+    from helpers.auth_helper import AuthHelper
+    from helpers.local_cache import LocalLRUCache
+    from helpers.replica_helper import replica_router
+    
+    # Réplica vide: simule un retard de réplication
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica_engine = create_engine(replica_url)
+    Base.metadata.create_all(bind=replica_engine)
+    replica_engine.dispose()
+    monkeypatch.setattr(replica_router, "urls", [replica_url])
+    monkeypatch.setattr(replica_router, "_replicas", [])
+    monkeypatch.setattr(replica_router, "_recent_writes", LocalLRUCache(ttl=60))
+    other_client = {"Authorization": f"Bearer {AuthHelper.create_token({'sub': 'user-other'})}"}
+    
+    try:
+        assert client.post("/api/v1/devices/", json=make_device("replica-001"), headers=auth_headers).status_code == 201
+        assert client.get("/api/v1/devices/replica-001", headers=auth_headers).status_code == 200
+        assert client.get("/api/v1/devices/replica-001", headers=other_client).status_code == 404
+        
+        replica_router.mark_unhealthy(replica_router._replicas[0], Exception("replica down"))
+        assert client.get("/api/v1/devices/replica-001", headers=other_client).status_code == 200
+        assert replica_router.get_stats()["reads"]["primary_fallback"] >= 1
+    finally:
+        replica_router.close()
+
+def test_lagging_replica_reads_do_not_fill_shared_cache(client, auth_headers, tmp_path, monkeypatch, fake_redis):
+    """Test réplica en retard: ses lignes sont servies au lecteur mais ne remplissent ni le cache device ni les listes"""
+    import shutil
+    from helpers.auth_helper import AuthHelper
+    from helpers.local_cache import LocalLRUCache
+    from helpers.redis_helper import redis_helper
+    from helpers.replica_helper import replica_router
+    
+    assert client.post("/api/v1/devices/", json=make_device("lag-001", name="Old"), headers=auth_headers).status_code == 201
+    # Réplica figé avant la mise à jour suivante
+    shutil.copy(tmp_path / "devices.db", tmp_path / "replica.db")
+    monkeypatch.setattr(replica_router, "urls", [f"sqlite:///{tmp_path / 'replica.db'}"])
+    monkeypatch.setattr(replica_router, "_replicas", [])
+    monkeypatch.setattr(replica_router, "_recent_writes", LocalLRUCache(ttl=60))
+    other_client = {"Authorization": f"Bearer {AuthHelper.create_token({'sub': 'user-other'})}"}
+    
+    try:
+        assert client.put("/api/v1/devices/lag-001", json={"name": "New"}, headers=auth_headers).status_code == 200
+        # Invalidation sans remise en cache (mise à jour en masse, balayage, heartbeats)
+        redis_helper.invalidate_device_cache("lag-001")
+        
+        assert client.get("/api/v1/devices/lag-001", headers=other_client).json()["name"] == "Old"
+        assert fake_redis.get("device:lag-001") is None
+        assert client.get("/api/v1/devices/?count=none", headers=other_client).json()["devices"][0]["name"] == "Old"
+        assert not [key for key in fake_redis.keys("devices:list:*") if ":gen:" not in key]
+        
+        # Lecture sur le primaire: le cache est rempli
+        replica_router.mark_unhealthy(replica_router._replicas[0], Exception("replica down"))
+        assert client.get("/api/v1/devices/lag-001", headers=other_client).json()["name"] == "New"
+        assert fake_redis.get("device:lag-001") is not None
+    finally:
+        replica_router.close()
+
+def test_cache_miss_serves_stale_copy_while_another_replica_refreshes(db_session, monkeypatch):
+    """Test stale-while-revalidate: verrou pris ailleurs -> valeur précédente, sans requête en base"""
+    from controller import device_manager_controller as controller
+    from helpers.redis_helper import redis_helper
+    
+    monkeypatch.setattr(controller, "CACHE_SWR_ENABLED", True)
+    monkeypatch.setattr(redis_helper, "acquire_refresh_lock", lambda device_id: None)
+    monkeypatch.setattr(redis_helper, "get_stale_device", lambda device_id: {"device_id": device_id, "version": 3})
+    monkeypatch.setattr(controller.DeviceDAL, "get_device_row", lambda db, device_id: pytest.fail("database queried"))
+    
+    with db_session() as db:
+        assert controller._load_device(db, "hot-001") == {"device_id": "hot-001", "version": 3}
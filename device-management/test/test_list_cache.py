@@ -0,0 +1,74 @@
+from helpers.device_manager_helper import DeviceHelper
+from helpers.redis_helper import redis_helper
+
+def _list(client, auth_headers, query=""):
+    response = client.get(f"/api/v1/devices/?count=none{query}", headers=auth_headers)
+    assert response.status_code == 200
+    return [device["device_id"] for device in response.json()["devices"]]
+
+def _create(client, auth_headers, device_id, owner_id):
+    response = client.post(
+        "/api/v1/devices/",
+        json={"device_id": device_id, "name": device_id, "device_type": "sensor", "owner_id": owner_id},
+        headers=auth_headers
+    )
+    assert response.status_code == 201
+
+def test_list_cache_key_ignores_parameter_order():
+    """Test clé de liste: ordre des paramètres, valeurs absentes et casse de la recherche normalisés"""
+    first = DeviceHelper.build_list_cache_key("owner-a", "1.0", {"status": "online", "device_type": "sensor", "search": "Hall"})
+    second = DeviceHelper.build_list_cache_key("owner-a", "1.0", {"search": " hall ", "device_type": "sensor", "status": "online", "cursor": None})
+    assert first == second
+    assert first != DeviceHelper.build_list_cache_key("owner-a", "2.0", {"status": "online", "device_type": "sensor", "search": "Hall"})
+    assert first != DeviceHelper.build_list_cache_key("owner-b", "1.0", {"status": "online", "device_type": "sensor", "search": "Hall"})
+
+def test_repeated_list_query_is_served_from_cache(client, auth_headers, db_session, fake_redis):
+    """Test liste répétée: servie par Redis, même en réordonnant les paramètres de la requête"""
+    from entities.device_manager_entity import Device
+    
+    _create(client, auth_headers, "cache-001", "owner-a")
+    assert _list(client, auth_headers, "&status=offline&device_type=sensor") == ["cache-001"]
+    hits = redis_helper.list_stats["hits"]
+    
+    # Écriture hors API: aucune génération incrémentée, la liste en cache reste servie
+    with db_session() as db:
+        db.add(Device(device_id="cache-002", name="cache-002", device_type="sensor", status="offline"))
+        db.commit()
+    assert _list(client, auth_headers, "&device_type=sensor&status=offline") == ["cache-001"]
+    assert redis_helper.list_stats["hits"] == hits + 1
+
+def test_list_cache_invalidated_by_writes(client, auth_headers, fake_redis):
+    """Test création, mise à jour et suppression: les listes concernées ne sont plus servies du cache"""
+    _create(client, auth_headers, "cache-001", "owner-a")
+    assert _list(client, auth_headers) == ["cache-001"]
+    
+    _create(client, auth_headers, "cache-002", "owner-a")
+    assert sorted(_list(client, auth_headers)) == ["cache-001", "cache-002"]
+    
+    assert _list(client, auth_headers, "&status=maintenance") == []
+    response = client.post("/api/v1/devices/cache-001/status", json={"status": "maintenance"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert _list(client, auth_headers, "&status=maintenance") == ["cache-001"]
+    
+    assert client.delete("/api/v1/devices/cache-002", headers=auth_headers).status_code == 204
+    assert _list(client, auth_headers) == ["cache-001"]
+
+def test_list_generations_isolated_by_owner(client, auth_headers, fake_redis):
+    """Test générations par propriétaire: une écriture de owner-b n'invalide pas les listes de owner-a"""
+    _create(client, auth_headers, "cache-a1", "owner-a")
+    _create(client, auth_headers, "cache-b1", "owner-b")
+    owner_a = redis_helper.get_list_generation("owner-a")
+    owner_b = redis_helper.get_list_generation("owner-b")
+    everyone = redis_helper.get_list_generation()
+    
+    _create(client, auth_headers, "cache-b2", "owner-b")
+    assert redis_helper.get_list_generation("owner-a") == owner_a
+    assert redis_helper.get_list_generation("owner-b") != owner_b
+    assert redis_helper.get_list_generation() != everyone
+    
+    assert _list(client, auth_headers, "&owner_id=owner-a") == ["cache-a1"]
+    hits = redis_helper.list_stats["hits"]
+    _create(client, auth_headers, "cache-b3", "owner-b")
+    assert _list(client, auth_headers, "&owner_id=owner-a") == ["cache-a1"]
+    assert redis_helper.list_stats["hits"] == hits + 1
+    assert sorted(_list(client, auth_headers, "&owner_id=owner-b")) == ["cache-b1", "cache-b2", "cache-b3"]
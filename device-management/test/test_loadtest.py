@@ -0,0 +1,48 @@
+from loadtest.run_loadtest import DEFAULT_MIX, build_operations, compare_to_baseline, percentile, summarize
+
+def test_operations_are_reproducible_and_follow_mix():
+    """Test charge déterministe: même graine, même séquence; chaque route du mélange présente"""
+    operations = build_operations(500, DEFAULT_MIX, 100, seed=7)
+    assert operations == build_operations(500, DEFAULT_MIX, 100, seed=7)
+    assert {operation[0] for operation in operations} == {
+        "POST /api/v1/devices/",
+        "GET /api/v1/devices/",
+        "GET /api/v1/devices/{device_id}",
+        "POST /api/v1/devices/{device_id}/status",
+        "PUT /api/v1/devices/{device_id}"
+    }
+
+def test_baseline_comparison_flags_latency_error_and_throughput_regressions():
+    """Test comparaison: percentiles au rang le plus proche, régressions au-delà de la tolérance"""
+    assert percentile(list(range(1, 101)), 95) == 95
+    baseline = summarize({"GET /x": [float(ms) for ms in range(1, 101)]}, {}, elapsed=1.0)
+    
+    same = summarize({"GET /x": [float(ms) for ms in range(1, 101)]}, {}, elapsed=1.0)
+    assert compare_to_baseline(same, baseline, tolerance=0.2) == []
+    
+    slower = summarize({"GET /x": [ms * 2.0 for ms in range(1, 101)]}, {"GET /x": 3}, elapsed=2.0)
+    regressions = compare_to_baseline(slower, baseline, tolerance=0.2)
+    assert any("throughput" in regression for regression in regressions)
+    assert any("p95_ms" in regression for regression in regressions)
+    assert any("errors" in regression for regression in regressions)
+    assert not any("p95_ms" in regression for regression in compare_to_baseline(slower, baseline, tolerance=0.2, slack_ms=1000))
+
+def test_baseline_with_another_cache_backend_is_not_compared(tmp_path, monkeypatch, capsys):
+    """Test référence mesurée avec le cache actif, run sans fakeredis: comparaison refusée (code 2)"""
+    import json
+    from loadtest import run_loadtest
+    
+    report = {
+        "config": {},
+        "backend": {"mode": "in-process", "redis": "none", "cache": "disabled (fakeredis not installed)"},
+        **summarize({"GET /x": [1.0]}, {}, elapsed=1.0)
+    }
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({**report, "backend": {"mode": "in-process", "redis": "fakeredis", "cache": "enabled"}}))
+    
+    async def fake_run(args):
+        return report
+    
+    monkeypatch.setattr(run_loadtest, "run", fake_run)
+    assert run_loadtest.main(["--baseline", str(baseline), "--output", str(tmp_path / "report.json")]) == 2
+    assert "not comparing" in capsys.readouterr().err
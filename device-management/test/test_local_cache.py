@@ -0,0 +1,26 @@
+import time
+
+from helpers.local_cache import LocalLRUCache
+
+def test_lru_eviction_and_counters():
+    """Test éviction LRU et compteurs hits/misses/évictions"""
+    cache = LocalLRUCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" devient le plus récent
+    cache.set("c", 3)           # évince "b"
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+def test_entries_expire_after_ttl():
+    """Test expiration par entrée"""
+    cache = LocalLRUCache(max_size=10, ttl=60)
+    cache.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
@@ -0,0 +1,39 @@
+import json
+import logging
+import queue
+
+from helpers.logging_helper import JsonFormatter, NonBlockingQueueHandler, request_id_var, should_log_access
+
+def _record(message="GET /devices", **extra):
+    record = logging.LogRecord("main", logging.INFO, __file__, 1, message, None, None)
+    record.__dict__.update(extra)
+    return record
+
+def test_queued_record_carries_request_id_as_json():
+    """Test identifiant de requête capturé à l'émission et rendu en JSON avec les champs extra"""
+    handler = NonBlockingQueueHandler(queue.Queue())
+    token = request_id_var.set("req-42")
+    try:
+        handler.handle(_record(status=200, duration_ms=1.5))
+    finally:
+        request_id_var.reset(token)
+    
+    entry = json.loads(JsonFormatter().format(handler.queue.get_nowait()))
+    assert entry["message"] == "GET /devices"
+    assert entry["request_id"] == "req-42"
+    assert entry["status"] == 200 and entry["duration_ms"] == 1.5
+
+def test_full_queue_drops_instead_of_blocking():
+    """Test file pleine: enregistrement abandonné et compté"""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(_record())
+    handler.handle(_record())
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
+
+def test_access_log_sampling_keeps_errors_and_slow_requests():
+    """Test échantillonnage: erreurs et requêtes lentes toujours journalisées"""
+    assert not should_log_access(200, 1.0, sample_rate=0)
+    assert should_log_access(200, 1.0, sample_rate=1)
+    assert should_log_access(503, 1.0, sample_rate=0)
+    assert should_log_access(200, 60000, sample_rate=0)
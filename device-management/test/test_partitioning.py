@@ -0,0 +1,34 @@
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql
+
+from dal.device_manager_dal import DeviceDAL
+from dto.device_manager_dto import DeviceFilterDTO
+from entities.device_manager_entity import Device
+from entities.partitioning import build_partition_statements
+
+INDEXES = [
+    ("devices_pkey", "CREATE UNIQUE INDEX devices_pkey ON public.devices USING btree (id)"),
+    ("ix_devices_device_id", "CREATE UNIQUE INDEX ix_devices_device_id ON public.devices USING btree (device_id)"),
+    ("ix_devices_owner_created_at_id", "CREATE INDEX ix_devices_owner_created_at_id ON public.devices USING btree (owner_id, created_at, id)"),
+]
+
+def test_partition_statements_move_device_id_uniqueness_to_registry():
+    """Test migration: partitions par hachage, index recréés non uniques, unicité de device_id dans device_registry"""
+    statements = build_partition_statements(["id", "device_id", "owner_id"], INDEXES, "public.devices_id_seq", 4)
+    
+    assert statements[0] == "LOCK TABLE devices IN ACCESS EXCLUSIVE MODE"
+    assert "PARTITION BY HASH (owner_id)" in statements[1]
+    assert sum("PARTITION OF devices_partitioned" in statement for statement in statements) == 4
+    assert "INSERT INTO devices_partitioned (id, device_id, owner_id) SELECT id, device_id, owner_id FROM devices" in statements
+    assert statements.index("ALTER SEQUENCE public.devices_id_seq OWNED BY devices_partitioned.id") < statements.index("DROP TABLE devices")
+    assert "CREATE INDEX ix_devices_device_id ON public.devices USING btree (device_id)" in statements
+    assert not any("devices_pkey ON" in statement for statement in statements)
+    assert any("device_id varchar(100) PRIMARY KEY" in statement for statement in statements)
+    assert statements[-2].startswith("CREATE TRIGGER devices_registry_sync AFTER INSERT OR UPDATE OR DELETE ON devices")
+
+def test_bulk_update_by_owner_filters_outer_statement_on_partition_key():
+    """Test élagage: l'UPDATE par lot d'un propriétaire porte owner_id = :owner hors de la sous-requête"""
+    condition = DeviceDAL._bulk_condition("postgresql", filter_dto=DeviceFilterDTO(owner_id="tenant-1", status="online"), limit=500)
+    sql = str(update(Device).where(condition).values(status="offline").compile(dialect=postgresql.dialect()))
+    outer_where = sql.split("WHERE", 1)[1].split("IN (SELECT", 1)[0]
+    assert "devices.owner_id = %(owner_id_1)s" in outer_where
@@ -0,0 +1,176 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert, select, text
+
+from dal.device_manager_dal import DeviceDAL
+from dto.device_manager_dto import DeviceFilterDTO
+from entities.device_manager_entity import Base, Device
+from helpers.config import KEYSET_SORT_COLUMNS
+
+SEED_ROWS = 50000
+
+# Formes de filtre produites par get_devices -> index acceptés (SQLite, tri par défaut), tri servi par l'index ou non
+FILTER_SHAPES = [
+    ({}, "ix_devices_created_at_id", True),
+    ({"owner_id": "owner-7"}, "ix_devices_owner_created_at_id", True),
+    ({"owner_id": "owner-7", "status": "online"}, "ix_devices_owner_status_created_at_id", True),
+    ({"owner_id": "owner-7", "device_type": "sensor"}, "ix_devices_owner_created_at_id", True),
+    ({"owner_id": "owner-7", "is_active": True}, "ix_devices_owner_created_at_id", True),
+    ({"status": "error"}, "ix_devices_status_created_at_id", True),
+    ({"status": "online", "device_type": "sensor"}, ("ix_devices_status_created_at_id", "ix_devices_type_created_at_id"), True),
+    ({"device_type": "gateway"}, "ix_devices_type_created_at_id", True),
+    ({"is_active": False}, "ix_devices_inactive_created_at_id", True),
+    ({"min_battery_level": 5, "max_battery_level": 6}, "ix_devices_battery_level", False),
+]
+
+# PostgreSQL: index parcourus par colonne de tri keyset (filtres peu sélectifs -> index du tri seul)
+SORT_INDEXES = {
+    "created_at": "ix_devices_created_at_id",
+    "updated_at": "ix_devices_updated_at_id",
+    "device_id": "ix_devices_device_id",
+    "id": ("ix_devices_id", "devices_pkey"),
+}
+OWNER_SORT_INDEXES = {
+    "created_at": "ix_devices_owner_created_at_id",
+    "updated_at": "ix_devices_owner_updated_at_id",
+    "device_id": "ix_devices_owner_device_id",
+    "id": "ix_devices_owner_id",
+}
+OWNER_STATUS_SORT_INDEXES = {
+    "created_at": "ix_devices_owner_status_created_at_id",
+    "updated_at": "ix_devices_owner_status_updated_at_id",
+    "device_id": "ix_devices_owner_status_device_id",
+    "id": "ix_devices_owner_status_id",
+}
+POSTGRES_EXPECTED_INDEXES = [
+    SORT_INDEXES,
+    OWNER_SORT_INDEXES,
+    OWNER_STATUS_SORT_INDEXES,
+    OWNER_SORT_INDEXES,
+    OWNER_SORT_INDEXES,
+    {**SORT_INDEXES, "created_at": ("ix_devices_created_at_id", "ix_devices_status_created_at_id")},
+    {**SORT_INDEXES, "created_at": ("ix_devices_created_at_id", "ix_devices_status_created_at_id", "ix_devices_type_created_at_id")},
+    {**SORT_INDEXES, "created_at": ("ix_devices_created_at_id", "ix_devices_type_created_at_id")},
+    {**SORT_INDEXES, "created_at": "ix_devices_inactive_created_at_id"},
+    SORT_INDEXES,
+]
+# Curseur keyset (valeur de tri, id) au milieu du jeu de données
+SORT_CURSORS = {
+    "created_at": (datetime(2024, 1, 1, 6), 21600),
+    "updated_at": (datetime(2024, 1, 1, 6), 21600),
+    "device_id": ("dev-021600", 21600),
+    "id": (21600, 21600),
+}
+
+def _seed_rows():
+    """Lignes devices (distribution réaliste, updated_at décorrélé de created_at)"""
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "device_id": f"dev-{i:06d}",
+            "name": f"Device {i}",
+            "device_type": rng.choice(["sensor", "actuator", "gateway"]),
+            "status": rng.choice(["online", "offline", "error", "maintenance"]),
+            "owner_id": f"owner-{i % 200}",
+            "is_active": rng.random() > 0.05,
+            "battery_level": None if rng.random() < 0.3 else rng.uniform(0, 100),
+            "created_at": start + timedelta(seconds=i),
+            "updated_at": start + timedelta(seconds=rng.randrange(SEED_ROWS)),
+            "config": {}
+        }
+        for i in range(SEED_ROWS)
+    ]
+
+def _plan_nodes(node):
+    """Parcourir récursivement les nœuds d'un plan EXPLAIN (FORMAT JSON)"""
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+@pytest.fixture(scope="module")
+def seeded_engine():
+    """Table devices peuplée (distribution réaliste) et statistiques du planner à jour"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Device), _seed_rows())
+        connection.execute(text("ANALYZE"))
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(scope="module")
+def seeded_postgres_engine(postgres_url):
+    """Table devices PostgreSQL peuplée dans un schéma dédié, VACUUM ANALYZE fait"""
+    engine = create_engine(postgres_url, connect_args={"options": "-csearch_path=query_plans"})
+    with engine.begin() as connection:
+        connection.execute(text("DROP SCHEMA IF EXISTS query_plans CASCADE"))
+        connection.execute(text("CREATE SCHEMA query_plans"))
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Device), _seed_rows())
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM ANALYZE devices"))
+    yield engine
+    with engine.begin() as connection:
+        connection.execute(text("DROP SCHEMA query_plans CASCADE"))
+    engine.dispose()
+
+@pytest.mark.parametrize("filters,expected_index,sorted_by_index", FILTER_SHAPES)
+def test_filter_shape_uses_expected_index(seeded_engine, filters, expected_index, sorted_by_index):
+    """Test smoke SQLite: plan EXPLAIN de chaque combinaison filtre + tri par défaut"""
+    statement = DeviceDAL._apply_filters(select(Device), DeviceFilterDTO(**filters), "sqlite")
+    statement = DeviceDAL._apply_sort(statement, "created_at", "desc").limit(20)
+    compiled = statement.compile(seeded_engine)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    
+    with seeded_engine.connect() as connection:
+        plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)]
+    
+    expected = expected_index if isinstance(expected_index, tuple) else (expected_index,)
+    assert any(f"USING INDEX {index}" in step for step in plan for index in expected), plan
+    assert ("USE TEMP B-TREE FOR ORDER BY" not in plan) == sorted_by_index, plan
+
+def test_change_feed_walks_updated_at_index(seeded_engine):
+    """Test flux de changements: parcours keyset de ix_devices_updated_at_id, sans tri en mémoire"""
+    statement = DeviceDAL._apply_sort(
+        select(Device).where(Device.updated_at <= datetime(2024, 2, 1)), "updated_at", "asc", (datetime(2024, 1, 1, 6), 21600)
+    ).limit(501)
+    compiled = statement.compile(seeded_engine)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    
+    with seeded_engine.connect() as connection:
+        plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)]
+    
+    assert any("USING INDEX ix_devices_updated_at_id" in step for step in plan), plan
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
+
+@pytest.mark.parametrize("with_cursor", [False, True], ids=["first-page", "cursor"])
+@pytest.mark.parametrize("sort_order", ["desc", "asc"])
+@pytest.mark.parametrize("sort_by", KEYSET_SORT_COLUMNS)
+@pytest.mark.parametrize(
+    "filters,expected_indexes",
+    [(filters, expected) for (filters, _, _), expected in zip(FILTER_SHAPES, POSTGRES_EXPECTED_INDEXES)]
+)
+def test_postgres_filter_and_sort_walk_index(seeded_postgres_engine, filters, expected_indexes, sort_by, sort_order, with_cursor):
+    """Test plan EXPLAIN (FORMAT JSON) PostgreSQL: chaque filtre x tri keyset parcourt son index, sans Sort ni Seq Scan"""
+    after = SORT_CURSORS[sort_by] if with_cursor else None
+    statement = DeviceDAL._apply_filters(select(Device), DeviceFilterDTO(**filters), "postgresql")
+    statement = DeviceDAL._apply_sort(statement, sort_by, sort_order, after).limit(21)
+    
+    with seeded_postgres_engine.connect() as connection:
+        compiled = statement.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(_plan_nodes(plan[0]["Plan"]))
+    node_types = [node["Node Type"] for node in nodes]
+    indexes = [node["Index Name"] for node in nodes if "Index Name" in node]
+    
+    expected = expected_indexes[sort_by]
+    expected = expected if isinstance(expected, tuple) else (expected,)
+    assert any(index in expected for index in indexes), (indexes, node_types)
+    assert not {"Sort", "Incremental Sort", "Seq Scan"} & set(node_types), (indexes, node_types)
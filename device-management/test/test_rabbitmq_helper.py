@@ -0,0 +1,50 @@
+import asyncio
+
+from helpers.rabbitmq_helper import RabbitMQHelper
+
+def test_publish_only_enqueues_and_buffer_is_bounded():
+    """Test publication non bloquante: file bornée, surplus compté"""
+    async def scenario():
+        helper = RabbitMQHelper(buffer_size=3, batch_size=2)
+        for i in range(5):
+            await helper.publish_device_event("created", f"device-{i}", {"device_id": f"device-{i}"})
+        return helper.get_stats()
+    
+    stats = asyncio.run(scenario())
+    assert stats["buffered"] == 3
+    assert stats["dropped"] == 2
+    assert stats["connected"] is False
+
+def test_flush_keeps_batch_when_broker_unavailable():
+    """Test broker indisponible: le lot est conservé pour le prochain essai"""
+    async def scenario():
+        helper = RabbitMQHelper(buffer_size=10, batch_size=2)
+        helper._last_connect_attempt = float("inf")  # pas de tentative de connexion
+        await helper.publish_device_events([
+            {"event_type": "created", "device_id": f"device-{i}", "data": {}} for i in range(3)
+        ])
+        await helper.flush()
+        return helper.get_stats()
+    
+    stats = asyncio.run(scenario())
+    assert stats["published"] == 0
+    assert stats["failed"] == 0
+    assert stats["retried"] == 2
+    assert stats["buffered"] == 3
+
+def test_failed_batch_counted_once_when_dropped():
+    """Test échecs répétés: nouveaux essais comptés à part, échec compté une fois à l'abandon du lot"""
+    async def scenario():
+        helper = RabbitMQHelper(buffer_size=10, batch_size=2, max_retries=2)
+        helper._last_connect_attempt = float("inf")
+        await helper.publish_device_events([
+            {"event_type": "created", "device_id": f"device-{i}", "data": {}} for i in range(3)
+        ])
+        for _ in range(3):
+            await helper.flush()
+        return helper.get_stats()
+    
+    stats = asyncio.run(scenario())
+    assert stats["retried"] == 4
+    assert stats["failed"] == 2
+    assert stats["buffered"] == 1
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from helpers import readiness_helper as readiness_module
+from helpers.readiness_helper import ReadinessHelper
+
+def test_startup_runs_dependencies_concurrently_with_deadlines(monkeypatch):
+    """Test initialisations en parallèle: une dépendance lente expire sans retarder les autres"""
+    monkeypatch.setattr(readiness_module, "STARTUP_DB_TIMEOUT", 1)
+    monkeypatch.setattr(readiness_module, "STARTUP_REDIS_TIMEOUT", 0.2)
+    monkeypatch.setattr(readiness_module, "STARTUP_RABBITMQ_TIMEOUT", 1)
+    helper = ReadinessHelper()
+    
+    async def ready():
+        await asyncio.sleep(0.1)
+    
+    async def hangs():
+        await asyncio.sleep(30)
+    
+    async def fails():
+        raise ConnectionError("refused")
+    
+    monkeypatch.setattr(helper, "_init_database", ready)
+    monkeypatch.setattr(helper, "_init_redis", hangs)
+    monkeypatch.setattr(helper, "_init_rabbitmq", fails)
+    
+    start = time.perf_counter()
+    startup = asyncio.run(helper.initialize())
+    assert time.perf_counter() - start < 0.5
+    assert startup["database"]["state"] == "ready"
+    assert startup["redis"]["state"] == "timeout"
+    assert startup["rabbitmq"]["state"] == "failed"
+    assert startup["rabbitmq"]["error"] == "refused"
+    assert helper.started
+
+def test_ready_only_when_required_dependencies_answer(monkeypatch):
+    """Test /ready: dépendances optionnelles en échec tolérées, base requise"""
+    monkeypatch.setattr(readiness_module, "READINESS_REQUIRED", ["database"])
+    helper = ReadinessHelper()
+    
+    async def ok():
+        return None
+    
+    async def down():
+        raise ConnectionError("not connected")
+    
+    monkeypatch.setattr(helper, "_check_database", ok)
+    monkeypatch.setattr(helper, "_check_redis", down)
+    monkeypatch.setattr(helper, "_check_rabbitmq", down)
+    
+    assert not asyncio.run(helper.check())["ready"]  # démarrage pas terminé
+    helper.started = True
+    report = asyncio.run(helper.check())
+    assert report["ready"]
+    assert report["dependencies"]["redis"]["state"] == "failed"
+    assert not report["dependencies"]["redis"]["required"]
+    
+    monkeypatch.setattr(helper, "_check_database", down)
+    assert not asyncio.run(helper.check())["ready"]
@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from helpers.single_flight import SingleFlight
+
+def test_concurrent_calls_share_one_execution():
+    """Test regroupement: une seule exécution pour des appels concurrents sur la même clé"""
+    flight = SingleFlight(timeout=5)
+    calls = []
+    results = []
+    
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"device_id": "dev-1"}
+    
+    threads = [threading.Thread(target=lambda: results.append(flight.do("dev-1", load))) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(calls) == 1
+    assert results == [{"device_id": "dev-1"}] * 20
+    assert flight.stats()["shared"] == 19 and flight.stats()["in_flight"] == 0
+
+def test_error_is_shared_and_next_call_retries():
+    """Test erreur: transmise aux appels en attente, l'appel suivant réessaie"""
+    flight = SingleFlight(timeout=5)
+    started = threading.Event()
+    errors = []
+    
+    def failing_load():
+        started.set()
+        time.sleep(0.05)
+        raise ConnectionError("database down")
+    
+    def follower():
+        started.wait()
+        try:
+            flight.do("dev-1", lambda: "unexpected")
+        except ConnectionError as e:
+            errors.append(e)
+    
+    thread = threading.Thread(target=follower)
+    thread.start()
+    with pytest.raises(ConnectionError):
+        flight.do("dev-1", failing_load)
+    thread.join()
+    
+    assert len(errors) == 1
+    assert flight.do("dev-1", lambda: "reloaded") == "reloaded"
@@ -1,4 +1,6 @@
+import logging
 import os
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 
 # charge le fichier .env à la racine du projet
@@ -14,5 +16,13 @@ RABBITMQ_ROUTING_KEY = os.getenv("RABBITMQ_ROUTING_KEY")
 
 SOCKETIO_CORS = os.getenv("SOCKETIO_CORS", "*")
 
-# DEBUG TEMPORAIRE (à enlever plus tard)
-print("🔎 Loaded MONGO_URI =", MONGO_URI)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", "500"))
+
+# hôte(s) seulement: l'URI contient les identifiants MongoDB
+logging.getLogger(__name__).debug(
+    "MongoDB configuration loaded",
+    extra={"mongo_hosts": urlsplit(MONGO_URI).netloc.rpartition("@")[2] if MONGO_URI else None, "mongo_db": MONGO_DB}
+)
@@ -0,0 +1,81 @@
+"""
+Logging structuré (JSON) et non bloquant: les handlers écrivent depuis un thread
+QueueListener, l'event loop et le thread consumer ne font qu'empiler dans une file.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from app.core.config import LOG_LEVEL, LOG_QUEUE_SIZE, ACCESS_LOG_SAMPLE_RATE, ACCESS_LOG_SLOW_MS
+
+# identifiant de la requête en cours (HTTP) ajouté à chaque log
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-")
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """File pleine: le log est abandonné (et compté) plutôt que de bloquer l'appelant."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # exécuté dans le thread appelant: capture du contexte (request id)
+        record = logging.makeLogRecord(record.__dict__)
+        record.request_id = request_id_var.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def setup_logging():
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+
+    # handlers déjà installés (basicConfig, rechargement uvicorn): retirés pour ne pas dupliquer les lignes hors JSON
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(NonBlockingQueueHandler(log_queue))
+    listener.start()
+    return listener
+
+def should_log_access(status_code, duration_ms):
+    # erreurs et requêtes lentes toujours journalisées, le reste échantillonné
+    if status_code >= 400 or duration_ms >= ACCESS_LOG_SLOW_MS:
+        return True
+    return ACCESS_LOG_SAMPLE_RATE >= 1 or random.random() < ACCESS_LOG_SAMPLE_RATE
@@ -0,0 +1,62 @@
+"""
+Métriques Prometheus du service monitoring: latence HTTP par modèle de route
+et traitement des messages RabbitMQ consommés. Le middleware HTTP porte aussi
+le request id et le log d'accès échantillonné.
+"""
+
+import logging
+import time
+import uuid
+from fastapi import Request
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.logging_config import request_id_var, should_log_access
+
+logger = logging.getLogger("monitoring.access")
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+MESSAGES_CONSUMED = Counter(
+    "rabbitmq_messages_consumed",
+    "Device messages consumed from RabbitMQ by outcome",
+    ["outcome"]
+)
+MESSAGE_PROCESSING_LATENCY = Histogram(
+    "rabbitmq_message_processing_seconds",
+    "Time to store and broadcast one consumed message",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+async def metrics_middleware(request: Request, call_next):
+    REQUESTS_IN_FLIGHT.inc()
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        # modèle de route (/monitoring/devices/{device_id}/data) plutôt que l'URL brute
+        route = request.scope.get("route")
+        duration = time.perf_counter() - start
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=str(status)
+        ).observe(duration)
+        REQUESTS_IN_FLIGHT.dec()
+        if should_log_access(status, duration * 1000):
+            logger.info(
+                f"{request.method} {request.url.path} {status}",
+                extra={"method": request.method, "path": request.url.path, "status": status, "duration_ms": round(duration * 1000, 2)}
+            )
+        request_id_var.reset(token)
@@ -1,6 +1,10 @@
+import logging
+
 import socketio
 from app.core.config import SOCKETIO_CORS
 
+logger = logging.getLogger(__name__)
+
 # Async Server (ASGI)
 sio = socketio.AsyncServer(
     async_mode="asgi",
@@ -10,8 +14,8 @@ sio = socketio.AsyncServer(
 # Optionally you can register connect/disconnect handlers here
 @sio.event
 async def connect(sid, environ):
-    print("Socket.IO - client connected:", sid)
+    logger.info("Socket.IO client connected", extra={"sid": sid})
 
 @sio.event
 async def disconnect(sid):
-    print("Socket.IO - client disconnected:", sid)
+    logger.info("Socket.IO client disconnected", extra={"sid": sid})
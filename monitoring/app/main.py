@@ -20,20 +20,33 @@ def startup():
 """
 
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from app.api.health import router as health_router
 from app.api.monitoring_api import router as monitoring_router
 from app.messanging.rabbitmq_consumer import start_consumer_thread
 from app.core.socket import sio
+from app.core.metrics import metrics_middleware
+from app.core.logging_config import setup_logging
 
 import socketio
 
+# logs JSON écrits par un thread dédié (QueueListener)
+log_listener = setup_logging()
+
 app = FastAPI(title="Monitoring Microservice")
 
 # include routers
 app.include_router(health_router)
 app.include_router(monitoring_router)
 
+# latence et requêtes en cours, exposées sur /metrics
+app.middleware("http")(metrics_middleware)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # wrap FastAPI app with Socket.IO ASGI
 socket_app = socketio.ASGIApp(sio, app)
 
@@ -41,3 +54,8 @@ socket_app = socketio.ASGIApp(sio, app)
 def startup_event():
     # démarre le consumer RabbitMQ dans un thread daemon
     start_consumer_thread()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # vider la file de logs avant l'arrêt
+    log_listener.stop()
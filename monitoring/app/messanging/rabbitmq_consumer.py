@@ -7,7 +7,9 @@ et utilise sio.start_background_task pour émettre l'event dans l'event loop asy
 """
 
 import json
+import logging
 import threading
+import time
 from datetime import datetime
 import pika
 from dateutil import parser as dateparser
@@ -20,6 +22,9 @@ from app.core.config import (
 )
 from app.db.mongo import measurements_collection
 from app.core.socket import sio
+from app.core.metrics import MESSAGES_CONSUMED, MESSAGE_PROCESSING_LATENCY
+
+logger = logging.getLogger(__name__)
 
 def parse_timestamp(ts_str):
     # accepte ISO8601 avec ou sans 'Z'
@@ -44,6 +49,7 @@ def process_message(body):
     return document, data
 
 def callback(ch, method, properties, body):
+    start = time.perf_counter()
     try:
         document, raw = process_message(body)
         # Inserer en MongoDB (pymongo gère bien les datetime)
@@ -65,10 +71,14 @@ def callback(ch, method, properties, body):
 
         # acknowledgement
         ch.basic_ack(delivery_tag=method.delivery_tag)
+        MESSAGES_CONSUMED.labels(outcome="stored").inc()
     except Exception as e:
-        print("Error processing message:", e)
+        logger.error(f"Error processing message: {e}")
+        MESSAGES_CONSUMED.labels(outcome="failed").inc()
         # En cas d'erreur on ack quand même (ou adapter selon stratégie)
         ch.basic_ack(delivery_tag=method.delivery_tag)
+    finally:
+        MESSAGE_PROCESSING_LATENCY.observe(time.perf_counter() - start)
 
 def start_consumer():
     connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
@@ -81,7 +91,7 @@ def start_consumer():
     channel.basic_qos(prefetch_count=1)
     channel.basic_consume(queue=RABBITMQ_QUEUE, on_message_callback=callback)
 
-    print("🟢 Monitoring RabbitMQ Consumer started, waiting for messages...")
+    logger.info("Monitoring RabbitMQ Consumer started, waiting for messages...")
     try:
         channel.start_consuming()
     except KeyboardInterrupt:
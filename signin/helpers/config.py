@@ -3,6 +3,9 @@ from typing import Final
 import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import declarative_base,sessionmaker
+from helpers.metrics import TimedQueuePool,register_pool
+from helpers.logs import setup_logging
+import atexit
 import logging
 import os
 #environement variables
@@ -14,7 +17,8 @@ NAME_DB:Final[str]=os.getenv('NAME_DB','db_auth')
 SERVER_DB:Final[str]=os.getenv('SERVER_DB','localhost')
 URL_DB:Final[str]='postgresql+psycopg2://'+USER_DB+':'+PASSWORD_DB+'@'+SERVER_DB+':5432/'+NAME_DB
 #sqlalchemy
-engine=create_engine(URL_DB,pool_size=10)
+engine=create_engine(URL_DB,pool_size=10,poolclass=TimedQueuePool)
+register_pool(engine.pool)
 LocalSession=sessionmaker(bind=engine)
 Base=declarative_base()
 def session_factory():
@@ -24,9 +28,10 @@ def session_factory():
     finally:
         session.close()
 #logs
-formater=logging.Formatter(fmt='%(asctime)s-%(levelname)s-%(message)s')
-handler=logging.FileHandler('./logs/auth.log')
-handler.setFormatter(formater)
+LOG_FILE:Final[str]=os.getenv('LOG_FILE','./logs/auth.log')
+LOG_QUEUE_SIZE:Final[int]=int(os.getenv('LOG_QUEUE_SIZE','10000'))
+ACCESS_LOG_SAMPLE_RATE:Final[float]=float(os.getenv('ACCESS_LOG_SAMPLE_RATE','1.0'))
+ACCESS_LOG_SLOW_MS:Final[float]=float(os.getenv('ACCESS_LOG_SLOW_MS','500'))
+log_listener=setup_logging(LOG_FILE,LOG_QUEUE_SIZE)
+atexit.register(log_listener.stop)
 logger=logging.getLogger()
-logger.setLevel(logging.INFO)
-logger.addHandler(handler)
@@ -0,0 +1,74 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime,timezone
+
+#id de la requete en cours, ajoute a chaque log
+request_id_var:ContextVar[str]=ContextVar("request_id",default="-")
+_RECORD_ATTRIBUTES=set(vars(logging.LogRecord("",0,"",0,"",None,None)))|{"message","asctime","request_id"}
+
+class JsonFormatter(logging.Formatter):
+    #une ligne json par log (champs extra inclus)
+    def format(self,record):
+        entry={
+            "timestamp":datetime.fromtimestamp(record.created,timezone.utc).isoformat(),
+            "level":record.levelname,
+            "logger":record.name,
+            "message":record.getMessage(),
+            "request_id":getattr(record,"request_id","-")
+        }
+        for key,value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key]=value
+        if record.exc_text:
+            entry["exc_info"]=record.exc_text
+        return json.dumps(entry,default=str)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    #file pleine => log abandonne (jamais bloquant)
+    def __init__(self,log_queue):
+        super().__init__(log_queue)
+        self.dropped=0
+    def prepare(self,record):
+        record=logging.makeLogRecord(record.__dict__)
+        record.request_id=request_id_var.get()
+        record.msg=record.getMessage()
+        record.args=None
+        if record.exc_info:
+            record.exc_text=logging.Formatter().formatException(record.exc_info)
+            record.exc_info=None
+        return record
+    def enqueue(self,record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped+=1
+
+def setup_logging(log_file:str,queue_size:int,level=logging.INFO):
+    #ecriture disque/stdout dans un thread dedie (QueueListener)
+    formatter=JsonFormatter()
+    handlers=[logging.StreamHandler(sys.stdout)]
+    try:
+        handlers.append(logging.FileHandler(log_file))
+    except OSError as e:
+        print(f"log file {log_file} unavailable: {e}")
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    log_queue=queue.Queue(maxsize=queue_size)
+    listener=logging.handlers.QueueListener(log_queue,*handlers,respect_handler_level=True)
+    queue_handler=NonBlockingQueueHandler(log_queue)
+    root=logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    listener.start()
+    return listener
+
+def should_log_access(status_code:int,duration_ms:float,sample_rate:float,slow_ms:float):
+    #erreurs et requetes lentes toujours conservees
+    if status_code>=400 or duration_ms>=slow_ms:
+        return True
+    return sample_rate>=1 or random.random()<sample_rate
@@ -0,0 +1,58 @@
+import time
+from prometheus_client import Gauge,Histogram,REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy.pool import QueuePool
+from fastapi import Request
+
+#latence http par modele de route (cardinalite bornee)
+REQUEST_LATENCY=Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method","route","status"],
+    buckets=(0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5)
+)
+REQUESTS_IN_FLIGHT=Gauge("http_requests_in_flight","HTTP requests currently being served")
+DB_POOL_WAIT=Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection",
+    ["pool"],
+    buckets=(0.0001,0.0005,0.001,0.005,0.01,0.05,0.1,0.5,1,5,30)
+)
+
+class TimedQueuePool(QueuePool):
+    #mesure l'attente de chaque checkout
+    def _do_get(self):
+        start=time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.labels(pool="default").observe(time.perf_counter()-start)
+
+class PoolCollector:
+    #occupation du pool lue a chaque scrape
+    def __init__(self,pool):
+        self.pool=pool
+    def collect(self):
+        yield GaugeMetricFamily("db_pool_size","Configured pool size",value=self.pool.size())
+        yield GaugeMetricFamily("db_pool_checked_out","Connections currently checked out",value=self.pool.checkedout())
+        yield GaugeMetricFamily("db_pool_overflow","Connections opened beyond pool_size",value=max(self.pool.overflow(),0))
+
+def register_pool(pool):
+    REGISTRY.register(PoolCollector(pool))
+
+async def metrics_middleware(request:Request,call_next):
+    REQUESTS_IN_FLIGHT.inc()
+    start=time.perf_counter()
+    status=500
+    try:
+        response=await call_next(request)
+        status=response.status_code
+        return response
+    finally:
+        route=request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=str(status)
+        ).observe(time.perf_counter()-start)
+        REQUESTS_IN_FLIGHT.dec()
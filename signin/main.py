@@ -1,14 +1,47 @@
+import time
+import uuid
 import uvicorn
 
-from fastapi import FastAPI
+from fastapi import FastAPI,Request,Response
+from prometheus_client import generate_latest,CONTENT_TYPE_LATEST
 from controllers.auth_controller import router
-from helpers.config import Base,engine
+from helpers.config import Base,engine,logger,ACCESS_LOG_SAMPLE_RATE,ACCESS_LOG_SLOW_MS
+from helpers.logs import request_id_var,should_log_access
+from helpers.metrics import metrics_middleware
 app=FastAPI(
 title="Authentication app",
 description="Micro service signing app "
 )#create one time
 Base.metadata.create_all(bind=engine)
 app.include_router(router)
+app.middleware("http")(metrics_middleware)
+
+@app.middleware("http")
+async def access_log(request:Request,call_next):
+    #request id repris de la gateway ou genere, log d'acces echantillonne
+    request_id=request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token=request_id_var.set(request_id)
+    start=time.perf_counter()
+    status=500
+    try:
+        response=await call_next(request)
+        status=response.status_code
+        response.headers["X-Request-ID"]=request_id
+        return response
+    finally:
+        duration_ms=(time.perf_counter()-start)*1000
+        if should_log_access(status,duration_ms,ACCESS_LOG_SAMPLE_RATE,ACCESS_LOG_SLOW_MS):
+            logger.info(f"{request.method} {request.url.path} {status}",extra={
+                "method":request.method,
+                "path":request.url.path,
+                "status":status,
+                "duration_ms":round(duration_ms,2)
+            })
+        request_id_var.reset(token)
+
+@app.get("/metrics",include_in_schema=False)
+def metrics():
+    return Response(content=generate_latest(),media_type=CONTENT_TYPE_LATEST)
 
 
 if __name__ == '__main__':